@@ -0,0 +1,56 @@
+"""
+ * Copyright(c) 2021 ADLINK Technology Limited and others
+ *
+ * This program and the accompanying materials are made available under the
+ * terms of the Eclipse Public License v. 2.0 which is available at
+ * http://www.eclipse.org/legal/epl-2.0, or the Eclipse Distribution License
+ * v. 1.0 which is available at
+ * http://www.eclipse.org/org/documents/edl-v10.php.
+ *
+ * SPDX-License-Identifier: EPL-2.0 OR BSD-3-Clause
+"""
+
+# Compare interpreted, compiled and native (de)serialization of a flat telemetry struct.
+#   python benchmarks/bench_compiled_machines.py
+# The native row equals the compiled row when the _clayer extension is not available.
+
+import timeit
+
+from cyclonedds.idl import make_idl_struct
+import cyclonedds.idl.types as pt
+
+
+fields = {}
+for i in range(10):
+    fields[f"i{i}"] = pt.int32
+    fields[f"d{i}"] = pt.float64
+    fields[f"b{i}"] = pt.uint8
+    fields[f"s{i}"] = pt.int16
+fields["name"] = str
+fields["samples"] = pt.sequence[pt.float32]
+
+Interpreted = make_idl_struct("Interpreted", "Bench.Interpreted", fields)
+Compiled = make_idl_struct("Compiled", "Bench.Compiled", fields)
+Compiled.__idl__.use_compiled_machines(native=False)
+Native = make_idl_struct("Native", "Bench.Native", fields)
+Native.__idl__.use_compiled_machines()
+
+values = {name: 1 for name in fields}
+values["name"] = "telemetry"
+values["samples"] = [0.5] * 16
+
+
+def bench(name, _type, use_version_2, number=20000):
+    sample = _type(**values)
+    data = sample.serialize(use_version_2=use_version_2)
+    ser = timeit.timeit(lambda: sample.serialize(use_version_2=use_version_2), number=number)
+    deser = timeit.timeit(lambda: _type.deserialize(data), number=number)
+    print(f"{name:<12} v{2 if use_version_2 else 0}  serialize {ser / number * 1e6:8.2f} us"
+          f"  deserialize {deser / number * 1e6:8.2f} us")
+
+
+if __name__ == "__main__":
+    for use_version_2 in (False, True):
+        bench("interpreted", Interpreted, use_version_2)
+        bench("compiled", Compiled, use_version_2)
+        bench("native", Native, use_version_2)
@@ -0,0 +1,95 @@
+"""
+ * Copyright(c) 2021 ADLINK Technology Limited and others
+ *
+ * This program and the accompanying materials are made available under the
+ * terms of the Eclipse Public License v. 2.0 which is available at
+ * http://www.eclipse.org/legal/epl-2.0, or the Eclipse Distribution License
+ * v. 1.0 which is available at
+ * http://www.eclipse.org/org/documents/edl-v10.php.
+ *
+ * SPDX-License-Identifier: EPL-2.0 OR BSD-3-Clause
+"""
+
+# Measure how much writer, reader and unrelated Python threads overlap.
+#   python benchmarks/bench_gil_release.py
+# While the ddspy_* calls hold the GIL the "with writers" rows drop to a fraction of
+# the "alone" rows; with the GIL released around the dds_* calls they stay close.
+
+import time
+import threading
+from dataclasses import dataclass
+
+from cyclonedds.core import Qos, Policy
+from cyclonedds.domain import DomainParticipant
+from cyclonedds.topic import Topic
+from cyclonedds.pub import DataWriter
+from cyclonedds.sub import DataReader
+from cyclonedds.idl import IdlStruct
+from cyclonedds.util import duration
+import cyclonedds.idl.types as pt
+
+
+@dataclass
+class Blob(IdlStruct, typename="Bench.Blob"):
+    seq: pt.uint32
+    payload: pt.sequence[pt.uint8]
+
+
+DURATION = 2.0
+PAYLOAD = bytes(32 * 1024)
+
+
+def spin(stop, counter):
+    n = 0
+    while not stop.is_set():
+        n += 1
+    counter.append(n)
+
+
+def write(writer, stop, counter):
+    sample = Blob(seq=0, payload=PAYLOAD)
+    n = 0
+    while not stop.is_set():
+        sample.seq = n
+        writer.write(sample)
+        n += 1
+    counter.append(n)
+
+
+def take(reader, stop, counter):
+    n = 0
+    while not stop.is_set():
+        n += len(reader.take(N=64))
+    counter.append(n)
+
+
+def run(*jobs):
+    stop = threading.Event()
+    counters = [[] for _ in jobs]
+    threads = [threading.Thread(target=job[0], args=job[1:] + (stop, counter)) for job, counter in zip(jobs, counters)]
+    for t in threads:
+        t.start()
+    time.sleep(DURATION)
+    stop.set()
+    for t in threads:
+        t.join()
+    return [sum(c) / DURATION for c in counters]
+
+
+if __name__ == "__main__":
+    qos = Qos(Policy.Reliability.Reliable(duration(seconds=1)), Policy.History.KeepLast(64))
+    dp = DomainParticipant(0)
+    tp = Topic(dp, "Blob", Blob)
+    writers = [DataWriter(dp, tp, qos=qos) for _ in range(2)]
+    reader = DataReader(dp, tp, qos=qos)
+
+    spin_alone, = run((spin,))
+    writes_alone, = run((write, writers[0]))
+    spin_busy, w0, w1 = run((spin,), (write, writers[0]), (write, writers[1]))
+    writes_with_reader, reads = run((write, writers[0]), (take, reader))
+
+    print(f"python thread alone          {spin_alone:14,.0f} it/s")
+    print(f"python thread with writers   {spin_busy:14,.0f} it/s  ({spin_busy / spin_alone:.0%})")
+    print(f"one writer alone             {writes_alone:14,.0f} samples/s")
+    print(f"two writers together         {w0 + w1:14,.0f} samples/s  ({(w0 + w1) / writes_alone:.2f}x)")
+    print(f"writer with reader thread    {writes_with_reader:14,.0f} samples/s, reader {reads:,.0f} samples/s")
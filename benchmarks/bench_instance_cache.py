@@ -0,0 +1,68 @@
+"""
+ * Copyright(c) 2021 ADLINK Technology Limited and others
+ *
+ * This program and the accompanying materials are made available under the
+ * terms of the Eclipse Public License v. 2.0 which is available at
+ * http://www.eclipse.org/legal/epl-2.0, or the Eclipse Distribution License
+ * v. 1.0 which is available at
+ * http://www.eclipse.org/org/documents/edl-v10.php.
+ *
+ * SPDX-License-Identifier: EPL-2.0 OR BSD-3-Clause
+"""
+
+# Compare keyed write throughput of a writer without and with an instance cache.
+#   python benchmarks/bench_instance_cache.py
+
+import time
+from dataclasses import dataclass
+
+from cyclonedds.core import Qos, Policy
+from cyclonedds.domain import DomainParticipant
+from cyclonedds.topic import Topic
+from cyclonedds.pub import DataWriter
+from cyclonedds.idl import IdlStruct
+from cyclonedds.idl.annotations import key
+import cyclonedds.idl.types as pt
+
+
+@dataclass
+class Sensor(IdlStruct, typename="Bench.Sensor"):
+    site: str
+    key("site")
+    id: pt.uint32
+    key("id")
+    value: pt.float64
+    unit: str
+
+
+INSTANCES = 2000
+ROUNDS = 20
+
+
+def run(writer, samples, handles=None):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        if handles is None:
+            for sample in samples:
+                writer.write(sample)
+        else:
+            for sample, handle in zip(samples, handles):
+                writer.write(sample, handle=handle)
+    return ROUNDS * len(samples) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    qos = Qos(Policy.History.KeepLast(1))
+    dp = DomainParticipant(0)
+    tp = Topic(dp, "Sensor", Sensor)
+    plain = DataWriter(dp, tp, qos=qos)
+    cached = DataWriter(dp, tp, qos=qos, instance_cache=INSTANCES)
+
+    samples = [Sensor(site=f"plant-{i % 16}", id=i, value=0.5 * i, unit="degC") for i in range(INSTANCES)]
+    for sample in samples:
+        plain.register_instance(sample)
+    handles = [cached.register_instance(sample) for sample in samples]
+
+    print(f"no cache          {run(plain, samples):12,.0f} samples/s")
+    print(f"cache, by key     {run(cached, samples):12,.0f} samples/s")
+    print(f"cache, by handle  {run(cached, samples, handles):12,.0f} samples/s")
@@ -0,0 +1,51 @@
+"""
+ * Copyright(c) 2021 ADLINK Technology Limited and others
+ *
+ * This program and the accompanying materials are made available under the
+ * terms of the Eclipse Public License v. 2.0 which is available at
+ * http://www.eclipse.org/legal/epl-2.0, or the Eclipse Distribution License
+ * v. 1.0 which is available at
+ * http://www.eclipse.org/org/documents/edl-v10.php.
+ *
+ * SPDX-License-Identifier: EPL-2.0 OR BSD-3-Clause
+"""
+
+# Time draining a backlog of samples with take_iter for several batch sizes.
+#   python benchmarks/bench_iter_batches.py
+
+import time
+from dataclasses import dataclass
+
+from cyclonedds.core import Qos, Policy
+from cyclonedds.domain import DomainParticipant
+from cyclonedds.topic import Topic
+from cyclonedds.pub import DataWriter
+from cyclonedds.sub import DataReader
+from cyclonedds.idl import IdlStruct
+from cyclonedds.util import duration
+import cyclonedds.idl.types as pt
+
+
+@dataclass
+class Tick(IdlStruct, typename="Bench.Tick"):
+    seq: pt.uint32
+    value: pt.float64
+
+
+BACKLOG = 50_000
+
+
+if __name__ == "__main__":
+    qos = Qos(Policy.Reliability.Reliable(duration(seconds=1)), Policy.History.KeepAll)
+    dp = DomainParticipant(0)
+    tp = Topic(dp, "Tick", Tick)
+    writer = DataWriter(dp, tp, qos=qos)
+    reader = DataReader(dp, tp, qos=qos)
+
+    for batch_size in (1, 16, 256, 4096):
+        writer.write_many(Tick(seq=i, value=i * 0.5) for i in range(BACKLOG))
+
+        start = time.perf_counter()
+        n = sum(1 for _ in reader.take_iter(timeout=duration(milliseconds=1), batch_size=batch_size))
+        elapsed = time.perf_counter() - start
+        print(f"batch_size {batch_size:5}  {n} samples in {elapsed * 1000:8.1f} ms  ({n / elapsed:12,.0f} samples/s)")
@@ -0,0 +1,58 @@
+"""
+ * Copyright(c) 2021 ADLINK Technology Limited and others
+ *
+ * This program and the accompanying materials are made available under the
+ * terms of the Eclipse Public License v. 2.0 which is available at
+ * http://www.eclipse.org/legal/epl-2.0, or the Eclipse Distribution License
+ * v. 1.0 which is available at
+ * http://www.eclipse.org/org/documents/edl-v10.php.
+ *
+ * SPDX-License-Identifier: EPL-2.0 OR BSD-3-Clause
+"""
+
+# (De)serialize primitive heavy structs through the interpreted machines in both endiannesses.
+#   python benchmarks/bench_primitive_structs.py
+# This measures the per member cost of Buffer reads and writes, compiled machines bypass most of it.
+
+import timeit
+
+from cyclonedds.idl import make_idl_struct
+from cyclonedds.idl._support import Endianness
+import cyclonedds.idl.types as pt
+
+
+scalars = {}
+for i in range(8):
+    scalars[f"i{i}"] = pt.int32
+    scalars[f"d{i}"] = pt.float64
+    scalars[f"b{i}"] = pt.uint8
+    scalars[f"s{i}"] = pt.int16
+    scalars[f"f{i}"] = bool
+
+Scalars = make_idl_struct("Scalars", "Bench.Scalars", scalars)
+Arrays = make_idl_struct("Arrays", "Bench.Arrays", {
+    "pose": pt.array[pt.float64, 7],
+    "covariance": pt.array[pt.float64, 36],
+    "ranges": pt.sequence[pt.float32],
+    "intensities": pt.sequence[pt.uint16],
+})
+
+samples = [
+    ("scalars", Scalars(**{name: 1 for name in scalars})),
+    ("arrays", Arrays(pose=[0.5] * 7, covariance=[0.25] * 36, ranges=[1.5] * 64, intensities=[7] * 64)),
+]
+
+
+def bench(name, sample, endianness, number=5000, repeat=5):
+    data = sample.serialize(endianness=endianness)
+    _type = type(sample)
+    ser = min(timeit.repeat(lambda: sample.serialize(endianness=endianness), number=number, repeat=repeat))
+    deser = min(timeit.repeat(lambda: _type.deserialize(data), number=number, repeat=repeat))
+    print(f"{name:<8} {endianness.name:<6}  serialize {ser / number * 1e6:8.2f} us"
+          f"  deserialize {deser / number * 1e6:8.2f} us")
+
+
+if __name__ == "__main__":
+    for name, sample in samples:
+        for endianness in (Endianness.Little, Endianness.Big):
+            bench(name, sample, endianness)
@@ -0,0 +1,68 @@
+"""
+ * Copyright(c) 2021 ADLINK Technology Limited and others
+ *
+ * This program and the accompanying materials are made available under the
+ * terms of the Eclipse Public License v. 2.0 which is available at
+ * http://www.eclipse.org/legal/epl-2.0, or the Eclipse Distribution License
+ * v. 1.0 which is available at
+ * http://www.eclipse.org/org/documents/edl-v10.php.
+ *
+ * SPDX-License-Identifier: EPL-2.0 OR BSD-3-Clause
+"""
+
+# Write and take throughput of a type with string keys, whose keys can exceed 16 bytes
+# so that the keyhash is an MD5. Run before and after a change to the C sertype.
+#   python benchmarks/bench_string_keys.py
+
+import time
+from dataclasses import dataclass
+
+from cyclonedds.core import Qos, Policy
+from cyclonedds.domain import DomainParticipant
+from cyclonedds.topic import Topic
+from cyclonedds.pub import DataWriter
+from cyclonedds.sub import DataReader
+from cyclonedds.idl import IdlStruct
+from cyclonedds.idl.annotations import key
+import cyclonedds.idl.types as pt
+
+
+@dataclass
+class Asset(IdlStruct, typename="Bench.Asset"):
+    site: str
+    key("site")
+    name: str
+    key("name")
+    value: pt.float64
+
+
+INSTANCES = 10_000
+ROUNDS = 5
+
+
+if __name__ == "__main__":
+    qos = Qos(Policy.History.KeepLast(1))
+    dp = DomainParticipant(0)
+    tp = Topic(dp, "Asset", Asset)
+    writer = DataWriter(dp, tp, qos=qos)
+    reader = DataReader(dp, tp, qos=qos)
+
+    samples = [Asset(site=f"site-{i % 100:04}", name=f"pump-station-{i:08}", value=float(i)) for i in range(INSTANCES)]
+
+    written = taken = 0
+    write_time = take_time = 0.0
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        written += sum(1 for r in writer.write_many(samples) if r == 0)
+        write_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        while True:
+            batch = reader.take_batch(N=1024)
+            if not len(batch):
+                break
+            taken += len(batch)
+        take_time += time.perf_counter() - start
+
+    print(f"write  {written / write_time:12,.0f} samples/s")
+    print(f"take   {taken / take_time:12,.0f} samples/s")
@@ -0,0 +1,309 @@
+/*
+ * Copyright(c) 2021 ADLINK Technology Limited and others
+ *
+ * This program and the accompanying materials are made available under the
+ * terms of the Eclipse Public License v. 2.0 which is available at
+ * http://www.eclipse.org/legal/epl-2.0, or the Eclipse Distribution License
+ * v. 1.0 which is available at
+ * http://www.eclipse.org/org/documents/edl-v10.php.
+ *
+ * SPDX-License-Identifier: EPL-2.0 OR BSD-3-Clause
+ */
+
+#include "cdrfiltervm.h"
+#include <string.h>
+
+/*
+ * The filter VM runs the programs built by cyclonedds.idl._filter.FilterExpression. Every
+ * compare or in op pushes a boolean on the stack, and, or and not combine the topmost ones.
+ * The programs are validated when they are created, so evaluating them cannot fail other
+ * than on truncated data, which simply does not match. _run in _filter.py is the Python
+ * version of cdr_filter_vm_eval and has to stay in sync with it.
+ */
+
+static inline bool native_little_endian(void)
+{
+    const uint16_t one = 1;
+    return *((const uint8_t*) &one) == 1;
+}
+
+static void program_free(cdr_filter_vm_op* program)
+{
+    if (program == NULL)
+        return;
+    for (cdr_filter_vm_op* op = program; op->type != CdrFilterVMOpDone; ++op)
+        PyMem_Free(op->values);
+    PyMem_Free(program);
+}
+
+static bool op_values(cdr_filter_vm_op* op, PyObject* values)
+{
+    Py_ssize_t len = PyList_Size(values);
+    if (len < 0)
+        return false;
+
+    op->count = (uint32_t) len;
+    op->values = (cdr_filter_vm_value*) PyMem_Calloc((size_t) len + 1, sizeof(cdr_filter_vm_value));
+    if (op->values == NULL) {
+        PyErr_NoMemory();
+        return false;
+    }
+
+    for (Py_ssize_t i = 0; i < len; ++i) {
+        PyObject* borrow_v = PyList_GetItem(values, i);
+        switch (op->mode) {
+            case 'i': op->values[i].i = (int64_t) PyLong_AsLongLong(borrow_v); break;
+            case 'u': op->values[i].u = (uint64_t) PyLong_AsUnsignedLongLong(borrow_v); break;
+            default: op->values[i].d = PyFloat_AsDouble(borrow_v); break;
+        }
+        if (PyErr_Occurred())
+            return false;
+    }
+    return true;
+}
+
+static cdr_filter_vm_op* program_create(PyObject* list)
+{
+    Py_ssize_t len = PyList_Size(list);
+    if (len < 0 || PyErr_Occurred())
+        return NULL;
+
+    cdr_filter_vm_op* program = (cdr_filter_vm_op*) PyMem_Calloc((size_t) len + 1, sizeof(struct cdr_filter_vm_op_s));
+    if (program == NULL) {
+        PyErr_NoMemory();
+        return NULL;
+    }
+    program[len].type = CdrFilterVMOpDone;
+
+    int depth = 0;
+    for (Py_ssize_t i = 0; i < len && !PyErr_Occurred(); ++i) {
+        PyObject* borrow_i = PyList_GetItem(list, i);
+        cdr_filter_vm_op* op = &program[i];
+
+        PyObject* attr_type = PyObject_GetAttrString(borrow_i, "type");
+        PyObject* attr_code = PyObject_GetAttrString(borrow_i, "code");
+        PyObject* attr_offset = PyObject_GetAttrString(borrow_i, "offset");
+        PyObject* attr_size = PyObject_GetAttrString(borrow_i, "size");
+        PyObject* attr_delimited = PyObject_GetAttrString(borrow_i, "delimited");
+        PyObject* attr_cmp = PyObject_GetAttrString(borrow_i, "cmp");
+        PyObject* attr_mode = PyObject_GetAttrString(borrow_i, "mode");
+        PyObject* attr_values = PyObject_GetAttrString(borrow_i, "values");
+        PyObject* attr_count = PyObject_GetAttrString(borrow_i, "count");
+
+        if (attr_type && attr_code && attr_offset && attr_size && attr_delimited && attr_cmp && attr_mode &&
+                attr_values && attr_count) {
+            // Done would end the program early, it never appears in the list
+            op->type = (cdr_filter_vm_op_type) PyLong_AsUnsignedLong(attr_type);
+            op->offset = (uint32_t) PyLong_AsUnsignedLong(attr_offset);
+            op->size = (uint32_t) PyLong_AsUnsignedLong(attr_size);
+            op->delimited = PyObject_IsTrue(attr_delimited) == 1;
+            op->cmp = (cdr_filter_vm_compare) PyLong_AsUnsignedLong(attr_cmp);
+            op->count = (uint32_t) PyLong_AsUnsignedLong(attr_count);
+            if (PyUnicode_Check(attr_code) && PyUnicode_GetLength(attr_code) == 1)
+                op->code = (char) PyUnicode_ReadChar(attr_code, 0);
+            if (PyUnicode_Check(attr_mode) && PyUnicode_GetLength(attr_mode) == 1)
+                op->mode = (char) PyUnicode_ReadChar(attr_mode, 0);
+
+            switch (op->type) {
+                case CdrFilterVMOpCompare:
+                case CdrFilterVMOpIn:
+                    if (PyList_Check(attr_values) && op_values(op, attr_values)) {
+                        if (op->type == CdrFilterVMOpCompare && op->count != 1)
+                            PyErr_SetString(PyExc_ValueError, "Filter compare needs exactly one value.");
+                        else if (op->size == 0 || op->size > 8 || op->offset > UINT32_MAX - 8)
+                            PyErr_SetString(PyExc_ValueError, "Invalid member in filter program.");
+                        ++depth;
+                    }
+                    else if (!PyErr_Occurred())
+                        PyErr_SetString(PyExc_TypeError, "Filter values must be a list.");
+                    break;
+                case CdrFilterVMOpAnd:
+                case CdrFilterVMOpOr:
+                    if (op->count == 0 || (int) op->count > depth)
+                        PyErr_SetString(PyExc_ValueError, "Filter program stack underflow.");
+                    depth -= (int) op->count - 1;
+                    break;
+                case CdrFilterVMOpNot:
+                    if (depth < 1)
+                        PyErr_SetString(PyExc_ValueError, "Filter program stack underflow.");
+                    break;
+                default:
+                    PyErr_SetString(PyExc_ValueError, "Invalid filter program op.");
+                    break;
+            }
+            if (depth > CDR_FILTER_VM_MAX_DEPTH)
+                PyErr_SetString(PyExc_ValueError, "Filter expression too deep for the filter VM.");
+        }
+
+        Py_XDECREF(attr_type);
+        Py_XDECREF(attr_code);
+        Py_XDECREF(attr_offset);
+        Py_XDECREF(attr_size);
+        Py_XDECREF(attr_delimited);
+        Py_XDECREF(attr_cmp);
+        Py_XDECREF(attr_mode);
+        Py_XDECREF(attr_values);
+        Py_XDECREF(attr_count);
+    }
+
+    if (!PyErr_Occurred() && depth != 1)
+        PyErr_SetString(PyExc_ValueError, "Filter program must leave exactly one result.");
+    if (PyErr_Occurred()) {
+        program_free(program);
+        return NULL;
+    }
+    return program;
+}
+
+cdr_filter_vm* cdr_filter_vm_create(PyObject* v0_ops, PyObject* v2_ops)
+{
+    cdr_filter_vm* vm = (cdr_filter_vm*) PyMem_Calloc(1, sizeof(struct cdr_filter_vm_s));
+    if (vm == NULL) {
+        PyErr_NoMemory();
+        return NULL;
+    }
+
+    vm->programs[0] = program_create(v0_ops);
+    if (vm->programs[0] != NULL)
+        vm->programs[1] = program_create(v2_ops);
+    if (vm->programs[1] == NULL) {
+        cdr_filter_vm_free(vm);
+        return NULL;
+    }
+    return vm;
+}
+
+void cdr_filter_vm_free(cdr_filter_vm* vm)
+{
+    if (vm == NULL)
+        return;
+    program_free(vm->programs[0]);
+    program_free(vm->programs[1]);
+    PyMem_Free(vm);
+}
+
+static inline uint64_t read_raw(const uint8_t* data, uint32_t size, bool swap)
+{
+    uint8_t b[8];
+    memcpy(b, data, size);
+    if (swap) {
+        for (uint32_t i = 0; i < size / 2; ++i) {
+            uint8_t t = b[i];
+            b[i] = b[size - 1 - i];
+            b[size - 1 - i] = t;
+        }
+    }
+
+    switch (size) {
+        case 1: return b[0];
+        case 2: { uint16_t v; memcpy(&v, b, 2); return v; }
+        case 4: { uint32_t v; memcpy(&v, b, 4); return v; }
+        default: { uint64_t v; memcpy(&v, b, 8); return v; }
+    }
+}
+
+static bool read_member(const cdr_filter_vm_op* op, const uint8_t* data, size_t size, bool swap,
+                        cdr_filter_vm_value* out)
+{
+    if (op->delimited) {
+        if (size < 8)
+            return false;
+        if ((uint64_t) op->offset + op->size > 8 + read_raw(data + 4, 4, swap)) {
+            // Not in the data, so it has its default value
+            out->u = 0;
+            if (op->mode == 'd')
+                out->d = 0.0;
+            return true;
+        }
+    }
+    if ((size_t) op->offset + op->size > size)
+        return false;
+
+    uint64_t raw = read_raw(data + op->offset, op->size, swap);
+    int64_t i;
+    double d;
+    switch (op->code) {
+        case 'b': i = (int8_t) raw; d = (double) i; break;
+        case 'h': i = (int16_t) raw; d = (double) i; break;
+        case 'i': i = (int32_t) raw; d = (double) i; break;
+        case 'q': i = (int64_t) raw; d = (double) i; break;
+        case 'f': { float f; uint32_t r = (uint32_t) raw; memcpy(&f, &r, 4); d = f; i = 0; break; }
+        case 'd': memcpy(&d, &raw, 8); i = 0; break;
+        case '?': raw = raw != 0; i = (int64_t) raw; d = (double) raw; break;
+        default: i = (int64_t) raw; d = (double) raw; break;   // unsigned
+    }
+
+    switch (op->mode) {
+        case 'i': out->i = i; break;
+        case 'u': out->u = raw; break;
+        default: out->d = d; break;
+    }
+    return true;
+}
+
+#define CDR_FILTER_VM_COMPARE(a, b, cmp) \
+    ((cmp) == CdrFilterVMEq ? (a) == (b) : \
+     (cmp) == CdrFilterVMNe ? (a) != (b) : \
+     (cmp) == CdrFilterVMLt ? (a) < (b) : \
+     (cmp) == CdrFilterVMLe ? (a) <= (b) : \
+     (cmp) == CdrFilterVMGt ? (a) > (b) : (a) >= (b))
+
+static inline bool compare(const cdr_filter_vm_op* op, cdr_filter_vm_value v, cdr_filter_vm_value w,
+                           cdr_filter_vm_compare cmp)
+{
+    switch (op->mode) {
+        case 'i': return CDR_FILTER_VM_COMPARE(v.i, w.i, cmp);
+        case 'u': return CDR_FILTER_VM_COMPARE(v.u, w.u, cmp);
+        default: return CDR_FILTER_VM_COMPARE(v.d, w.d, cmp);
+    }
+}
+
+bool cdr_filter_vm_eval(const cdr_filter_vm* vm, const uint8_t* data, size_t size)
+{
+    bool stack[CDR_FILTER_VM_MAX_DEPTH];
+    int top = 0;
+
+    if (size < 4)
+        return false;
+
+    const cdr_filter_vm_op* op = vm->programs[data[1] > 1 ? 1 : 0];
+    bool swap = ((data[1] & 1) == 1) != native_little_endian();
+
+    for (; op->type != CdrFilterVMOpDone; ++op) {
+        switch (op->type) {
+            case CdrFilterVMOpCompare:
+            case CdrFilterVMOpIn: {
+                cdr_filter_vm_value v;
+                if (!read_member(op, data, size, swap, &v))
+                    return false;
+                bool result = false;
+                if (op->type == CdrFilterVMOpCompare)
+                    result = compare(op, v, op->values[0], op->cmp);
+                else
+                    for (uint32_t j = 0; j < op->count && !result; ++j)
+                        result = compare(op, v, op->values[j], CdrFilterVMEq);
+                stack[top++] = result;
+                break;
+            }
+            case CdrFilterVMOpAnd:
+            case CdrFilterVMOpOr: {
+                bool result = op->type == CdrFilterVMOpAnd;
+                for (uint32_t j = 0; j < op->count; ++j) {
+                    if (op->type == CdrFilterVMOpAnd)
+                        result = result && stack[top - 1 - (int) j];
+                    else
+                        result = result || stack[top - 1 - (int) j];
+                }
+                top -= (int) op->count;
+                stack[top++] = result;
+                break;
+            }
+            case CdrFilterVMOpNot:
+                stack[top - 1] = !stack[top - 1];
+                break;
+            default:
+                return false;
+        }
+    }
+    return stack[top - 1];
+}
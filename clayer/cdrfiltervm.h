@@ -0,0 +1,75 @@
+#ifndef CDR_FILTER_VM_H
+#define CDR_FILTER_VM_H
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+
+#include <stdbool.h>
+#include <stddef.h>
+#include <stdint.h>
+
+// Mirrors cyclonedds.idl._support.CdrFilterVMOpType
+typedef enum
+{
+    CdrFilterVMOpDone,
+    CdrFilterVMOpCompare,
+    CdrFilterVMOpIn,
+    CdrFilterVMOpAnd,
+    CdrFilterVMOpOr,
+    CdrFilterVMOpNot
+}
+cdr_filter_vm_op_type;
+
+// Mirrors cyclonedds.idl._support.CdrFilterVMCompare
+typedef enum
+{
+    CdrFilterVMEq,
+    CdrFilterVMNe,
+    CdrFilterVMLt,
+    CdrFilterVMLe,
+    CdrFilterVMGt,
+    CdrFilterVMGe
+}
+cdr_filter_vm_compare;
+
+typedef union
+{
+    int64_t i;
+    uint64_t u;
+    double d;
+}
+cdr_filter_vm_value;
+
+typedef struct cdr_filter_vm_op_s
+{
+    cdr_filter_vm_op_type type;
+    char code;                      // struct module format character of the member
+    char mode;                      // compare as int64 ('i'), uint64 ('u') or double ('d')
+    bool delimited;                 // member of an appendable struct, default when beyond the dheader
+    cdr_filter_vm_compare cmp;
+    uint32_t offset;                // offset of the member including the encapsulation header
+    uint32_t size;
+    uint32_t count;                 // number of values (compare, in) or operands (and, or)
+    cdr_filter_vm_value* values;
+}
+cdr_filter_vm_op;
+
+#define CDR_FILTER_VM_MAX_DEPTH 64
+
+// One program for XCDR1 and one for XCDR2 data
+typedef struct cdr_filter_vm_s
+{
+    cdr_filter_vm_op* programs[2];
+}
+cdr_filter_vm;
+
+/* Create from two lists of cyclonedds.idl._support.CdrFilterVmOp, returns NULL with a
+   Python exception set on failure. */
+cdr_filter_vm* cdr_filter_vm_create(PyObject* v0_ops, PyObject* v2_ops);
+void cdr_filter_vm_free(cdr_filter_vm* vm);
+
+/* Evaluate on serialized data, starting with the encapsulation header. Does not need the GIL,
+   truncated data does not match. */
+bool cdr_filter_vm_eval(const cdr_filter_vm* vm, const uint8_t* data, size_t size);
+
+#endif // CDR_FILTER_VM_H
@@ -0,0 +1,678 @@
+/*
+ * Copyright(c) 2021 ADLINK Technology Limited and others
+ *
+ * This program and the accompanying materials are made available under the
+ * terms of the Eclipse Public License v. 2.0 which is available at
+ * http://www.eclipse.org/legal/epl-2.0, or the Eclipse Distribution License
+ * v. 1.0 which is available at
+ * http://www.eclipse.org/org/documents/edl-v10.php.
+ *
+ * SPDX-License-Identifier: EPL-2.0 OR BSD-3-Clause
+ */
+
+#include "cdrservm.h"
+#include <string.h>
+#include <math.h>
+#include <stdint.h>
+#include <limits.h>
+
+/*
+ * The serializer VM runs the op program exported by cyclonedds.idl._compiler.NativeProgram.
+ * Any situation it cannot handle (wrong value types, out of range values, truncated or
+ * corrupt streams) results in a Python exception, the Python side then falls back to the
+ * interpreted machines which produce the canonical error message.
+ */
+
+typedef union {
+    int8_t i8;
+    uint8_t u8;
+    int16_t i16;
+    uint16_t u16;
+    int32_t i32;
+    uint32_t u32;
+    int64_t i64;
+    uint64_t u64;
+    float f32;
+    double f64;
+    uint8_t b[8];
+} cdr_ser_vm_scalar;
+
+typedef struct cdr_ser_vm_state_s {
+    uint8_t* buf;
+    Py_ssize_t cap;
+    Py_ssize_t pos;
+    Py_ssize_t align_offset;
+    bool swap;
+    PyObject* out;
+} cdr_ser_vm_state;
+
+static inline bool native_little_endian(void)
+{
+    const uint16_t one = 1;
+    return *((const uint8_t*) &one) == 1;
+}
+
+static inline void swap_bytes(uint8_t* b, uint32_t size)
+{
+    for (uint32_t i = 0; i < size / 2; ++i) {
+        uint8_t t = b[i];
+        b[i] = b[size - 1 - i];
+        b[size - 1 - i] = t;
+    }
+}
+
+static inline Py_ssize_t aligned(Py_ssize_t pos, Py_ssize_t align_offset, uint8_t align)
+{
+    return ((pos - align_offset + align - 1) & ~((Py_ssize_t) align - 1)) + align_offset;
+}
+
+static void op_free_refs(cdr_ser_vm_op* op)
+{
+    Py_XDECREF(op->member);
+    Py_XDECREF(op->pytype);
+}
+
+cdr_ser_vm* cdr_ser_vm_create(PyObject* list)
+{
+    Py_ssize_t len = PyList_Size(list);
+    if (len < 0 || PyErr_Occurred())
+        return NULL;
+
+    cdr_ser_vm* vm = (cdr_ser_vm*) PyMem_Malloc(sizeof(struct cdr_ser_vm_s));
+    if (vm == NULL) {
+        PyErr_NoMemory();
+        return NULL;
+    }
+
+    vm->instructions = (cdr_ser_vm_op*) PyMem_Calloc((size_t) len + 1, sizeof(struct cdr_ser_vm_op_s));
+    if (vm->instructions == NULL) {
+        PyMem_Free(vm);
+        PyErr_NoMemory();
+        return NULL;
+    }
+    vm->instructions[len].type = CdrSerVMOpDone;
+
+    int depth = 0;
+    for (Py_ssize_t i = 0; i < len; ++i) {
+        PyObject* borrow_i = PyList_GetItem(list, i);
+        cdr_ser_vm_op* op = &vm->instructions[i];
+
+        PyObject* attr_type = PyObject_GetAttrString(borrow_i, "type");
+        PyObject* attr_code = PyObject_GetAttrString(borrow_i, "code");
+        PyObject* attr_align = PyObject_GetAttrString(borrow_i, "align");
+        PyObject* attr_size = PyObject_GetAttrString(borrow_i, "size");
+        PyObject* attr_length = PyObject_GetAttrString(borrow_i, "length");
+        PyObject* attr_member = PyObject_GetAttrString(borrow_i, "member");
+        PyObject* attr_pytype = PyObject_GetAttrString(borrow_i, "pytype");
+
+        if (attr_type && attr_code && attr_align && attr_size && attr_length && attr_member && attr_pytype) {
+            op->type = (cdr_ser_vm_op_type) PyLong_AsUnsignedLong(attr_type);
+            op->align = (uint8_t) PyLong_AsUnsignedLong(attr_align);
+            op->size = (uint32_t) PyLong_AsUnsignedLong(attr_size);
+            op->length = (uint32_t) PyLong_AsUnsignedLong(attr_length);
+            if (PyUnicode_Check(attr_code) && PyUnicode_GetLength(attr_code) == 1)
+                op->code = (char) PyUnicode_ReadChar(attr_code, 0);
+            if (attr_member != Py_None) {
+                Py_INCREF(attr_member);
+                PyUnicode_InternInPlace(&attr_member);
+                op->member = attr_member;
+            }
+            if (attr_pytype != Py_None) {
+                Py_INCREF(attr_pytype);
+                op->pytype = attr_pytype;
+            }
+        }
+
+        Py_XDECREF(attr_type);
+        Py_XDECREF(attr_code);
+        Py_XDECREF(attr_align);
+        Py_XDECREF(attr_size);
+        Py_XDECREF(attr_length);
+        Py_XDECREF(attr_member);
+        Py_XDECREF(attr_pytype);
+
+        if (op->type == CdrSerVMOpStructBegin && ++depth > CDR_SER_VM_MAX_DEPTH)
+            PyErr_SetString(PyExc_ValueError, "Type nesting too deep for the serializer VM.");
+        else if (op->type == CdrSerVMOpStructEnd)
+            --depth;
+        else if (op->align == 0)
+            op->align = 1;
+
+        if (PyErr_Occurred()) {
+            vm->instructions[i + 1].type = CdrSerVMOpDone;
+            cdr_ser_vm_free(vm);
+            return NULL;
+        }
+    }
+
+    return vm;
+}
+
+void cdr_ser_vm_free(cdr_ser_vm* vm)
+{
+    if (vm == NULL) return;
+    for (cdr_ser_vm_op* op = vm->instructions; op->type != CdrSerVMOpDone; ++op)
+        op_free_refs(op);
+    PyMem_Free(vm->instructions);
+    PyMem_Free(vm);
+}
+
+/* Serialization */
+
+static int ser_reserve(cdr_ser_vm_state* s, Py_ssize_t n)
+{
+    if (s->pos + n <= s->cap) return 0;
+
+    Py_ssize_t cap = s->cap < 64 ? 64 : s->cap;
+    while (cap < s->pos + n)
+        cap *= 2;
+
+    if (PyByteArray_Resize(s->out, cap) < 0) return -1;
+    s->buf = (uint8_t*) PyByteArray_AS_STRING(s->out);
+    // The Python machines expect a zeroed buffer when they take over after a failure
+    memset(s->buf + s->cap, 0, (size_t) (cap - s->cap));
+    s->cap = cap;
+    return 0;
+}
+
+static int ser_align(cdr_ser_vm_state* s, uint8_t align)
+{
+    Py_ssize_t pos = aligned(s->pos, s->align_offset, align);
+    if (pos > s->pos) {
+        if (ser_reserve(s, pos - s->pos) < 0) return -1;
+        memset(s->buf + s->pos, 0, (size_t) (pos - s->pos));
+        s->pos = pos;
+    }
+    return 0;
+}
+
+static int ser_raw(cdr_ser_vm_state* s, cdr_ser_vm_scalar* v, uint32_t size)
+{
+    if (ser_reserve(s, size) < 0) return -1;
+    if (s->swap && size > 1)
+        swap_bytes(v->b, size);
+    memcpy(s->buf + s->pos, v->b, size);
+    s->pos += size;
+    return 0;
+}
+
+static int ser_u32(cdr_ser_vm_state* s, uint32_t value)
+{
+    cdr_ser_vm_scalar v;
+    v.u32 = value;
+    return ser_raw(s, &v, 4);
+}
+
+static int range_error(void)
+{
+    PyErr_SetString(PyExc_OverflowError, "Value out of range for its IDL type.");
+    return -1;
+}
+
+static int ser_signed(PyObject* value, long long min, long long max, long long* out)
+{
+    *out = PyLong_AsLongLong(value);
+    if (*out == -1 && PyErr_Occurred()) return -1;
+    if (*out < min || *out > max) return range_error();
+    return 0;
+}
+
+static int ser_unsigned(PyObject* value, unsigned long long max, unsigned long long* out)
+{
+    *out = PyLong_AsUnsignedLongLong(value);
+    if (*out == (unsigned long long) -1 && PyErr_Occurred()) return -1;
+    if (*out > max) return range_error();
+    return 0;
+}
+
+static int ser_primitive(cdr_ser_vm_state* s, const cdr_ser_vm_op* op, PyObject* value)
+{
+    cdr_ser_vm_scalar v;
+    long long sv;
+    unsigned long long uv;
+    double d;
+
+    switch (op->code) {
+        case 'b':
+            if (ser_signed(value, INT8_MIN, INT8_MAX, &sv) < 0) return -1;
+            v.i8 = (int8_t) sv;
+            break;
+        case 'h':
+            if (ser_signed(value, INT16_MIN, INT16_MAX, &sv) < 0) return -1;
+            v.i16 = (int16_t) sv;
+            break;
+        case 'i':
+            if (ser_signed(value, INT32_MIN, INT32_MAX, &sv) < 0) return -1;
+            v.i32 = (int32_t) sv;
+            break;
+        case 'q':
+            if (ser_signed(value, LLONG_MIN, LLONG_MAX, &sv) < 0) return -1;
+            v.i64 = (int64_t) sv;
+            break;
+        case 'B':
+            if (ser_unsigned(value, UINT8_MAX, &uv) < 0) return -1;
+            v.u8 = (uint8_t) uv;
+            break;
+        case 'H':
+            if (ser_unsigned(value, UINT16_MAX, &uv) < 0) return -1;
+            v.u16 = (uint16_t) uv;
+            break;
+        case 'I':
+            if (ser_unsigned(value, UINT32_MAX, &uv) < 0) return -1;
+            v.u32 = (uint32_t) uv;
+            break;
+        case 'Q':
+            if (ser_unsigned(value, ULLONG_MAX, &uv) < 0) return -1;
+            v.u64 = (uint64_t) uv;
+            break;
+        case '?': {
+            int truth = PyObject_IsTrue(value);
+            if (truth < 0) return -1;
+            v.u8 = (uint8_t) truth;
+            break;
+        }
+        case 'f':
+            d = PyFloat_AsDouble(value);
+            if (d == -1.0 && PyErr_Occurred()) return -1;
+            v.f32 = (float) d;
+            // Same rule as struct.pack: finite values that round to infinity are rejected
+            if (isinf(v.f32) && !isinf(d)) return range_error();
+            break;
+        case 'd':
+            d = PyFloat_AsDouble(value);
+            if (d == -1.0 && PyErr_Occurred()) return -1;
+            v.f64 = d;
+            break;
+        default:
+            PyErr_Format(PyExc_ValueError, "Unsupported primitive code '%c'.", op->code);
+            return -1;
+    }
+
+    return ser_raw(s, &v, op->size);
+}
+
+static int ser_char(cdr_ser_vm_state* s, PyObject* value)
+{
+    if (!PyUnicode_Check(value) || PyUnicode_GetLength(value) != 1) {
+        PyErr_SetString(PyExc_TypeError, "Expected a string of length one for char.");
+        return -1;
+    }
+    Py_UCS4 c = PyUnicode_ReadChar(value, 0);
+    if (c > INT8_MAX) return range_error();
+
+    cdr_ser_vm_scalar v;
+    v.u8 = (uint8_t) c;
+    return ser_raw(s, &v, 1);
+}
+
+static int ser_string(cdr_ser_vm_state* s, const cdr_ser_vm_op* op, PyObject* value)
+{
+    Py_ssize_t len;
+    const char* utf8;
+
+    if (!PyUnicode_Check(value)) {
+        PyErr_SetString(PyExc_TypeError, "Expected a str.");
+        return -1;
+    }
+    if (op->length && PyUnicode_GetLength(value) > (Py_ssize_t) op->length) {
+        PyErr_SetString(PyExc_ValueError, "String longer than bound.");
+        return -1;
+    }
+    if ((utf8 = PyUnicode_AsUTF8AndSize(value, &len)) == NULL) return -1;
+    if ((size_t) len >= UINT32_MAX) return range_error();
+
+    if (ser_align(s, 4) < 0) return -1;
+    if (ser_u32(s, (uint32_t) len + 1) < 0) return -1;
+    if (ser_reserve(s, len + 1) < 0) return -1;
+    memcpy(s->buf + s->pos, utf8, (size_t) len);
+    s->buf[s->pos + len] = 0;
+    s->pos += len + 1;
+    return 0;
+}
+
+static int ser_primitives(cdr_ser_vm_state* s, const cdr_ser_vm_op* op, PyObject* value, bool sequence)
+{
+    PyObject* fast = PySequence_Fast(value, "Expected a sequence.");
+    if (fast == NULL) return -1;
+
+    Py_ssize_t n = PySequence_Fast_GET_SIZE(fast);
+    PyObject** items = PySequence_Fast_ITEMS(fast);
+    int ret = -1;
+
+    if (sequence) {
+        if ((op->length && n > (Py_ssize_t) op->length) || (size_t) n > UINT32_MAX) {
+            PyErr_SetString(PyExc_ValueError, "Sequence longer than bound.");
+            goto out;
+        }
+        if (ser_align(s, 4) < 0 || ser_u32(s, (uint32_t) n) < 0) goto out;
+        if (n == 0) {
+            ret = 0;
+            goto out;
+        }
+    }
+    else if (n != (Py_ssize_t) op->length) {
+        PyErr_SetString(PyExc_ValueError, "Incorrectly sized array.");
+        goto out;
+    }
+
+    if (ser_align(s, op->align) < 0 || ser_reserve(s, n * op->size) < 0) goto out;
+    for (Py_ssize_t i = 0; i < n; ++i) {
+        if (ser_primitive(s, op, items[i]) < 0) goto out;
+    }
+    ret = 0;
+
+out:
+    Py_DECREF(fast);
+    return ret;
+}
+
+Py_ssize_t cdr_ser_vm_serialize(cdr_ser_vm* vm, PyObject* value, PyObject* out, Py_ssize_t pos,
+                                Py_ssize_t align_offset, bool little_endian)
+{
+    PyObject* objects[CDR_SER_VM_MAX_DEPTH + 1];
+    Py_ssize_t headers[CDR_SER_VM_MAX_DEPTH + 1];
+    size_t depth = 0, hdepth = 0;
+    cdr_ser_vm_state s;
+    const cdr_ser_vm_op* op = vm->instructions;
+
+    if (!PyByteArray_Check(out)) {
+        PyErr_SetString(PyExc_TypeError, "Output buffer must be a bytearray.");
+        return -1;
+    }
+
+    s.out = out;
+    s.buf = (uint8_t*) PyByteArray_AS_STRING(out);
+    s.cap = PyByteArray_GET_SIZE(out);
+    s.pos = pos;
+    s.align_offset = align_offset;
+    s.swap = little_endian != native_little_endian();
+
+    objects[0] = value;
+    Py_INCREF(value);
+
+    for (; op->type != CdrSerVMOpDone; ++op) {
+        PyObject* current = objects[depth];
+        PyObject* member = NULL;
+        int ret = 0;
+
+        if (op->member != NULL && op->type != CdrSerVMOpStructEnd &&
+            op->type != CdrSerVMOpAppendableBegin && op->type != CdrSerVMOpAppendableEnd) {
+            if ((member = PyObject_GetAttr(current, op->member)) == NULL) goto error;
+        }
+
+        switch (op->type) {
+            case CdrSerVMOpPrimitive:
+                ret = ser_align(&s, op->align);
+                if (ret == 0) ret = ser_primitive(&s, op, member);
+                break;
+            case CdrSerVMOpChar:
+                ret = ser_char(&s, member);
+                break;
+            case CdrSerVMOpString:
+                ret = ser_string(&s, op, member);
+                break;
+            case CdrSerVMOpArrayOfPrimitive:
+                ret = ser_primitives(&s, op, member, false);
+                break;
+            case CdrSerVMOpSequenceOfPrimitive:
+                ret = ser_primitives(&s, op, member, true);
+                break;
+            case CdrSerVMOpStructBegin:
+                if (member != NULL) {
+                    objects[++depth] = member;
+                    member = NULL;
+                }
+                else {
+                    // Outermost struct is the value itself
+                    objects[++depth] = current;
+                    Py_INCREF(current);
+                }
+                break;
+            case CdrSerVMOpStructEnd:
+                Py_DECREF(objects[depth]);
+                depth--;
+                break;
+            case CdrSerVMOpAppendableBegin:
+                ret = ser_align(&s, 4);
+                if (ret == 0) ret = ser_u32(&s, 0);
+                headers[hdepth++] = s.pos;
+                break;
+            case CdrSerVMOpAppendableEnd: {
+                Py_ssize_t end = s.pos, dpos = headers[--hdepth];
+                s.pos = dpos - 4;
+                ret = ser_u32(&s, (uint32_t) (end - dpos));
+                s.pos = end;
+                break;
+            }
+            case CdrSerVMOpDone:
+                break;
+        }
+
+        Py_XDECREF(member);
+        if (ret < 0) goto error;
+    }
+
+    Py_DECREF(objects[0]);
+    return s.pos;
+
+error:
+    while (depth > 0)
+        Py_DECREF(objects[depth--]);
+    Py_DECREF(objects[0]);
+    return -1;
+}
+
+/* Deserialization */
+
+typedef struct cdr_deser_vm_state_s {
+    const uint8_t* buf;
+    Py_ssize_t limit;
+    Py_ssize_t pos;
+    Py_ssize_t align_offset;
+    bool swap;
+} cdr_deser_vm_state;
+
+static int deser_check(cdr_deser_vm_state* s, Py_ssize_t n)
+{
+    if (n < 0 || s->pos + n > s->limit) {
+        PyErr_SetString(PyExc_ValueError, "Stream ends before the end of the data.");
+        return -1;
+    }
+    return 0;
+}
+
+static int deser_raw(cdr_deser_vm_state* s, cdr_ser_vm_scalar* v, uint32_t size)
+{
+    if (deser_check(s, size) < 0) return -1;
+    memcpy(v->b, s->buf + s->pos, size);
+    if (s->swap && size > 1)
+        swap_bytes(v->b, size);
+    s->pos += size;
+    return 0;
+}
+
+static int deser_u32(cdr_deser_vm_state* s, uint32_t* value)
+{
+    cdr_ser_vm_scalar v;
+    s->pos = aligned(s->pos, s->align_offset, 4);
+    if (deser_raw(s, &v, 4) < 0) return -1;
+    *value = v.u32;
+    return 0;
+}
+
+static PyObject* deser_primitive(cdr_deser_vm_state* s, const cdr_ser_vm_op* op)
+{
+    cdr_ser_vm_scalar v;
+    if (deser_raw(s, &v, op->size) < 0) return NULL;
+
+    switch (op->code) {
+        case 'b': return PyLong_FromLong(v.i8);
+        case 'h': return PyLong_FromLong(v.i16);
+        case 'i': return PyLong_FromLong(v.i32);
+        case 'q': return PyLong_FromLongLong(v.i64);
+        case 'B': return PyLong_FromUnsignedLong(v.u8);
+        case 'H': return PyLong_FromUnsignedLong(v.u16);
+        case 'I': return PyLong_FromUnsignedLong(v.u32);
+        case 'Q': return PyLong_FromUnsignedLongLong(v.u64);
+        case '?': return PyBool_FromLong(v.u8 != 0);
+        case 'f': return PyFloat_FromDouble((double) v.f32);
+        case 'd': return PyFloat_FromDouble(v.f64);
+        default:
+            PyErr_Format(PyExc_ValueError, "Unsupported primitive code '%c'.", op->code);
+            return NULL;
+    }
+}
+
+static PyObject* deser_char(cdr_deser_vm_state* s)
+{
+    cdr_ser_vm_scalar v;
+    if (deser_raw(s, &v, 1) < 0) return NULL;
+    if (v.i8 < 0) {
+        PyErr_SetString(PyExc_ValueError, "Invalid char in stream.");
+        return NULL;
+    }
+    return PyUnicode_FromOrdinal(v.i8);
+}
+
+static PyObject* deser_string(cdr_deser_vm_state* s)
+{
+    uint32_t len;
+    if (deser_u32(s, &len) < 0) return NULL;
+    if (len == 0 || deser_check(s, len) < 0) {
+        if (!PyErr_Occurred())
+            PyErr_SetString(PyExc_ValueError, "Invalid string length in stream.");
+        return NULL;
+    }
+
+    PyObject* str = PyUnicode_DecodeUTF8((const char*) s->buf + s->pos, (Py_ssize_t) len - 1, NULL);
+    s->pos += len;
+    return str;
+}
+
+static PyObject* deser_primitives(cdr_deser_vm_state* s, const cdr_ser_vm_op* op, bool sequence)
+{
+    uint32_t n = op->length;
+
+    if (sequence) {
+        if (deser_u32(s, &n) < 0) return NULL;
+        if (n == 0) return PyList_New(0);
+    }
+
+    s->pos = aligned(s->pos, s->align_offset, op->align);
+    if (deser_check(s, (Py_ssize_t) n * (Py_ssize_t) op->size) < 0) return NULL;
+
+    PyObject* list = PyList_New(n);
+    if (list == NULL) return NULL;
+
+    for (uint32_t i = 0; i < n; ++i) {
+        PyObject* item = deser_primitive(s, op);
+        if (item == NULL) {
+            Py_DECREF(list);
+            return NULL;
+        }
+        PyList_SET_ITEM(list, i, item);
+    }
+    return list;
+}
+
+PyObject* cdr_ser_vm_deserialize(cdr_ser_vm* vm, const uint8_t* data, Py_ssize_t size, Py_ssize_t pos,
+                                 Py_ssize_t align_offset, bool little_endian, Py_ssize_t* end)
+{
+    PyObject* dicts[CDR_SER_VM_MAX_DEPTH + 1];
+    const cdr_ser_vm_op* begins[CDR_SER_VM_MAX_DEPTH + 1];
+    Py_ssize_t limits[CDR_SER_VM_MAX_DEPTH + 1];
+    size_t depth = 0, hdepth = 0;
+    PyObject* result = NULL;
+    PyObject* empty = NULL;
+    cdr_deser_vm_state s;
+    const cdr_ser_vm_op* op = vm->instructions;
+
+    s.buf = data;
+    s.limit = size;
+    s.pos = pos;
+    s.align_offset = align_offset;
+    s.swap = little_endian != native_little_endian();
+
+    if ((empty = PyTuple_New(0)) == NULL) return NULL;
+
+    for (; op->type != CdrSerVMOpDone; ++op) {
+        PyObject* value = NULL;
+
+        switch (op->type) {
+            case CdrSerVMOpPrimitive:
+                s.pos = aligned(s.pos, s.align_offset, op->align);
+                value = deser_primitive(&s, op);
+                break;
+            case CdrSerVMOpChar:
+                value = deser_char(&s);
+                break;
+            case CdrSerVMOpString:
+                value = deser_string(&s);
+                break;
+            case CdrSerVMOpArrayOfPrimitive:
+                value = deser_primitives(&s, op, false);
+                break;
+            case CdrSerVMOpSequenceOfPrimitive:
+                value = deser_primitives(&s, op, true);
+                break;
+            case CdrSerVMOpStructBegin:
+                if ((dicts[++depth] = PyDict_New()) == NULL) {
+                    depth--;
+                    goto error;
+                }
+                begins[depth] = op;
+                continue;
+            case CdrSerVMOpStructEnd: {
+                const cdr_ser_vm_op* begin = begins[depth];
+                value = PyObject_Call(begin->pytype, empty, dicts[depth]);
+                Py_DECREF(dicts[depth]);
+                depth--;
+                if (value == NULL) goto error;
+                if (depth == 0) {
+                    result = value;
+                    continue;
+                }
+                if (PyDict_SetItem(dicts[depth], begin->member, value) < 0) {
+                    Py_DECREF(value);
+                    goto error;
+                }
+                Py_DECREF(value);
+                continue;
+            }
+            case CdrSerVMOpAppendableBegin: {
+                uint32_t dsize;
+                if (deser_u32(&s, &dsize) < 0 || deser_check(&s, (Py_ssize_t) dsize) < 0) goto error;
+                limits[hdepth++] = s.limit;
+                s.limit = s.pos + (Py_ssize_t) dsize;
+                continue;
+            }
+            case CdrSerVMOpAppendableEnd:
+                // Skip over members appended by newer versions of the type
+                s.pos = s.limit;
+                s.limit = limits[--hdepth];
+                continue;
+            case CdrSerVMOpDone:
+                continue;
+        }
+
+        if (value == NULL) goto error;
+        if (PyDict_SetItem(dicts[depth], op->member, value) < 0) {
+            Py_DECREF(value);
+            goto error;
+        }
+        Py_DECREF(value);
+    }
+
+    Py_DECREF(empty);
+    if (result == NULL)
+        PyErr_SetString(PyExc_ValueError, "Serializer program did not produce a value.");
+    *end = s.pos;
+    return result;
+
+error:
+    while (depth > 0)
+        Py_DECREF(dicts[depth--]);
+    Py_XDECREF(result);
+    Py_DECREF(empty);
+    return NULL;
+}
@@ -0,0 +1,60 @@
+#ifndef CDR_SER_VM_H
+#define CDR_SER_VM_H
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+
+#include <stdbool.h>
+#include <stdint.h>
+#include <stdlib.h>
+
+// Mirrors cyclonedds.idl._support.CdrSerVMOpType
+typedef enum
+{
+    CdrSerVMOpDone,
+    CdrSerVMOpPrimitive,
+    CdrSerVMOpChar,
+    CdrSerVMOpString,
+    CdrSerVMOpArrayOfPrimitive,
+    CdrSerVMOpSequenceOfPrimitive,
+    CdrSerVMOpStructBegin,
+    CdrSerVMOpStructEnd,
+    CdrSerVMOpAppendableBegin,
+    CdrSerVMOpAppendableEnd
+}
+cdr_ser_vm_op_type;
+
+typedef struct cdr_ser_vm_op_s
+{
+    cdr_ser_vm_op_type type;
+    char code;          // struct module format character of the (element) primitive
+    uint8_t align;      // effective alignment, already capped to the max alignment of the encoding
+    uint32_t size;      // size of a single (element) primitive
+    uint32_t length;    // array length or sequence/string bound, 0 is unbounded
+    PyObject* member;   // attribute name, NULL for the outermost struct
+    PyObject* pytype;   // class to construct on deserialization (struct begin only)
+}
+cdr_ser_vm_op;
+
+#define CDR_SER_VM_MAX_DEPTH 32
+
+typedef struct cdr_ser_vm_s
+{
+    cdr_ser_vm_op* instructions;
+}
+cdr_ser_vm;
+
+cdr_ser_vm* cdr_ser_vm_create(PyObject* list);
+void cdr_ser_vm_free(cdr_ser_vm* vm);
+
+/* Serialize value into the bytearray out starting at pos, growing it as needed.
+   Returns the position after the data or -1 with a Python exception set. */
+Py_ssize_t cdr_ser_vm_serialize(cdr_ser_vm* vm, PyObject* value, PyObject* out, Py_ssize_t pos,
+                                Py_ssize_t align_offset, bool little_endian);
+
+/* Deserialize from data starting at pos. Returns a new reference and stores the position
+   after the data in *end, or returns NULL with a Python exception set. */
+PyObject* cdr_ser_vm_deserialize(cdr_ser_vm* vm, const uint8_t* data, Py_ssize_t size, Py_ssize_t pos,
+                                 Py_ssize_t align_offset, bool little_endian, Py_ssize_t* end);
+
+#endif // CDR_SER_VM_H
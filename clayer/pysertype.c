@@ -19,6 +19,8 @@
 #include "dds/ddsrt/heap.h"
 #include "dds/ddsrt/mh3.h"
 #include "dds/ddsrt/md5.h"
+#include "dds/ddsrt/sync.h"
+#include "dds/ddsrt/threads.h"
 #include "dds/ddsi/q_radmin.h"
 #include "dds/ddsi/ddsi_serdata.h"
 #include "dds/ddsi/ddsi_sertype.h"
@@ -27,6 +29,8 @@
 
 
 #include "cdrkeyvm.h"
+#include "cdrservm.h"
+#include "cdrfiltervm.h"
 #include "pysertype.h"
 #ifdef DDS_HAS_TYPE_DISCOVERY
 #include "typeser.h"
@@ -139,7 +143,8 @@ typedef struct ddspy_serdata {
     size_t data_size;
     void* key;
     size_t key_size;
-    ddsi_keyhash_t hash;
+    // Keys of up to 16 bytes (padded to 16) live here, key then points at it
+    unsigned char key_inline[16];
     bool key_populated;
     bool data_is_key;
     bool is_v2;
@@ -174,74 +179,134 @@ static inline const ddspy_serdata_t* cserdata(const ddsi_serdata_t *this)
 
 static ddspy_serdata_t *ddspy_serdata_new(const struct ddsi_sertype* type, enum ddsi_serdata_kind kind, size_t data_size)
 {
-    ddspy_serdata_t *new = (ddspy_serdata_t*) dds_alloc(sizeof(struct ddspy_serdata));
+    // The data directly follows the serdata in the same allocation, so creating a
+    // serdata on the receive path costs a single allocation (keys are inline too).
+    ddspy_serdata_t *new = (ddspy_serdata_t*) dds_alloc(sizeof(struct ddspy_serdata) + data_size);
     ddsi_serdata_init((ddsi_serdata_t*) new, type, kind);
 
-    new->data = dds_alloc(data_size);
+    new->data = (unsigned char*) new + sizeof(struct ddspy_serdata);
     new->data_size = data_size;
     new->key = NULL;
     new->key_size = 0;
     new->key_populated = false;
     new->data_is_key = false;
     new->is_v2 = ((ddspy_sertype_t*)type)->is_v2_by_default;
-    memset((unsigned char*) &(new->hash), 0, 16);
 
     return new;
 }
 
 static void ddspy_serdata_calc_hash(ddspy_serdata_t* this)
 {
-    if (this->is_v2) {
-        if (csertype(this)->v2_key_maxsize_bigger_16) {
-            ddsrt_md5_state_t md5st;
-            ddsrt_md5_init(&md5st);
-            ddsrt_md5_append(&md5st, this->key, (unsigned int)this->key_size);
-            ddsrt_md5_finish(&md5st, this->hash.value);
-        } else {
-            assert(this->key_size <= 16);
-            memset(this->hash.value, 0, 16);
-            memcpy(this->hash.value, (char*) this->key, this->key_size);
-        }
-        this->c_data.hash = ddsrt_mh3(this->key, this->key_size, 0) ^ this->c_data.type->serdata_basehash;
+    // Only the hash for the instance map, which compares the full keys of colliding
+    // entries. The keyhash is computed in serdata_get_keyhash, if anyone asks for it.
+    this->c_data.hash = ddsrt_mh3(this->key, this->key_size, 0) ^ this->c_data.type->serdata_basehash;
+}
+
+static void ddspy_serdata_keyhash(const ddspy_serdata_t* this, unsigned char* keyhash)
+{
+    if (csertype(this)->keyless) {
+        memset(keyhash, 0, 16);
+    } else if (this->is_v2 ? csertype(this)->v2_key_maxsize_bigger_16 : csertype(this)->v0_key_maxsize_bigger_16) {
+        ddsrt_md5_state_t md5st;
+        ddsrt_md5_init(&md5st);
+        ddsrt_md5_append(&md5st, this->key, (unsigned int)this->key_size);
+        ddsrt_md5_finish(&md5st, keyhash);
     } else {
-        if (csertype(this)->v0_key_maxsize_bigger_16) {
-            ddsrt_md5_state_t md5st;
-            ddsrt_md5_init(&md5st);
-            ddsrt_md5_append(&md5st, this->key, (unsigned int)this->key_size);
-            ddsrt_md5_finish(&md5st, this->hash.value);
-        } else {
-            assert(this->key_size <= 16);
-            memset(this->hash.value, 0, 16);
-            memcpy(this->hash.value, (char*) this->key, this->key_size);
+        // Keys that fit are stored zero padded to 16 bytes
+        assert(this->key_size == 16);
+        memcpy(keyhash, this->key, 16);
+    }
+}
+
+
+// One key vm runner per thread, so populating a key does not allocate a runner and
+// a workspace for every sample. Runners are bound to a vm, rebind on every use.
+static ddsrt_thread_local cdr_key_vm_runner* thread_key_runner = NULL;
+
+// Runs when the thread exits, whether it is a Cyclone thread or a Python thread
+static void ddspy_key_runner_free(void* arg)
+{
+    cdr_key_vm_runner* runner = (cdr_key_vm_runner*) arg;
+    thread_key_runner = NULL;
+    dds_free(runner->workspace);
+    dds_free(runner);
+}
+
+static cdr_key_vm_runner* ddspy_key_runner(cdr_key_vm* vm)
+{
+    cdr_key_vm_runner* runner = thread_key_runner;
+    if (runner == NULL) {
+        runner = cdr_key_vm_create_runner(vm);
+        if (runner == NULL)
+            return NULL;
+        if (ddsrt_thread_cleanup_push(ddspy_key_runner_free, runner) != DDS_RETCODE_OK) {
+            ddspy_key_runner_free(runner);
+            return NULL;
         }
-        this->c_data.hash = ddsrt_mh3(this->key, this->key_size, 0) ^ this->c_data.type->serdata_basehash;
+        thread_key_runner = runner;
+        return runner;
+    }
+
+    // The vm only grows the workspace for keys without a static size
+    size_t alloc_size = vm->initial_alloc_size < 16 ? 16 : vm->initial_alloc_size;
+    if (runner->workspace_size < alloc_size) {
+        uint8_t* workspace = (uint8_t*) dds_realloc(runner->workspace, alloc_size);
+        if (workspace == NULL)
+            return NULL;
+        runner->workspace = workspace;
+        runner->workspace_size = alloc_size;
     }
+    runner->my_vm = vm;
+    return runner;
 }
 
+static void ddspy_serdata_set_key(ddspy_serdata_t* this, void* key, size_t key_size)
+{
+    if (key_size <= 16) {
+        memset(this->key_inline, 0, 16);
+        memcpy(this->key_inline, key, key_size);
+        this->key = this->key_inline;
+        this->key_size = 16;
+    } else {
+        this->key = dds_alloc(key_size);
+        memcpy(this->key, key, key_size);
+        this->key_size = key_size;
+    }
+}
 
-static void ddspy_serdata_populate_key(ddspy_serdata_t* this)
+static bool ddspy_serdata_populate_key(ddspy_serdata_t* this)
 {
     if (sertype(this)->keyless) {
-        this->key = dds_alloc(16);
+        memset(this->key_inline, 0, 16);
+        this->key = this->key_inline;
         this->key_size = 16;
-        memset(this->key, 0, 16);
-        memset(this->hash.value, 0, 16);
         this->key_populated = true;
-        return;
+        return true;
     }
 
-    cdr_key_vm_runner* runner = cdr_key_vm_create_runner(
+    cdr_key_vm_runner* runner = ddspy_key_runner(
         this->is_v2 ? csertype(this)->v2_key_vm : csertype(this)->v0_key_vm
     );
-    this->key_size = cdr_key_vm_run(runner, this->data, this->data_size);
-    if (this->key_size < 16) this->key_size = 16;
+    if (runner == NULL)
+        return false;
+    size_t key_size = cdr_key_vm_run(runner, this->data, this->data_size);
 
-    this->key = runner->workspace;
+    if (key_size <= 16) {
+        // The workspace is at least 16 bytes and zeroed beyond the key
+        memcpy(this->key_inline, runner->workspace, 16);
+        this->key = this->key_inline;
+        this->key_size = 16;
+    } else {
+        // Adopt the workspace instead of copying it, the runner gets a new one next time
+        this->key = runner->workspace;
+        this->key_size = key_size;
+        runner->workspace = NULL;
+        runner->workspace_size = 0;
+    }
     this->key_populated = true;
 
-    dds_free(runner);
-
     ddspy_serdata_calc_hash(this);
+    return true;
 }
 
 
@@ -283,6 +348,12 @@ static ddsi_serdata_t *serdata_from_ser(
     assert(fragchain->maxp1 >= off);    //CDR header must be in first fragment
 
     unsigned char* cursor = d->data;
+    if (fragchain->nextfrag == NULL) {
+        // Unfragmented sample: a single copy, no reassembly bookkeeping
+        assert(fragchain->maxp1 <= size);
+        memcpy(cursor, NN_RMSG_PAYLOADOFF(fragchain->rmsg, NN_RDATA_PAYLOAD_OFF(fragchain)), fragchain->maxp1);
+        fragchain = NULL;
+    }
     while (fragchain) {
         if (fragchain->maxp1 > off) {
             //only copy if this fragment adds data
@@ -299,7 +370,11 @@ static ddsi_serdata_t *serdata_from_ser(
     }
 
     d->is_v2 = ((char*)d->data)[1] > 1;
-    ddspy_serdata_populate_key(d);
+    if (!ddspy_serdata_populate_key(d)) {
+        // Out of memory for the key, the key is not set so the serdata is a single allocation
+        dds_free(d);
+        return NULL;
+    }
 
     switch (kind)
     {
@@ -341,7 +416,10 @@ static ddsi_serdata_t *serdata_from_ser_iov(
     }
 
     d->is_v2 = ((char*)d->data)[1] > 1;
-    ddspy_serdata_populate_key(d);
+    if (!ddspy_serdata_populate_key(d)) {
+        dds_free(d);
+        return NULL;
+    }
 
     switch (kind)
     {
@@ -386,7 +464,10 @@ static ddsi_serdata_t *serdata_from_sample(
     memcpy((char*) d->data, container->usample, container->usample_size);
 
     d->is_v2 = ((char*)d->data)[1] > 1;
-    ddspy_serdata_populate_key(d);
+    if (!ddspy_serdata_populate_key(d)) {
+        dds_free(d);
+        return NULL;
+    }
 
     switch (kind)
     {
@@ -407,6 +488,24 @@ static ddsi_serdata_t *serdata_from_sample(
     return (ddsi_serdata_t*) d;
 }
 
+// Like serdata_from_sample, but with the key already known (as produced by the key
+// vm, big endian CDR), so the key vm does not have to run over the sample again.
+static ddspy_serdata_t *ddspy_serdata_from_sample_key(
+  const ddsi_sertype_t* type,
+  const void* sample, size_t sample_size,
+  const void* key, size_t key_size)
+{
+    ddspy_serdata_t* d = ddspy_serdata_new(type, SDK_DATA, sample_size);
+    memcpy((char*) d->data, sample, sample_size);
+    d->is_v2 = ((char*)d->data)[1] > 1;
+
+    ddspy_serdata_set_key(d, (void*) key, key_size);
+    d->key_populated = true;
+    ddspy_serdata_calc_hash(d);
+
+    return d;
+}
+
 static void serdata_to_ser(const ddsi_serdata_t* dcmn, size_t off, size_t sz, void* buf)
 {
     assert(cserdata(dcmn)->key != NULL);
@@ -521,8 +620,8 @@ static void serdata_free(struct ddsi_serdata* dcmn)
     assert(cserdata(dcmn)->data_size != 0);
     assert(cserdata(dcmn)->key_size >= 16);
 
-    dds_free(serdata(dcmn)->data);
-    dds_free(serdata(dcmn)->key);
+    if (serdata(dcmn)->key != serdata(dcmn)->key_inline)
+        dds_free(serdata(dcmn)->key);
     dds_free(dcmn);
 }
 
@@ -543,9 +642,8 @@ static void serdata_get_keyhash(const ddsi_serdata_t* d, struct ddsi_keyhash* bu
     assert(cserdata(d)->key_size >= 16);
     assert(d->type != NULL);
 
-    if (csertype(cserdata(d))->keyless) {
-        memset(buf->value, 0, 16);
-    }
+    unsigned char keyhash[16];
+    ddspy_serdata_keyhash(cserdata(d), keyhash);
 
     if (force_md5 && !(
         cserdata(d)->is_v2 ?
@@ -555,12 +653,12 @@ static void serdata_get_keyhash(const ddsi_serdata_t* d, struct ddsi_keyhash* bu
     {
         ddsrt_md5_state_t md5st;
         ddsrt_md5_init(&md5st);
-        ddsrt_md5_append(&md5st, cserdata(d)->hash.value, 16);
+        ddsrt_md5_append(&md5st, keyhash, 16);
         ddsrt_md5_finish(&md5st, buf->value);
     }
     else
     {
-        memcpy(buf->value, cserdata(d)->hash.value, 16);
+        memcpy(buf->value, keyhash, 16);
     }
 }
 
@@ -1005,7 +1103,11 @@ ddspy_write(PyObject *self, PyObject *args)
     assert(sample_data.len >= 0);
     container.usample_size = (size_t)sample_data.len;
 
+    // The Py_buffer export pins the sample data (a bytearray cannot be resized while
+    // exported), so other Python threads can run while Cyclone processes the sample.
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_write(writer, &container);
+    Py_END_ALLOW_THREADS
 
     PyBuffer_Release(&sample_data);
 
@@ -1029,13 +1131,151 @@ ddspy_write_ts(PyObject *self, PyObject *args)
     assert(sample_data.len >= 0);
     container.usample_size = (size_t)sample_data.len;
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_write_ts(writer, &container, time);
+    Py_END_ALLOW_THREADS
+
+    PyBuffer_Release(&sample_data);
+
+    return PyLong_FromLong((long) sts);
+}
+
+static PyObject *
+ddspy_write_key(PyObject *self, PyObject *args)
+{
+    dds_entity_t writer;
+    dds_return_t sts;
+    const struct ddsi_sertype* type;
+    Py_buffer sample_data;
+    Py_buffer key_data;
+    (void)self;
+
+    if (!PyArg_ParseTuple(args, "iy*y*", &writer, &sample_data, &key_data))
+        return NULL;
+
+    sts = dds_get_entity_sertype(writer, &type);
+    if (sts >= 0) {
+        assert(sample_data.len >= 0 && key_data.len >= 0);
+        ddspy_serdata_t* d = ddspy_serdata_from_sample_key(
+            type, sample_data.buf, (size_t) sample_data.len, key_data.buf, (size_t) key_data.len);
+
+        // dds_writecdr takes over our reference to the serdata
+        Py_BEGIN_ALLOW_THREADS
+        sts = dds_writecdr(writer, (ddsi_serdata_t*) d);
+        Py_END_ALLOW_THREADS
+    }
+
+    PyBuffer_Release(&key_data);
+    PyBuffer_Release(&sample_data);
+
+    return PyLong_FromLong((long) sts);
+}
+
+static PyObject *
+ddspy_write_key_ts(PyObject *self, PyObject *args)
+{
+    dds_entity_t writer;
+    dds_return_t sts;
+    dds_time_t time;
+    const struct ddsi_sertype* type;
+    Py_buffer sample_data;
+    Py_buffer key_data;
+    (void)self;
 
+    if (!PyArg_ParseTuple(args, "iy*y*L", &writer, &sample_data, &key_data, &time))
+        return NULL;
+
+    sts = dds_get_entity_sertype(writer, &type);
+    if (sts >= 0) {
+        assert(sample_data.len >= 0 && key_data.len >= 0);
+        ddspy_serdata_t* d = ddspy_serdata_from_sample_key(
+            type, sample_data.buf, (size_t) sample_data.len, key_data.buf, (size_t) key_data.len);
+        d->c_data.statusinfo = 0;
+        d->c_data.timestamp.v = time;
+
+        // dds_writecdr would overwrite the timestamp, dds_forwardcdr keeps it and
+        // also takes over our reference to the serdata
+        Py_BEGIN_ALLOW_THREADS
+        sts = dds_forwardcdr(writer, (ddsi_serdata_t*) d);
+        Py_END_ALLOW_THREADS
+    }
+
+    PyBuffer_Release(&key_data);
     PyBuffer_Release(&sample_data);
 
     return PyLong_FromLong((long) sts);
 }
 
+static PyObject *
+ddspy_write_batch(PyObject *self, PyObject *args)
+{
+    ddspy_sample_container_t container;
+    dds_entity_t writer;
+    Py_buffer sample_data;
+    Py_buffer sizes_data;
+    Py_buffer timestamps_data;
+    PyObject* timestamps;
+    (void)self;
+
+    if (!PyArg_ParseTuple(args, "iy*y*O", &writer, &sample_data, &sizes_data, &timestamps))
+        return NULL;
+
+    // samples are concatenated in sample_data, sizes_data holds an uint32 size per
+    // sample and timestamps is None or holds an int64 timestamp per sample
+    const size_t count = (size_t) sizes_data.len / sizeof(uint32_t);
+    const uint32_t* sizes = (const uint32_t*) sizes_data.buf;
+    const dds_time_t* times = NULL;
+    size_t total = 0;
+
+    timestamps_data.obj = NULL;
+    if (timestamps != Py_None) {
+        if (PyObject_GetBuffer(timestamps, &timestamps_data, PyBUF_SIMPLE) < 0)
+            goto err;
+        if ((size_t) timestamps_data.len != count * sizeof(dds_time_t)) {
+            PyErr_SetString(PyExc_ValueError, "Expected one timestamp per sample");
+            goto err;
+        }
+        times = (const dds_time_t*) timestamps_data.buf;
+    }
+
+    for (size_t i = 0; i < count; ++i)
+        total += sizes[i];
+    if (total != (size_t) sample_data.len) {
+        PyErr_SetString(PyExc_ValueError, "Sample sizes do not add up to the sample data");
+        goto err;
+    }
+
+    dds_return_t* sts = dds_alloc(sizeof(dds_return_t) * (count ? count : 1));
+
+    Py_BEGIN_ALLOW_THREADS
+    const unsigned char* data = sample_data.buf;
+    for (size_t i = 0; i < count; ++i) {
+        container.usample = (void*) data;
+        container.usample_size = sizes[i];
+        sts[i] = times ? dds_write_ts(writer, &container, times[i]) : dds_write(writer, &container);
+        data += sizes[i];
+    }
+    Py_END_ALLOW_THREADS
+
+    PyObject* list = PyList_New((Py_ssize_t) count);
+    for (size_t i = 0; list && i < count; ++i)
+        PyList_SET_ITEM(list, (Py_ssize_t) i, PyLong_FromLong((long) sts[i]));
+
+    dds_free(sts);
+    if (timestamps_data.obj)
+        PyBuffer_Release(&timestamps_data);
+    PyBuffer_Release(&sizes_data);
+    PyBuffer_Release(&sample_data);
+    return list;
+
+err:
+    if (timestamps_data.obj)
+        PyBuffer_Release(&timestamps_data);
+    PyBuffer_Release(&sizes_data);
+    PyBuffer_Release(&sample_data);
+    return NULL;
+}
+
 static PyObject *
 ddspy_dispose(PyObject *self, PyObject *args)
 {
@@ -1052,7 +1292,9 @@ ddspy_dispose(PyObject *self, PyObject *args)
     assert(sample_data.len >= 0);
     container.usample_size = (size_t)sample_data.len;
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_dispose(writer, &container);
+    Py_END_ALLOW_THREADS
 
     PyBuffer_Release(&sample_data);
 
@@ -1076,7 +1318,9 @@ ddspy_dispose_ts(PyObject *self, PyObject *args)
     assert(sample_data.len >= 0);
     container.usample_size = (size_t)sample_data.len;
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_dispose_ts(writer, &container, time);
+    Py_END_ALLOW_THREADS
 
     PyBuffer_Release(&sample_data);
 
@@ -1099,7 +1343,9 @@ ddspy_writedispose(PyObject *self, PyObject *args)
     assert(sample_data.len >= 0);
     container.usample_size = (size_t)sample_data.len;
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_writedispose(writer, &container);
+    Py_END_ALLOW_THREADS
 
     PyBuffer_Release(&sample_data);
 
@@ -1123,7 +1369,9 @@ ddspy_writedispose_ts(PyObject *self, PyObject *args)
     assert(sample_data.len >= 0);
     container.usample_size = (size_t)sample_data.len;
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_writedispose_ts(writer, &container, time);
+    Py_END_ALLOW_THREADS
 
     PyBuffer_Release(&sample_data);
 
@@ -1141,7 +1389,9 @@ ddspy_dispose_handle(PyObject *self, PyObject *args)
     if (!PyArg_ParseTuple(args, "iK", &writer, &handle))
         return NULL;
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_dispose_ih(writer, handle);
+    Py_END_ALLOW_THREADS
 
     return PyLong_FromLong((long) sts);
 }
@@ -1158,7 +1408,9 @@ ddspy_dispose_handle_ts(PyObject *self, PyObject *args)
     if (!PyArg_ParseTuple(args, "iKL", &writer, &handle, &time))
         return NULL;
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_dispose_ih_ts(writer, handle, time);
+    Py_END_ALLOW_THREADS
 
     return PyLong_FromLong((long) sts);
 }
@@ -1226,8 +1478,13 @@ ddspy_read(PyObject *self, PyObject *args)
         container[i].usample = NULL;
     }
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_read(reader, (void**) rcontainer, info, Nu32, Nu32);
+    Py_END_ALLOW_THREADS
     if (sts < 0) {
+        dds_free(info);
+        dds_free(container);
+        dds_free(rcontainer);
         return PyLong_FromLong((long) sts);
     }
 
@@ -1271,8 +1528,13 @@ ddspy_take(PyObject *self, PyObject *args)
         container[i].usample = NULL;
     }
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_take(reader, (void**) rcontainer, info, Nu32, Nu32);
+    Py_END_ALLOW_THREADS
     if (sts < 0) {
+        dds_free(info);
+        dds_free(container);
+        dds_free(rcontainer);
         return PyLong_FromLong((long) sts);
     }
 
@@ -1293,6 +1555,272 @@ ddspy_take(PyObject *self, PyObject *args)
 }
 
 
+// One record per sample in the info buffer returned by ddspy_read_bulk/ddspy_take_bulk.
+// Naturally aligned without padding, this is struct format "@4Iq2Q5I4x" in Python.
+typedef struct ddspy_bulk_info {
+    uint32_t sample_state;
+    uint32_t view_state;
+    uint32_t instance_state;
+    uint32_t valid_data;
+    int64_t source_timestamp;
+    uint64_t instance_handle;
+    uint64_t publication_handle;
+    uint32_t disposed_generation_count;
+    uint32_t no_writers_generation_count;
+    uint32_t sample_rank;
+    uint32_t generation_rank;
+    uint32_t absolute_generation_rank;
+    uint32_t padding;
+} ddspy_bulk_info_t;
+
+static PyObject *
+ddspy_readtake_bulk(PyObject *args, bool take)
+{
+    uint32_t Nu32;
+    long long N;
+    dds_entity_t reader;
+    dds_return_t sts;
+
+    if (!PyArg_ParseTuple(args, "iL", &reader, &N))
+        return NULL;
+    if (!(Nu32 = check_number_of_samples(N)))
+        return NULL;
+
+    // Take references to the serdata instead of having each sample copied into its own
+    // allocation, the payloads are copied exactly once into the returned bytearray.
+    dds_sample_info_t* info = dds_alloc(sizeof(dds_sample_info_t) * Nu32);
+    struct ddsi_serdata** sds = dds_alloc(sizeof(struct ddsi_serdata*) * Nu32);
+
+    Py_BEGIN_ALLOW_THREADS
+    if (take)
+        sts = dds_takecdr(reader, sds, Nu32, info, 0);
+    else
+        sts = dds_readcdr(reader, sds, Nu32, info, 0);
+    Py_END_ALLOW_THREADS
+    if (sts < 0) {
+        dds_free(info);
+        dds_free(sds);
+        return PyLong_FromLong((long) sts);
+    }
+
+    size_t total = 0;
+    for (int32_t i = 0; i < sts; ++i)
+        total += cserdata(sds[i])->data_size;
+
+    PyObject* data = PyByteArray_FromStringAndSize(NULL, (Py_ssize_t) total);
+    PyObject* offsets = PyBytes_FromStringAndSize(NULL, (Py_ssize_t) (sizeof(uint64_t) * ((size_t) sts + 1)));
+    PyObject* infos = PyBytes_FromStringAndSize(NULL, (Py_ssize_t) (sizeof(ddspy_bulk_info_t) * (size_t) sts));
+
+    if (data && offsets && infos) {
+        unsigned char* cursor = (unsigned char*) PyByteArray_AS_STRING(data);
+        uint64_t* offs = (uint64_t*) PyBytes_AS_STRING(offsets);
+        ddspy_bulk_info_t* binfo = (ddspy_bulk_info_t*) PyBytes_AS_STRING(infos);
+        uint64_t off = 0;
+
+        for (int32_t i = 0; i < sts; ++i) {
+            const ddspy_serdata_t* d = cserdata(sds[i]);
+            memcpy(cursor + off, d->data, d->data_size);
+            offs[i] = off;
+            off += d->data_size;
+
+            binfo[i].sample_state = (uint32_t) info[i].sample_state;
+            binfo[i].view_state = (uint32_t) info[i].view_state;
+            binfo[i].instance_state = (uint32_t) info[i].instance_state;
+            binfo[i].valid_data = info[i].valid_data ? 1u : 0u;
+            binfo[i].source_timestamp = info[i].source_timestamp;
+            binfo[i].instance_handle = info[i].instance_handle;
+            binfo[i].publication_handle = info[i].publication_handle;
+            binfo[i].disposed_generation_count = info[i].disposed_generation_count;
+            binfo[i].no_writers_generation_count = info[i].no_writers_generation_count;
+            binfo[i].sample_rank = info[i].sample_rank;
+            binfo[i].generation_rank = info[i].generation_rank;
+            binfo[i].absolute_generation_rank = info[i].absolute_generation_rank;
+            binfo[i].padding = 0;
+        }
+        offs[sts] = off;
+    }
+
+    for (int32_t i = 0; i < sts; ++i)
+        ddsi_serdata_unref(sds[i]);
+    dds_free(info);
+    dds_free(sds);
+
+    if (!data || !offsets || !infos) {
+        Py_XDECREF(data);
+        Py_XDECREF(offsets);
+        Py_XDECREF(infos);
+        return NULL;
+    }
+    return Py_BuildValue("(NNN)", data, offsets, infos);
+}
+
+static PyObject *
+ddspy_read_bulk(PyObject *self, PyObject *args)
+{
+    (void)self;
+    return ddspy_readtake_bulk(args, false);
+}
+
+static PyObject *
+ddspy_take_bulk(PyObject *self, PyObject *args)
+{
+    (void)self;
+    return ddspy_readtake_bulk(args, true);
+}
+
+// A reference to the serdata of a received sample that exposes the serialized data through
+// the (read-only) buffer protocol, so samples can be decoded from Cyclone's memory directly.
+typedef struct ddspy_loan {
+    PyObject_HEAD
+    struct ddsi_serdata* sd;
+    Py_ssize_t exports;
+} ddspy_loan_t;
+
+static int loan_getbuffer(PyObject* obj, Py_buffer* view, int flags)
+{
+    ddspy_loan_t* loan = (ddspy_loan_t*) obj;
+    if (loan->sd == NULL) {
+        PyErr_SetString(PyExc_ValueError, "Loan was already returned");
+        view->obj = NULL;
+        return -1;
+    }
+    const ddspy_serdata_t* d = cserdata(loan->sd);
+    if (PyBuffer_FillInfo(view, obj, d->data, (Py_ssize_t) d->data_size, 1, flags) < 0)
+        return -1;
+    loan->exports++;
+    return 0;
+}
+
+static void loan_releasebuffer(PyObject* obj, Py_buffer* view)
+{
+    (void)view;
+    ((ddspy_loan_t*) obj)->exports--;
+}
+
+static PyObject* loan_release(PyObject* obj, PyObject* args)
+{
+    ddspy_loan_t* loan = (ddspy_loan_t*) obj;
+    (void)args;
+    if (loan->exports > 0) {
+        PyErr_SetString(PyExc_BufferError, "Cannot return a loan while its data is still referenced");
+        return NULL;
+    }
+    if (loan->sd != NULL) {
+        ddsi_serdata_unref(loan->sd);
+        loan->sd = NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject* loan_released(PyObject* obj, void* closure)
+{
+    (void)closure;
+    return PyBool_FromLong(((ddspy_loan_t*) obj)->sd == NULL);
+}
+
+static void loan_dealloc(PyObject* obj)
+{
+    ddspy_loan_t* loan = (ddspy_loan_t*) obj;
+    if (loan->sd != NULL)
+        ddsi_serdata_unref(loan->sd);
+    Py_TYPE(obj)->tp_free(obj);
+}
+
+static PyBufferProcs loan_as_buffer = {
+    .bf_getbuffer = loan_getbuffer,
+    .bf_releasebuffer = loan_releasebuffer
+};
+
+static PyMethodDef loan_methods[] = {
+    {"release", (PyCFunction) loan_release, METH_NOARGS,
+     "Return the loan to Cyclone, fails if memoryviews on the data still exist."},
+    {NULL, NULL, 0, NULL}
+};
+
+static PyGetSetDef loan_getset[] = {
+    {"released", (getter) loan_released, NULL, "True once the loan has been returned.", NULL},
+    {NULL, NULL, NULL, NULL, NULL}
+};
+
+static PyTypeObject ddspy_loan_type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "cyclonedds._clayer.SerdataLoan",
+    .tp_basicsize = sizeof(ddspy_loan_t),
+    .tp_dealloc = loan_dealloc,
+    .tp_as_buffer = &loan_as_buffer,
+    .tp_flags = Py_TPFLAGS_DEFAULT,
+    .tp_doc = "Serialized data of a received sample, loaned from Cyclone.",
+    .tp_methods = loan_methods,
+    .tp_getset = loan_getset,
+};
+
+static PyObject *
+ddspy_readtake_loan(PyObject *args, bool take)
+{
+    uint32_t Nu32;
+    long long N;
+    dds_entity_t reader;
+    dds_return_t sts;
+
+    if (!PyArg_ParseTuple(args, "iL", &reader, &N))
+        return NULL;
+    if (!(Nu32 = check_number_of_samples(N)))
+        return NULL;
+
+    dds_sample_info_t* info = dds_alloc(sizeof(dds_sample_info_t) * Nu32);
+    struct ddsi_serdata** sds = dds_alloc(sizeof(struct ddsi_serdata*) * Nu32);
+
+    Py_BEGIN_ALLOW_THREADS
+    if (take)
+        sts = dds_takecdr(reader, sds, Nu32, info, 0);
+    else
+        sts = dds_readcdr(reader, sds, Nu32, info, 0);
+    Py_END_ALLOW_THREADS
+    if (sts < 0) {
+        dds_free(info);
+        dds_free(sds);
+        return PyLong_FromLong((long) sts);
+    }
+
+    PyObject* list = PyList_New(sts);
+
+    for (int32_t i = 0; i < sts; ++i) {
+        // The loan takes over the serdata reference from dds_readcdr/dds_takecdr
+        ddspy_loan_t* loan = list ? PyObject_New(ddspy_loan_t, &ddspy_loan_type) : NULL;
+        if (loan == NULL) {
+            ddsi_serdata_unref(sds[i]);
+            continue;
+        }
+        loan->sd = sds[i];
+        loan->exports = 0;
+
+        PyObject* sampleinfo = get_sampleinfo_pyobject(&info[i]);
+        PyList_SetItem(list, i, Py_BuildValue("(NN)", (PyObject*) loan, sampleinfo)); // steals ref
+    }
+    dds_free(info);
+    dds_free(sds);
+
+    if (PyErr_Occurred()) {
+        Py_XDECREF(list);
+        return NULL;
+    }
+    return list;
+}
+
+static PyObject *
+ddspy_read_loan(PyObject *self, PyObject *args)
+{
+    (void)self;
+    return ddspy_readtake_loan(args, false);
+}
+
+static PyObject *
+ddspy_take_loan(PyObject *self, PyObject *args)
+{
+    (void)self;
+    return ddspy_readtake_loan(args, true);
+}
+
 static PyObject *
 ddspy_read_handle(PyObject *self, PyObject *args)
 {
@@ -1317,8 +1845,13 @@ ddspy_read_handle(PyObject *self, PyObject *args)
         container[i].usample = NULL;
     }
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_read_instance(reader, (void**)rcontainer, info, Nu32, Nu32, handle);
+    Py_END_ALLOW_THREADS
     if (sts < 0) {
+        dds_free(info);
+        dds_free(container);
+        dds_free(rcontainer);
         return PyLong_FromLong((long) sts);
     }
 
@@ -1363,8 +1896,13 @@ ddspy_take_handle(PyObject *self, PyObject *args)
         container[i].usample = NULL;
     }
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_take_instance(reader, (void**) rcontainer, info, Nu32, Nu32, handle);
+    Py_END_ALLOW_THREADS
     if (sts < 0) {
+        dds_free(info);
+        dds_free(container);
+        dds_free(rcontainer);
         return PyLong_FromLong((long) sts);
     }
 
@@ -1403,7 +1941,9 @@ ddspy_register_instance(PyObject *self, PyObject *args)
     handle = 0;
     container.usample_size = (size_t)sample_data.len;
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_register_instance(writer, &handle, &container);
+    Py_END_ALLOW_THREADS
 
     PyBuffer_Release(&sample_data);
 
@@ -1430,7 +1970,9 @@ ddspy_unregister_instance(PyObject *self, PyObject *args)
     assert(sample_data.len >= 0);
     container.usample_size = (size_t)sample_data.len;
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_unregister_instance(writer, &container);
+    Py_END_ALLOW_THREADS
 
     PyBuffer_Release(&sample_data);
 
@@ -1449,7 +1991,9 @@ ddspy_unregister_instance_handle(PyObject *self, PyObject *args)
     if (!PyArg_ParseTuple(args, "iK", &writer, &handle))
         return NULL;
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_unregister_instance_ih(writer, handle);
+    Py_END_ALLOW_THREADS
 
     return PyLong_FromLong((long) sts);
 }
@@ -1472,7 +2016,9 @@ ddspy_unregister_instance_ts(PyObject *self, PyObject *args)
     assert(sample_data.len >= 0);
     container.usample_size = (size_t)sample_data.len;
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_unregister_instance_ts(writer, &container, time);
+    Py_END_ALLOW_THREADS
 
     PyBuffer_Release(&sample_data);
 
@@ -1492,7 +2038,9 @@ ddspy_unregister_instance_handle_ts(PyObject *self, PyObject *args)
     if (!PyArg_ParseTuple(args, "iKL", &writer, &handle, &time))
         return NULL;
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_unregister_instance_ih_ts(writer, handle, time);
+    Py_END_ALLOW_THREADS
 
     return PyLong_FromLong((long) sts);
 }
@@ -1514,7 +2062,9 @@ ddspy_lookup_instance(PyObject *self, PyObject *args)
     assert(sample_data.len >= 0);
     container.usample_size = (size_t)sample_data.len;
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_lookup_instance(entity, &container);
+    Py_END_ALLOW_THREADS
 
     PyBuffer_Release(&sample_data);
 
@@ -1537,7 +2087,9 @@ ddspy_read_next(PyObject *self, PyObject *args)
 
     pt_container = &container;
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_read_next(reader, (void**) &pt_container, &info);
+    Py_END_ALLOW_THREADS
     if (sts < 0) {
         return PyLong_FromLong((long) sts);
     }
@@ -1571,7 +2123,9 @@ ddspy_take_next(PyObject *self, PyObject *args)
 
     pt_container = &container;
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_take_next(reader, (void**) &pt_container, &info);
+    Py_END_ALLOW_THREADS
     if (sts < 0) {
         return PyLong_FromLong((long) sts);
     }
@@ -1621,6 +2175,368 @@ ddspy_calc_key(PyObject *self, PyObject *args)
 }
 
 
+/* native serializer programs */
+
+#define DDSPY_CDR_PROGRAM_CAPSULE "cyclonedds._clayer.cdr_program"
+
+static void
+ddspy_cdr_program_destroy(PyObject *capsule)
+{
+    cdr_ser_vm_free((cdr_ser_vm*) PyCapsule_GetPointer(capsule, DDSPY_CDR_PROGRAM_CAPSULE));
+}
+
+static PyObject *
+ddspy_cdr_program(PyObject *self, PyObject *args)
+{
+    PyObject* ops;
+    (void)self;
+
+    if (!PyArg_ParseTuple(args, "O!", &PyList_Type, &ops))
+        return NULL;
+
+    cdr_ser_vm* vm = cdr_ser_vm_create(ops);
+    if (vm == NULL) return NULL;
+
+    PyObject* capsule = PyCapsule_New(vm, DDSPY_CDR_PROGRAM_CAPSULE, ddspy_cdr_program_destroy);
+    if (capsule == NULL)
+        cdr_ser_vm_free(vm);
+    return capsule;
+}
+
+static PyObject *
+ddspy_cdr_serialize(PyObject *self, PyObject *args)
+{
+    PyObject* program;
+    PyObject* value;
+    PyObject* out;
+    Py_ssize_t pos, align_offset;
+    int little_endian;
+    (void)self;
+
+    if (!PyArg_ParseTuple(args, "OOO!nnp", &program, &value, &PyByteArray_Type, &out, &pos, &align_offset, &little_endian))
+        return NULL;
+
+    cdr_ser_vm* vm = (cdr_ser_vm*) PyCapsule_GetPointer(program, DDSPY_CDR_PROGRAM_CAPSULE);
+    if (vm == NULL) return NULL;
+
+    Py_ssize_t end = cdr_ser_vm_serialize(vm, value, out, pos, align_offset, (bool) little_endian);
+    if (end < 0) return NULL;
+
+    return PyLong_FromSsize_t(end);
+}
+
+static PyObject *
+ddspy_cdr_deserialize(PyObject *self, PyObject *args)
+{
+    PyObject* program;
+    Py_buffer data;
+    Py_ssize_t pos, align_offset, end = 0;
+    int little_endian;
+    (void)self;
+
+    if (!PyArg_ParseTuple(args, "Oy*nnp", &program, &data, &pos, &align_offset, &little_endian))
+        return NULL;
+
+    cdr_ser_vm* vm = (cdr_ser_vm*) PyCapsule_GetPointer(program, DDSPY_CDR_PROGRAM_CAPSULE);
+    if (vm == NULL) {
+        PyBuffer_Release(&data);
+        return NULL;
+    }
+
+    PyObject* value = cdr_ser_vm_deserialize(
+        vm, (const uint8_t*) data.buf, data.len, pos, align_offset, (bool) little_endian, &end);
+    PyBuffer_Release(&data);
+
+    if (value == NULL) return NULL;
+    return Py_BuildValue("(Nn)", value, end);
+}
+
+
+/* filter programs and query conditions */
+
+#define DDSPY_FILTER_PROGRAM_CAPSULE "cyclonedds._clayer.filter_program"
+#define DDSPY_QUERY_SLOT_CAPSULE "cyclonedds._clayer.query_slot"
+#define DDSPY_QUERY_SLOTS 32
+
+/* Cyclone passes nothing but the sample to the filter of a query condition, so each filter
+   program in use by a query condition takes a slot with its own trampoline function. Slots
+   are only taken and released with the GIL held, the trampolines read them without it.
+   A slot is released after its query condition has been deleted. */
+static PyObject* query_slot_programs[DDSPY_QUERY_SLOTS];
+static const cdr_filter_vm* query_slot_vms[DDSPY_QUERY_SLOTS];
+
+static bool
+ddspy_query_filter(int slot, const void* sample)
+{
+    const ddspy_sample_container_t* container = (const ddspy_sample_container_t*) sample;
+    const cdr_filter_vm* vm = query_slot_vms[slot];
+    return vm != NULL && container->usample != NULL &&
+        cdr_filter_vm_eval(vm, (const uint8_t*) container->usample, container->usample_size);
+}
+
+#define DDSPY_QUERY_FILTER(n) \
+    static bool ddspy_query_filter_##n(const void* sample) { return ddspy_query_filter(n, sample); }
+
+DDSPY_QUERY_FILTER(0) DDSPY_QUERY_FILTER(1) DDSPY_QUERY_FILTER(2) DDSPY_QUERY_FILTER(3)
+DDSPY_QUERY_FILTER(4) DDSPY_QUERY_FILTER(5) DDSPY_QUERY_FILTER(6) DDSPY_QUERY_FILTER(7)
+DDSPY_QUERY_FILTER(8) DDSPY_QUERY_FILTER(9) DDSPY_QUERY_FILTER(10) DDSPY_QUERY_FILTER(11)
+DDSPY_QUERY_FILTER(12) DDSPY_QUERY_FILTER(13) DDSPY_QUERY_FILTER(14) DDSPY_QUERY_FILTER(15)
+DDSPY_QUERY_FILTER(16) DDSPY_QUERY_FILTER(17) DDSPY_QUERY_FILTER(18) DDSPY_QUERY_FILTER(19)
+DDSPY_QUERY_FILTER(20) DDSPY_QUERY_FILTER(21) DDSPY_QUERY_FILTER(22) DDSPY_QUERY_FILTER(23)
+DDSPY_QUERY_FILTER(24) DDSPY_QUERY_FILTER(25) DDSPY_QUERY_FILTER(26) DDSPY_QUERY_FILTER(27)
+DDSPY_QUERY_FILTER(28) DDSPY_QUERY_FILTER(29) DDSPY_QUERY_FILTER(30) DDSPY_QUERY_FILTER(31)
+
+static const dds_querycondition_filter_fn ddspy_query_filters[DDSPY_QUERY_SLOTS] = {
+    ddspy_query_filter_0, ddspy_query_filter_1, ddspy_query_filter_2, ddspy_query_filter_3,
+    ddspy_query_filter_4, ddspy_query_filter_5, ddspy_query_filter_6, ddspy_query_filter_7,
+    ddspy_query_filter_8, ddspy_query_filter_9, ddspy_query_filter_10, ddspy_query_filter_11,
+    ddspy_query_filter_12, ddspy_query_filter_13, ddspy_query_filter_14, ddspy_query_filter_15,
+    ddspy_query_filter_16, ddspy_query_filter_17, ddspy_query_filter_18, ddspy_query_filter_19,
+    ddspy_query_filter_20, ddspy_query_filter_21, ddspy_query_filter_22, ddspy_query_filter_23,
+    ddspy_query_filter_24, ddspy_query_filter_25, ddspy_query_filter_26, ddspy_query_filter_27,
+    ddspy_query_filter_28, ddspy_query_filter_29, ddspy_query_filter_30, ddspy_query_filter_31
+};
+
+static void
+ddspy_filter_program_destroy(PyObject *capsule)
+{
+    cdr_filter_vm_free((cdr_filter_vm*) PyCapsule_GetPointer(capsule, DDSPY_FILTER_PROGRAM_CAPSULE));
+}
+
+static PyObject *
+ddspy_filter_program(PyObject *self, PyObject *args)
+{
+    PyObject* v0_ops;
+    PyObject* v2_ops;
+    (void)self;
+
+    if (!PyArg_ParseTuple(args, "O!O!", &PyList_Type, &v0_ops, &PyList_Type, &v2_ops))
+        return NULL;
+
+    cdr_filter_vm* vm = cdr_filter_vm_create(v0_ops, v2_ops);
+    if (vm == NULL) return NULL;
+
+    PyObject* capsule = PyCapsule_New(vm, DDSPY_FILTER_PROGRAM_CAPSULE, ddspy_filter_program_destroy);
+    if (capsule == NULL)
+        cdr_filter_vm_free(vm);
+    return capsule;
+}
+
+static PyObject *
+ddspy_filter_eval(PyObject *self, PyObject *args)
+{
+    PyObject* program;
+    Py_buffer data;
+    (void)self;
+
+    if (!PyArg_ParseTuple(args, "Oy*", &program, &data))
+        return NULL;
+
+    cdr_filter_vm* vm = (cdr_filter_vm*) PyCapsule_GetPointer(program, DDSPY_FILTER_PROGRAM_CAPSULE);
+    bool result = vm != NULL && cdr_filter_vm_eval(vm, (const uint8_t*) data.buf, (size_t) data.len);
+    PyBuffer_Release(&data);
+
+    if (vm == NULL) return NULL;
+    return PyBool_FromLong(result);
+}
+
+static void
+ddspy_query_slot_release(PyObject *capsule)
+{
+    intptr_t slot = (intptr_t) PyCapsule_GetPointer(capsule, DDSPY_QUERY_SLOT_CAPSULE) - 1;
+    if (slot < 0 || slot >= DDSPY_QUERY_SLOTS)
+        return;
+
+    query_slot_vms[slot] = NULL;
+    Py_CLEAR(query_slot_programs[slot]);
+}
+
+static PyObject *
+ddspy_query_slot(PyObject *self, PyObject *args)
+{
+    PyObject* program;
+    (void)self;
+
+    if (!PyArg_ParseTuple(args, "O", &program))
+        return NULL;
+
+    cdr_filter_vm* vm = (cdr_filter_vm*) PyCapsule_GetPointer(program, DDSPY_FILTER_PROGRAM_CAPSULE);
+    if (vm == NULL) return NULL;
+
+    for (intptr_t slot = 0; slot < DDSPY_QUERY_SLOTS; ++slot) {
+        if (query_slot_programs[slot] != NULL)
+            continue;
+
+        // The capsule pointer may not be NULL, hence the offset
+        PyObject* capsule = PyCapsule_New((void*) (slot + 1), DDSPY_QUERY_SLOT_CAPSULE, ddspy_query_slot_release);
+        if (capsule == NULL) return NULL;
+
+        Py_INCREF(program);
+        query_slot_programs[slot] = program;
+        query_slot_vms[slot] = vm;
+        return Py_BuildValue("(NN)", PyLong_FromVoidPtr((void*) ddspy_query_filters[slot]), capsule);
+    }
+
+    // All slots in use, the caller evaluates the program from a Python filter instead
+    Py_RETURN_NONE;
+}
+
+
+/* content filtered topics */
+
+#define DDSPY_TOPIC_FILTER_CAPSULE "cyclonedds._clayer.topic_filter"
+
+/* The filter of a topic runs a filter program without the GIL, or calls a Python function
+   with the serialized data when the expression has no program. The program and function are
+   only replaced with the GIL and the write lock held, so holding either one is enough to use
+   them. The lock is never waited for while holding the GIL the other way around. */
+typedef struct ddspy_topic_filter {
+    ddsrt_rwlock_t lock;
+    dds_entity_t topic;
+    PyObject* program;
+    const cdr_filter_vm* vm;
+    PyObject* fallback;
+} ddspy_topic_filter_t;
+
+static bool
+ddspy_topic_filter_accept(const void* sample, void* arg)
+{
+    ddspy_topic_filter_t* filter = (ddspy_topic_filter_t*) arg;
+    const ddspy_sample_container_t* container = (const ddspy_sample_container_t*) sample;
+    bool result = false;
+
+    if (container->usample == NULL)
+        return false;
+
+    ddsrt_rwlock_read(&filter->lock);
+    const cdr_filter_vm* vm = filter->vm;
+    if (vm != NULL)
+        result = cdr_filter_vm_eval(vm, (const uint8_t*) container->usample, container->usample_size);
+    ddsrt_rwlock_unlock(&filter->lock);
+    if (vm != NULL)
+        return result;
+
+    PyGILState_STATE state = PyGILState_Ensure();
+    if (filter->vm != NULL) {
+        result = cdr_filter_vm_eval(filter->vm, (const uint8_t*) container->usample, container->usample_size);
+    }
+    else if (filter->fallback != NULL) {
+        PyObject* value = PyObject_CallFunction(filter->fallback, "y#", (const char*) container->usample,
+                                                (Py_ssize_t) container->usample_size);
+        result = value != NULL && PyObject_IsTrue(value) == 1;
+        Py_XDECREF(value);
+        // Exceptions cannot go into C, the sample is rejected
+        if (PyErr_Occurred()) PyErr_Clear();
+    }
+    PyGILState_Release(state);
+    return result;
+}
+
+static bool
+ddspy_topic_filter_replace(ddspy_topic_filter_t* filter, PyObject* program, PyObject* fallback)
+{
+    const cdr_filter_vm* vm = NULL;
+    if (program != Py_None) {
+        vm = (const cdr_filter_vm*) PyCapsule_GetPointer(program, DDSPY_FILTER_PROGRAM_CAPSULE);
+        if (vm == NULL) return false;
+    }
+    if (!PyCallable_Check(fallback)) {
+        PyErr_SetString(PyExc_TypeError, "Filter fallback must be callable.");
+        return false;
+    }
+
+    PyObject* old_program = filter->program;
+    PyObject* old_fallback = filter->fallback;
+    Py_XINCREF(vm != NULL ? program : NULL);
+    Py_INCREF(fallback);
+
+    ddsrt_rwlock_write(&filter->lock);
+    filter->program = vm != NULL ? program : NULL;
+    filter->vm = vm;
+    filter->fallback = fallback;
+    ddsrt_rwlock_unlock(&filter->lock);
+
+    Py_XDECREF(old_program);
+    Py_XDECREF(old_fallback);
+    return true;
+}
+
+static void
+ddspy_topic_filter_destroy(PyObject *capsule)
+{
+    ddspy_topic_filter_t* filter = (ddspy_topic_filter_t*) PyCapsule_GetPointer(capsule, DDSPY_TOPIC_FILTER_CAPSULE);
+    if (filter == NULL)
+        return;
+
+    // Normally the topic has been deleted already and this fails harmlessly
+    struct dds_topic_filter none = { .mode = DDS_TOPIC_FILTER_NONE, .f = { .sample = NULL }, .arg = NULL };
+    (void) dds_set_topic_filter_extended(filter->topic, &none);
+
+    Py_XDECREF(filter->program);
+    Py_XDECREF(filter->fallback);
+    ddsrt_rwlock_destroy(&filter->lock);
+    dds_free(filter);
+}
+
+static PyObject *
+ddspy_topic_filter(PyObject *self, PyObject *args)
+{
+    dds_entity_t topic;
+    PyObject* program;
+    PyObject* fallback;
+    (void)self;
+
+    if (!PyArg_ParseTuple(args, "iOO", &topic, &program, &fallback))
+        return NULL;
+
+    ddspy_topic_filter_t* filter = (ddspy_topic_filter_t*) dds_alloc(sizeof(ddspy_topic_filter_t));
+    ddsrt_rwlock_init(&filter->lock);
+    filter->topic = topic;
+    filter->program = NULL;
+    filter->vm = NULL;
+    filter->fallback = NULL;
+
+    PyObject* capsule = PyCapsule_New(filter, DDSPY_TOPIC_FILTER_CAPSULE, ddspy_topic_filter_destroy);
+    if (capsule == NULL) {
+        ddsrt_rwlock_destroy(&filter->lock);
+        dds_free(filter);
+        return NULL;
+    }
+    if (!ddspy_topic_filter_replace(filter, program, fallback)) {
+        Py_DECREF(capsule);
+        return NULL;
+    }
+
+    struct dds_topic_filter spec = {
+        .mode = DDS_TOPIC_FILTER_SAMPLE_ARG, .f = { .sample_arg = ddspy_topic_filter_accept }, .arg = filter
+    };
+    dds_return_t ret = dds_set_topic_filter_extended(topic, &spec);
+    if (ret < 0) {
+        Py_DECREF(capsule);
+        PyErr_Format(PyExc_RuntimeError, "Failed to set the filter of topic %d: %d", (int) topic, (int) ret);
+        return NULL;
+    }
+    return capsule;
+}
+
+static PyObject *
+ddspy_topic_filter_update(PyObject *self, PyObject *args)
+{
+    PyObject* capsule;
+    PyObject* program;
+    PyObject* fallback;
+    (void)self;
+
+    if (!PyArg_ParseTuple(args, "OOO", &capsule, &program, &fallback))
+        return NULL;
+
+    ddspy_topic_filter_t* filter = (ddspy_topic_filter_t*) PyCapsule_GetPointer(capsule, DDSPY_TOPIC_FILTER_CAPSULE);
+    if (filter == NULL || !ddspy_topic_filter_replace(filter, program, fallback))
+        return NULL;
+    Py_RETURN_NONE;
+}
+
+
 /* builtin topic */
 
 static PyObject *
@@ -1647,8 +2563,12 @@ ddspy_read_participant(PyObject *self, PyObject *args)
         rcontainer[i] = NULL;
     }
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_read(reader, (void**) rcontainer, info, Nu32, Nu32);
+    Py_END_ALLOW_THREADS
     if (sts < 0) {
+        dds_free(info);
+        dds_free(rcontainer);
         return PyLong_FromLong((long) sts);
     }
 
@@ -1700,8 +2620,12 @@ ddspy_take_participant(PyObject *self, PyObject *args)
         rcontainer[i] = NULL;
     }
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_take(reader, (void**) rcontainer, info, Nu32, Nu32);
+    Py_END_ALLOW_THREADS
     if (sts < 0) {
+        dds_free(info);
+        dds_free(rcontainer);
         return PyLong_FromLong((long) sts);
     }
 
@@ -1753,8 +2677,12 @@ ddspy_read_endpoint(PyObject *self, PyObject *args)
         rcontainer[i] = NULL;
     }
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_read(reader, (void**) rcontainer, info, Nu32, Nu32);
+    Py_END_ALLOW_THREADS
     if (sts < 0) {
+        dds_free(info);
+        dds_free(rcontainer);
         return PyLong_FromLong((long) sts);
     }
 
@@ -1842,8 +2770,12 @@ ddspy_take_endpoint(PyObject *self, PyObject *args)
         rcontainer[i] = NULL;
     }
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_take(reader, (void**) rcontainer, info, Nu32, Nu32);
+    Py_END_ALLOW_THREADS
     if (sts < 0) {
+        dds_free(info);
+        dds_free(rcontainer);
         return PyLong_FromLong((long) sts);
     }
 
@@ -2002,6 +2934,38 @@ PyMethodDef ddspy_funcs[] = {
 		(PyCFunction)ddspy_calc_key,
 		METH_VARARGS,
 		ddspy_docs},
+    {	"ddspy_cdr_program",
+		(PyCFunction)ddspy_cdr_program,
+		METH_VARARGS,
+		ddspy_docs},
+    {	"ddspy_cdr_serialize",
+		(PyCFunction)ddspy_cdr_serialize,
+		METH_VARARGS,
+		ddspy_docs},
+    {	"ddspy_cdr_deserialize",
+		(PyCFunction)ddspy_cdr_deserialize,
+		METH_VARARGS,
+		ddspy_docs},
+    {	"ddspy_filter_program",
+		(PyCFunction)ddspy_filter_program,
+		METH_VARARGS,
+		ddspy_docs},
+    {	"ddspy_filter_eval",
+		(PyCFunction)ddspy_filter_eval,
+		METH_VARARGS,
+		ddspy_docs},
+    {	"ddspy_query_slot",
+		(PyCFunction)ddspy_query_slot,
+		METH_VARARGS,
+		ddspy_docs},
+    {	"ddspy_topic_filter",
+		(PyCFunction)ddspy_topic_filter,
+		METH_VARARGS,
+		ddspy_docs},
+    {	"ddspy_topic_filter_update",
+		(PyCFunction)ddspy_topic_filter_update,
+		METH_VARARGS,
+		ddspy_docs},
     {	"ddspy_topic_create",
 		(PyCFunction)ddspy_topic_create,
 		METH_VARARGS,
@@ -2014,6 +2978,22 @@ PyMethodDef ddspy_funcs[] = {
 		(PyCFunction)ddspy_take,
 		METH_VARARGS,
 		ddspy_docs},
+    {	"ddspy_read_bulk",
+		(PyCFunction)ddspy_read_bulk,
+		METH_VARARGS,
+		ddspy_docs},
+    {	"ddspy_take_bulk",
+		(PyCFunction)ddspy_take_bulk,
+		METH_VARARGS,
+		ddspy_docs},
+    {	"ddspy_read_loan",
+		(PyCFunction)ddspy_read_loan,
+		METH_VARARGS,
+		ddspy_docs},
+    {	"ddspy_take_loan",
+		(PyCFunction)ddspy_take_loan,
+		METH_VARARGS,
+		ddspy_docs},
     {	"ddspy_read_handle",
 		(PyCFunction)ddspy_read_handle,
 		METH_VARARGS,
@@ -2026,6 +3006,18 @@ PyMethodDef ddspy_funcs[] = {
 		(PyCFunction)ddspy_write,
 		METH_VARARGS,
 		ddspy_docs},
+    {	"ddspy_write_key",
+		(PyCFunction)ddspy_write_key,
+		METH_VARARGS,
+		ddspy_docs},
+    {	"ddspy_write_key_ts",
+		(PyCFunction)ddspy_write_key_ts,
+		METH_VARARGS,
+		ddspy_docs},
+    {	"ddspy_write_batch",
+		(PyCFunction)ddspy_write_batch,
+		METH_VARARGS,
+		ddspy_docs},
     {	"ddspy_write_ts",
 		(PyCFunction)ddspy_write_ts,
 		METH_VARARGS,
@@ -2158,8 +3150,13 @@ PyMODINIT_FUNC PyInit__clayer(void) {
     }
     Py_DECREF(import);
 
+    if (PyType_Ready(&ddspy_loan_type) < 0) return NULL;
+
     PyObject* module = PyModule_Create(&_clayer_mod);
 
+    Py_INCREF(&ddspy_loan_type);
+    PyModule_AddObject(module, "SerdataLoan", (PyObject*) &ddspy_loan_type);
+
     PyModule_AddObject(module, "DDS_INFINITY", PyLong_FromLongLong(DDS_INFINITY));
     PyModule_AddObject(module, "UINT32_MAX", PyLong_FromUnsignedLong(UINT32_MAX));
 #ifdef DDS_HAS_TYPE_DISCOVERY
@@ -13,13 +13,16 @@
 from argparse import ArgumentError
 import uuid
 import asyncio
-import concurrent
+import threading
 import ctypes as ct
-from weakref import WeakValueDictionary
-from typing import Any, Callable, Dict, Optional, List, TYPE_CHECKING
+from weakref import WeakValueDictionary, WeakKeyDictionary
+from typing import Any, Callable, Dict, Optional, List, Tuple, TYPE_CHECKING
 
 from .internal import c_call, c_callable, dds_infinity, dds_c_t, DDS
 from .qos import Qos, Policy, _CQos
+from .idl._filter import FilterExpression
+from .dispatch import _entity_deleted
+from cyclonedds._clayer import ddspy_filter_program, ddspy_filter_eval, ddspy_query_slot
 
 
 if TYPE_CHECKING:
@@ -154,6 +157,9 @@ class Entity(DDS):
 
         del self._entities[self._ref]
         self._delete(self._ref)
+        if _entity_deleted is not None:
+            # None during interpreter shutdown
+            _entity_deleted(self._ref)
 
     def get_subscriber(self) -> Optional['cyclonedds.sub.Subscriber']:
         """Retrieve the subscriber associated with this entity.
@@ -704,9 +710,13 @@ class Listener(DDS):
             Set on_inconsistent_topic callback.
         on_liveliness_lost : Callable
             Set on_liveliness_lost callback.
+        dispatcher : cyclonedds.dispatch.ListenerDispatcher
+            Queue the callbacks on this dispatcher instead of running them on the Cyclone
+            thread that delivers the event.
         """
         super().__init__(self._create_listener(None))
         self._set_functors = {}
+        self.dispatcher = kwargs.pop("dispatcher", None)
 
         if _is_override(self.on_data_available):
             self.set_on_data_available(self.on_data_available)
@@ -788,7 +798,7 @@ class Listener(DDS):
         self._reset_listener(self._ref)
 
     def copy(self) -> 'Listener':
-        listener = Listener(**self._set_functors)
+        listener = Listener(dispatcher=self.dispatcher, **self._set_functors)
         return listener
 
     def copy_to(self, listener: 'Listener') -> None:
@@ -798,6 +808,18 @@ class Listener(DDS):
     def merge(self, listener: 'Listener') -> None:
         listener.copy_to(self)
 
+    def _deliver(self, name: str, handle: int, *status: Any) -> None:
+        # Runs on the Cyclone thread, status structs are only valid during the call
+        if self.dispatcher is None:
+            getattr(self, name)(Entity.get_entity(handle), *status)
+        else:
+            self.dispatcher.submit(handle, name, self._dispatched, getattr(self, name), handle,
+                                   *(type(s).from_buffer_copy(s) for s in status))
+
+    @staticmethod
+    def _dispatched(callback: Callable[..., Any], handle: int, *status: Any) -> Any:
+        return callback(Entity.get_entity(handle), *status)
+
     def on_inconsistent_topic(self, reader: 'cyclonedds.sub.DataReader', status: dds_c_t.inconsistent_topic_status) -> None:
         pass
 
@@ -810,7 +832,7 @@ class Listener(DDS):
             self._set_functors['on_inconsistent_topic'] = self.on_inconsistent_topic
 
             def call(topic, status, arg):
-                self.on_inconsistent_topic(Entity.get_entity(topic), status)
+                self._deliver("on_inconsistent_topic", topic, status)
 
             self._on_inconsistent_topic = _inconsistent_topic_fn(call)
             self._set_inconsistent_topic(self._ref, self._on_inconsistent_topic)
@@ -827,7 +849,7 @@ class Listener(DDS):
             self._set_functors['on_data_available'] = self.on_data_available
 
             def call(reader, arg):
-                self.on_data_available(Entity.get_entity(reader))
+                self._deliver("on_data_available", reader)
 
             self._on_data_available = _data_available_fn(call)
             self._set_data_available(self._ref, self._on_data_available)
@@ -844,7 +866,7 @@ class Listener(DDS):
             self._set_functors['on_liveliness_lost'] = self.on_liveliness_lost
 
             def call(writer, status, arg):
-                self.on_liveliness_lost(Entity.get_entity(writer), status)
+                self._deliver("on_liveliness_lost", writer, status)
 
             self._on_liveliness_lost = _liveliness_lost_fn(call)
             self._set_liveliness_lost(self._ref, self._on_liveliness_lost)
@@ -863,7 +885,7 @@ class Listener(DDS):
             self._set_functors['on_liveliness_changed'] = self.on_liveliness_changed
 
             def call(reader, status, arg):
-                self.on_liveliness_changed(Entity.get_entity(reader), status)
+                self._deliver("on_liveliness_changed", reader, status)
 
             self._on_liveliness_changed = _liveliness_changed_fn(call)
             self._set_liveliness_changed(self._ref, self._on_liveliness_changed)
@@ -883,7 +905,7 @@ class Listener(DDS):
             self._set_functors['on_offered_deadline_missed'] = self.on_offered_deadline_missed
 
             def call(writer, status, arg):
-                self.on_offered_deadline_missed(Entity.get_entity(writer), status)
+                self._deliver("on_offered_deadline_missed", writer, status)
 
             self._on_offered_deadline_missed = _offered_deadline_missed_fn(call)
             self._set_on_offered_deadline_missed(self._ref, self._on_offered_deadline_missed)
@@ -903,7 +925,7 @@ class Listener(DDS):
             self._set_functors['on_offered_incompatible_qos'] = self.on_offered_incompatible_qos
 
             def call(writer, status, arg):
-                self.on_offered_incompatible_qos(Entity.get_entity(writer), status)
+                self._deliver("on_offered_incompatible_qos", writer, status)
 
             self._on_offered_incompatible_qos = _offered_incompatible_qos_fn(call)
             self._set_on_offered_incompatible_qos(self._ref, self._on_offered_incompatible_qos)
@@ -920,7 +942,7 @@ class Listener(DDS):
             self._set_functors['on_data_on_readers'] = self.on_data_on_readers
 
             def call(subscriber, arg):
-                self.on_data_on_readers(Entity.get_entity(subscriber))
+                self._deliver("on_data_on_readers", subscriber)
 
             self._on_data_on_readers = _data_on_readers_fn(call)
             self._set_on_data_on_readers(self._ref, self._on_data_on_readers)
@@ -939,7 +961,7 @@ class Listener(DDS):
             self._set_functors['on_sample_lost'] = self.on_sample_lost
 
             def call(writer, status, arg):
-                self.on_sample_lost(Entity.get_entity(writer), status)
+                self._deliver("on_sample_lost", writer, status)
 
             self._on_sample_lost = _on_sample_lost_fn(call)
             self._set_on_sample_lost(self._ref, self._on_sample_lost)
@@ -958,7 +980,7 @@ class Listener(DDS):
             self._set_functors['on_sample_rejected'] = self.on_sample_rejected
 
             def call(writer, status, arg):
-                self.on_sample_rejected(Entity.get_entity(writer), status)
+                self._deliver("on_sample_rejected", writer, status)
 
             self._on_sample_rejected = _on_sample_rejected_fn(call)
             self._set_on_sample_rejected(self._ref, self._on_sample_rejected)
@@ -977,7 +999,7 @@ class Listener(DDS):
             self._set_functors['on_requested_deadline_missed'] = self.on_requested_deadline_missed
 
             def call(reader, status, arg):
-                self.on_requested_deadline_missed(Entity.get_entity(reader), status)
+                self._deliver("on_requested_deadline_missed", reader, status)
 
             self._on_requested_deadline_missed = _on_requested_deadline_missed_fn(call)
             self._set_on_requested_deadline_missed(self._ref, self._on_requested_deadline_missed)
@@ -996,7 +1018,7 @@ class Listener(DDS):
             self._set_functors['on_requested_incompatible_qos'] = self.on_requested_incompatible_qos
 
             def call(reader, status, arg):
-                self.on_requested_incompatible_qos(Entity.get_entity(reader), status)
+                self._deliver("on_requested_incompatible_qos", reader, status)
 
             self._on_requested_incompatible_qos = _on_requested_incompatible_qos_fn(call)
             self._set_on_requested_incompatible_qos(self._ref, self._on_requested_incompatible_qos)
@@ -1015,7 +1037,7 @@ class Listener(DDS):
             self._set_functors['on_publication_matched'] = self.on_publication_matched
 
             def call(writer, status, arg):
-                self.on_publication_matched(Entity.get_entity(writer), status)
+                self._deliver("on_publication_matched", writer, status)
 
             self._on_publication_matched = _on_publication_matched_fn(call)
             self._set_on_publication_matched(self._ref, self._on_publication_matched)
@@ -1034,7 +1056,7 @@ class Listener(DDS):
             self._set_functors['on_subscription_matched'] = self.on_subscription_matched
 
             def call(reader, status, arg):
-                self.on_subscription_matched(Entity.get_entity(reader), status)
+                self._deliver("on_subscription_matched", reader, status)
 
             self._on_subscription_matched = _on_subscription_matched_fn(call)
             self._set_on_subscription_matched(self._ref, self._on_subscription_matched)
@@ -1260,27 +1282,79 @@ _querycondition_filter_fn = c_callable(ct.c_bool, [ct.c_void_p])
 class QueryCondition(_Condition):
     """Condition that triggers when new data is available to read according to the mask.
     Construct a mask using InstanceState, ViewState and SampleState. Add a filter function
-    that receives the sample and returns a boolean whether to accept or reject the sample.
+    that receives the sample and returns a boolean whether to accept or reject the sample,
+    or a filter expression on its members that can be evaluated without calling into Python.
     """
 
-    def __init__(self, reader: 'cyclonedds.sub.DataReader', mask: int, filter: Callable[[Any], bool]) -> None:
-        """Construct a QueryCondition."""
+    def __init__(self, reader: 'cyclonedds.sub.DataReader', mask: int, filter: Optional[Callable[[Any], bool]] = None,
+                 where: Optional[str] = None) -> None:
+        """Construct a QueryCondition.
+
+        Parameters
+        ----------
+        reader: DataReader
+            The reader the condition is attached to.
+        mask: int
+            Combination of InstanceState, ViewState and SampleState.
+        filter: Callable[[Any], bool], optional
+            Function that receives the deserialized sample.
+        where: str, optional
+            Filter expression like ``"speed > 30 and id in (1, 2)"``, see
+            :class:`FilterExpression<cyclonedds.idl._filter.FilterExpression>`. Comparisons of
+            primitive members are evaluated on the serialized data in C.
+
+        Raises
+        ------
+        TypeError
+            If not exactly one of filter and where is given.
+        ValueError
+            If the filter expression is invalid.
+        """
+        if (filter is None) == (where is None):
+            raise TypeError("QueryCondition needs either a filter function or a where expression.")
+
         self.reader = reader
         self.mask = mask
         self.filter = filter
+        self.expression = None
+        data_type = reader._topic.data_type
+
+        if where is not None:
+            self.expression = FilterExpression(data_type, where)
+            self._query_slot = None
+            program = None
+            if self.expression.programs is not None:
+                program = ddspy_filter_program(*self.expression.programs)
+                slot = ddspy_query_slot(program)
+                if slot is not None:
+                    address, self._query_slot = slot
+
+            if self._query_slot is not None:
+                self._filter = _querycondition_filter_fn(address)
+            else:
+                # All filter slots are in use or the expression needs Python
+                evaluate = self.expression.evaluate if program is None else \
+                    (lambda data: ddspy_filter_eval(program, data))
+
+                def call_where(sample_pt):
+                    try:
+                        sample = ct.cast(sample_pt, ct.POINTER(dds_c_t.sample_buffer))[0]
+                        return evaluate(ct.string_at(sample.buf, sample.len))
+                    except Exception:  # Block any python exception from going into C
+                        return False
+
+                self._filter = _querycondition_filter_fn(call_where)
+        else:
+            def call(sample_pt):
+                try:
+                    sample = ct.cast(sample_pt, ct.POINTER(dds_c_t.sample_buffer))[0]
+                    data = data_type.deserialize(ct.string_at(sample.buf, sample.len))
+                    return self.filter(data)
+                except Exception:  # Block any python exception from going into C
+                    return False
+
+            self._filter = _querycondition_filter_fn(call)
 
-        def call(sample_pt):
-            try:
-                sample_info = ct.cast(sample_pt, ct.POINTER(dds_c_t.sample_buffer))[0]
-                array_type = ct.c_ubyte * sample_info.len
-                array = ct.cast(sample_info.buf, ct.POINTER(array_type))
-                contents = array.contents[:]
-                data = self.reader._topic.data_type.deserialize(bytes(contents))
-                return self.filter(data)
-            except Exception:  # Block any python exception from going into C
-                return False
-
-        self._filter = _querycondition_filter_fn(call)
         super().__init__(self._create_querycondition(reader._ref, mask, self._filter))
 
     @c_call("dds_create_querycondition")
@@ -1380,6 +1454,10 @@ class WaitSet(Entity):
     of entity to a WaitSet and then perform a blocking wait on the waitset. When one or more of the entities in the waitset
     trigger the wait is unblocked. What a 'trigger' is depends on the type of entity, you can find out more in
     ``todo(DDS) triggers``.
+
+    Note that :meth:`wait`, :meth:`wait_until` and :meth:`wait_async` return the list of triggered entities,
+    they used to return the number of them. An empty list is falsy like a count of zero, code that compares
+    the result with a number has to use ``len()``.
     """
 
     def __init__(self, domain_participant: 'cyclonedds.domain.DomainParticipant') -> None:
@@ -1391,34 +1469,43 @@ class WaitSet(Entity):
             The domain in which you want to make a WaitSet
         """
         super().__init__(self._create_waitset(domain_participant._ref))
-        self.attached = []
+        # Entity handle -> (entity, handler), the handle is also the attach argument so the
+        # entities that triggered a wait can be looked up directly
+        self._attached: Dict[int, Tuple[Entity, Optional[Callable[[Entity], None]]]] = {}
+        # Wakes up dispatch() when it has to stop
+        self._wakeup: Optional[GuardCondition] = None
+        self._stop_dispatch = False
 
     def __del__(self) -> None:
-        for v in self.attached:
-            self._waitset_detach(self._ref, v[0]._ref)
+        for ref in list(getattr(self, "_attached", ())):
+            self._waitset_detach(self._ref, ref)
+        if getattr(self, "_wakeup", None) is not None:
+            self._waitset_detach(self._ref, self._wakeup._ref)
         super().__del__()
 
-    def attach(self, entity: Entity) -> None:
-        """Attach an entity to this WaitSet. This is a no-op if the entity was already attached.
+    def attach(self, entity: Entity, handler: Optional[Callable[[Entity], None]] = None) -> None:
+        """Attach an entity to this WaitSet. This is a no-op if the entity was already attached,
+        apart from replacing its handler.
 
         Parameters
         ----------
         entity: Entity
             The entity you wish to attach.
+        handler: Callable[[Entity], None], optional
+            Called with the entity by :meth:`dispatch` when it triggers.
 
         Raises
         ------
         DDSException: When you try to attach a non-triggerable entity.
         """
-        if self.is_attached(entity):
+        if entity._ref in self._attached:
+            self._attached[entity._ref] = (entity, handler)
             return
 
-        value_pt = ct.c_int()
-
-        ret = self._waitset_attach(self._ref, entity._ref, ct.byref(value_pt))
+        ret = self._waitset_attach(self._ref, entity._ref, entity._ref)
         if ret < 0:
             raise DDSException(ret, f"Occurred when trying to attach {repr(entity)} to {repr(self)}")
-        self.attached.append((entity, value_pt))
+        self._attached[entity._ref] = (entity, handler)
 
     def detach(self, entity: Entity) -> None:
         """Detach an entity from this WaitSet. If it was not attach this is a no-op.
@@ -1431,13 +1518,12 @@ class WaitSet(Entity):
             The entity you wish to attach
 
         """
-        for i, v in enumerate(self.attached):
-            if v[0] == entity:
-                ret = self._waitset_detach(self._ref, entity._ref)
-                if ret < 0:
-                    raise DDSException(ret, f"Occurred when trying to attach {repr(entity)} to {repr(self)}")
-                del self.attached[i]
-                break
+        if entity._ref not in self._attached:
+            return
+        ret = self._waitset_detach(self._ref, entity._ref)
+        if ret < 0:
+            raise DDSException(ret, f"Occurred when trying to attach {repr(entity)} to {repr(self)}")
+        self._attached.pop(entity._ref, None)
 
     def is_attached(self, entity: Entity) -> bool:
         """Check whether an entity is attached.
@@ -1447,18 +1533,30 @@ class WaitSet(Entity):
         entity: Entity
             Check the attachment of this entity.
         """
-        for v in self.attached:
-            if v[0] == entity:
-                return True
-        return False
+        return entity._ref in self._attached
 
     def get_entities(self) -> List[Entity]:
         """Get all entities attached"""
-        # Note: should spend some time on synchronisation. What if the waitset is used across threads?
-        # That is probably a bad idea in python, but who is going to stop the user from doing it anyway...
-        return [v[0] for v in self.attached]
+        return [v[0] for v in list(self._attached.values())]
 
-    def wait(self, timeout: int) -> int:
+    @property
+    def attached(self) -> List[Tuple[Entity, Optional[Callable[[Entity], None]]]]:
+        """The attached entities with their :meth:`dispatch` handler, as (entity, handler) tuples.
+        This is a copy, use :meth:`attach` and :meth:`detach` to change it."""
+        return list(self._attached.values())
+
+    def _triggered(self, ret: int, xs: ct.Array) -> List[Entity]:
+        if ret < 0:
+            raise DDSException(ret, f"Occurred while waiting in {repr(self)}")
+        # More entities than fit in xs can trigger if some were attached during the wait
+        triggered = []
+        for ref in xs[:min(ret, len(xs))]:
+            v = self._attached.get(ref)
+            if v is not None:
+                triggered.append(v[0])
+        return triggered
+
+    def wait(self, timeout: int) -> List[Entity]:
         """Block execution and wait for one of the entities in this waitset to trigger.
 
         Parameters
@@ -1469,17 +1567,14 @@ class WaitSet(Entity):
 
         Returns
         -------
-        int
-            The number of triggered entities. This will be 0 when a timeout occurred.
+        List[Entity]
+            The triggered entities. This will be empty when a timeout occurred.
         """
-        ret = self._waitset_wait(self._ref, None, 0, timeout)
-
-        if ret >= 0:
-            return ret
+        # One extra for the guard condition of dispatch()
+        xs = (dds_c_t.attach * (len(self._attached) + 1))()
+        return self._triggered(self._waitset_wait(self._ref, xs, len(xs), timeout), xs)
 
-        raise DDSException(ret, f"Occurred while waiting in {repr(self)}")
-
-    def wait_until(self, abstime: int) -> int:
+    def wait_until(self, abstime: int) -> List[Entity]:
         """Block execution and wait for one of the entities in this waitset to trigger.
 
         Parameters
@@ -1489,19 +1584,61 @@ class WaitSet(Entity):
             to block. Use the function :func:`duration<cdds.util.duration>` to write that in
             a human readable format.
 
+        Returns
+        -------
+        List[Entity]
+            The triggered entities. This will be empty when a timeout occurred.
+        """
+        xs = (dds_c_t.attach * (len(self._attached) + 1))()
+        return self._triggered(self._waitset_wait_until(self._ref, xs, len(xs), abstime), xs)
+
+    def dispatch(self, timeout: Optional[int] = None, once: bool = False) -> int:
+        """Wait for entities to trigger and call the handlers they were attached with, until
+        :meth:`stop_dispatch` is called. Triggered entities without a handler are skipped,
+        they trigger again on the next wait unless their status changes.
+
+        Parameters
+        ----------
+        timeout: int, optional
+            Stop when nothing triggers for this many nanoseconds, by default wait forever.
+        once: bool, optional
+            Stop after the first wait.
+
         Returns
         -------
         int
-            The number of triggered entities. This will be 0 when a timeout occurred.
+            The number of handler calls.
         """
-        cs = (ct.c_void_p * len(self.attached))()
-        pcs = ct.cast(cs, ct.c_void_p)
-        ret = self._waitset_wait_until(self._ref, ct.byref(pcs), len(self.attached), abstime)
+        if self._wakeup is None:
+            # Not in _attached, so it never shows up as a triggered entity
+            self._wakeup = GuardCondition(self.participant)
+            ret = self._waitset_attach(self._ref, self._wakeup._ref, self._wakeup._ref)
+            if ret < 0:
+                raise DDSException(ret, f"Occurred when trying to attach {repr(self._wakeup)} to {repr(self)}")
+
+        calls = 0
+        while not self._stop_dispatch:
+            triggered = self.wait(dds_infinity if timeout is None else timeout)
+            for entity in triggered:
+                v = self._attached.get(entity._ref)
+                if v is not None and v[1] is not None:
+                    v[1](entity)
+                    calls += 1
+            if once or (not triggered and not self._wakeup.read()):
+                break
 
-        if ret >= 0:
-            return ret
+        if self._stop_dispatch:
+            self._stop_dispatch = False
+            self._wakeup.take()
+        return calls
 
-        raise DDSException(ret, f"Occurred while waiting in {repr(self)}")
+    def stop_dispatch(self) -> None:
+        """Make :meth:`dispatch` return after the current round of handlers, this can be
+        called from a handler or another thread. If nothing is dispatching the next call to
+        :meth:`dispatch` returns immediately."""
+        self._stop_dispatch = True
+        if self._wakeup is not None:
+            self._wakeup.set(True)
 
     def set_trigger(self, value: bool) -> None:
         """Manually trigger a WaitSet. It is unlikely you would need this.
@@ -1515,19 +1652,40 @@ class WaitSet(Entity):
         if ret < 0:
             raise DDSException(ret, f"Occurred when setting trigger in {repr(self)}")
 
-    async def wait_async(self, timeout: Optional[int] = None) -> int:
+    async def wait_async(self, timeout: Optional[int] = None) -> List[Entity]:
         """Asynchronously wait for a WaitSet to trigger. Use in event-loop based applications.
 
+        The attached entities are awaited on the shared waiter thread of the participant, like
+        :meth:`DataReader.take_aiter<cyclonedds.sub.DataReader.take_aiter>`, so no thread is
+        started per call. A :meth:`set_trigger` does not wake this up.
+
         Parameters
         ----------
         timeout: int, Optional = None
             Maximum number of nanoseconds to wait before returning. By default this is infinity.
+
+        Returns
+        -------
+        List[Entity]
+            The triggered entities. This will be empty when a timeout occurred.
         """
         timeout = timeout or dds_infinity
+        entities = self.get_entities()
+        if not entities:
+            if timeout == dds_infinity:
+                await asyncio.get_running_loop().create_future()
+            await asyncio.sleep(timeout / 1e9)
+            return []
 
-        loop = asyncio.get_running_loop()
-        with concurrent.futures.ThreadPoolExecutor() as pool:
-            return await loop.run_in_executor(pool, self.wait, timeout)
+        waiter = _AsyncWaiter.for_participant(self.participant)
+        futures = [waiter.wait(entity, timeout) for entity in entities]
+        try:
+            await asyncio.wait(futures, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            # Detaches the entities that did not trigger from the shared waitset
+            for future in futures:
+                future.cancel()
+        return self.wait(0)
 
     @c_call("dds_create_waitset")
     def _create_waitset(self, domain_participant: dds_c_t.entity) -> dds_c_t.entity:
@@ -1556,6 +1714,122 @@ class WaitSet(Entity):
         pass
 
 
+def _resolve_future(future: asyncio.Future, triggered: bool) -> None:
+    if not future.done():
+        future.set_result(triggered)
+
+
+def _fail_future(future: asyncio.Future, exception: Exception) -> None:
+    if not future.done():
+        future.set_exception(exception)
+
+
+class _AsyncWaiter:
+    """Waits for conditions on behalf of asyncio event loops. All conditions awaited within a
+    domain participant share one WaitSet and one thread, which only runs while something is
+    awaited. A condition stays attached until it triggers, then it is detached again and the
+    awaiting futures are resolved on their own event loop with ``call_soon_threadsafe``.
+    """
+
+    _waiters: 'WeakKeyDictionary[cyclonedds.domain.DomainParticipant, _AsyncWaiter]' = WeakKeyDictionary()
+    _waiters_lock = threading.Lock()
+
+    @classmethod
+    def for_participant(cls, participant: 'cyclonedds.domain.DomainParticipant') -> '_AsyncWaiter':
+        with cls._waiters_lock:
+            waiter = cls._waiters.get(participant)
+            if waiter is None:
+                waiter = cls._waiters[participant] = cls(participant)
+            return waiter
+
+    def __init__(self, participant: 'cyclonedds.domain.DomainParticipant') -> None:
+        self._lock = threading.Lock()
+        self._waitset = WaitSet(participant)
+        self._guard = GuardCondition(participant)
+        self._waitset.attach(self._guard)
+        # condition handle -> (condition, [(loop, future), ...])
+        self._pending: Dict[int, Tuple[_Condition, List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]]]] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def wait(self, condition: Entity, timeout: Optional[int] = None) -> 'asyncio.Future[bool]':
+        """Future that resolves to True once the condition, or another triggerable entity,
+        triggers, or to False when the timeout in nanoseconds expires first. Must be called
+        from a running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if isinstance(condition, _Condition) and condition.triggered:
+            future.set_result(True)
+            return future
+
+        with self._lock:
+            entry = self._pending.get(condition._ref)
+            if entry is None:
+                self._waitset.attach(condition)
+                entry = self._pending[condition._ref] = (condition, [])
+            entry[1].append((loop, future))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="cyclonedds-async-waiter", daemon=True)
+                self._thread.start()
+        # Wake the thread so it notices conditions that triggered while being attached
+        self._guard.set(True)
+
+        future.add_done_callback(lambda f: self._forget(condition, f))
+        if timeout is not None and timeout != dds_infinity:
+            timer = loop.call_later(timeout / 1e9, _resolve_future, future, False)
+            future.add_done_callback(lambda f: timer.cancel())
+        return future
+
+    def _forget(self, condition: _Condition, future: asyncio.Future) -> None:
+        # Called on the event loop once the future is done, a no-op unless it timed out or was cancelled
+        with self._lock:
+            entry = self._pending.get(condition._ref)
+            if entry is None:
+                return
+            entry[1][:] = [w for w in entry[1] if w[1] is not future]
+            if entry[1]:
+                return
+            del self._pending[condition._ref]
+            self._waitset.detach(condition)
+        self._guard.set(True)
+
+    def _run(self) -> None:
+        while True:
+            ready = []
+            try:
+                triggered = self._waitset.wait(dds_infinity)
+                self._guard.take()
+                error = None
+            except DDSException as e:
+                error = e
+
+            with self._lock:
+                refs = list(self._pending) if error is not None else [entity._ref for entity in triggered]
+                for ref in refs:
+                    if ref in self._pending:
+                        condition, waiting = self._pending.pop(ref)
+                        try:
+                            self._waitset.detach(condition)
+                        except DDSException:
+                            pass
+                        ready.extend(waiting)
+                done = not self._pending
+                if done:
+                    self._thread = None
+
+            for loop, future in ready:
+                try:
+                    if error is None:
+                        loop.call_soon_threadsafe(_resolve_future, future, True)
+                    else:
+                        loop.call_soon_threadsafe(_fail_future, future, error)
+                except RuntimeError:
+                    # The event loop was closed in the meantime
+                    pass
+            if done:
+                return
+
+
 __all__ = ["DDSException", "Entity", "Qos", "Policy", "Listener", "DDSStatus", "ViewState",
            "InstanceState", "SampleState", "ReadCondition", "QueryCondition", "GuardCondition",
            "WaitSet"]
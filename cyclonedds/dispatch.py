@@ -0,0 +1,315 @@
+"""
+ * Copyright(c) 2021 ADLINK Technology Limited and others
+ *
+ * This program and the accompanying materials are made available under the
+ * terms of the Eclipse Public License v. 2.0 which is available at
+ * http://www.eclipse.org/legal/epl-2.0, or the Eclipse Distribution License
+ * v. 1.0 which is available at
+ * http://www.eclipse.org/org/documents/edl-v10.php.
+ *
+ * SPDX-License-Identifier: EPL-2.0 OR BSD-3-Clause
+"""
+
+import asyncio
+import threading
+import traceback
+
+from collections import deque
+from dataclasses import dataclass, field, replace
+from enum import Enum, auto
+from time import perf_counter_ns
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+from weakref import WeakSet
+
+
+class Overflow(Enum):
+    """What a dispatcher does with a new event when the queue of its entity is full."""
+    # Wait until there is room, slowing down the Cyclone thread that delivers the event
+    Block = auto()
+    # Discard the new event
+    DropNewest = auto()
+    # Discard the oldest queued event to make room
+    DropOldest = auto()
+
+
+@dataclass
+class QueueStats:
+    """Statistics of the event queue of one entity. Wait is the time from queueing an event
+    until its callback starts, latency the time the callback takes."""
+    depth: int = 0
+    max_depth: int = 0
+    dispatched: int = 0
+    coalesced: int = 0
+    dropped: int = 0
+    errors: int = 0
+    total_wait_ns: int = 0
+    max_wait_ns: int = 0
+    total_latency_ns: int = 0
+    max_latency_ns: int = 0
+
+    @property
+    def mean_wait_ns(self) -> float:
+        return self.total_wait_ns / self.dispatched if self.dispatched else 0.0
+
+    @property
+    def mean_latency_ns(self) -> float:
+        return self.total_latency_ns / self.dispatched if self.dispatched else 0.0
+
+
+@dataclass
+class _EntityQueue:
+    key: int
+    events: Deque[Tuple[str, Callable[..., Any], tuple, int]] = field(default_factory=deque)
+    # Queued events that have not started yet and absorb repeats of themselves
+    pending: Set[str] = field(default_factory=set)
+    # Scheduled on a worker or the event loop, events of one entity never run concurrently
+    scheduled: bool = False
+    # The entity was deleted, drop the queue once it is idle
+    forgotten: bool = False
+    stats: QueueStats = field(default_factory=QueueStats)
+
+
+class ListenerDispatcher:
+    """Runs listener callbacks away from the Cyclone threads that deliver the events.
+
+    A Listener created with ``dispatcher=`` only queues its events, so a slow callback no
+    longer holds up the network processing of every other topic. Each entity gets a bounded
+    queue, the events of one entity run in order and never concurrently, those of different
+    entities run in parallel on a pool of worker threads or one after another on an asyncio
+    event loop. Repeated on_data_available and on_data_on_readers events that are still
+    queued are coalesced into one, the callback reads everything available anyway.
+
+    Parameters
+    ----------
+    workers: int, optional
+        Number of worker threads, ignored when running on an event loop.
+    queue_size: int, optional
+        Maximum number of queued events per entity.
+    overflow: Overflow, optional
+        What to do with an event when the queue of its entity is full.
+    loop: asyncio.AbstractEventLoop, optional
+        Run the callbacks on this event loop instead of worker threads. Callbacks that return
+        an awaitable are scheduled as tasks.
+    coalesce: Iterable[str], optional
+        Names of the listener events that are coalesced.
+    """
+
+    def __init__(self, workers: int = 1, queue_size: int = 64, overflow: Overflow = Overflow.DropOldest,
+                 loop: Optional[asyncio.AbstractEventLoop] = None,
+                 coalesce: Iterable[str] = ("on_data_available", "on_data_on_readers")) -> None:
+        if queue_size < 1:
+            raise ValueError("queue_size must be at least 1")
+        if loop is None and workers < 1:
+            raise ValueError("workers must be at least 1")
+
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.loop = loop
+        self.coalesce = frozenset(coalesce)
+
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._space = threading.Condition(self._lock)
+        self._queues: Dict[int, _EntityQueue] = {}
+        self._runnable: Deque[_EntityQueue] = deque()
+        self._closed = False
+        self._workers: List[threading.Thread] = []
+        self._deleted: Deque[int] = deque()
+        _dispatchers.add(self)
+
+        if loop is None:
+            for i in range(workers):
+                thread = threading.Thread(target=self._work, name=f"cyclonedds-listener-{i}", daemon=True)
+                thread.start()
+                self._workers.append(thread)
+
+    def submit(self, key: int, event: str, callback: Callable[..., Any], *args: Any) -> bool:
+        """Queue callback(*args) for the entity with handle key, returns False if the event
+        was dropped. This is what a Listener calls from the Cyclone thread."""
+        now = perf_counter_ns()
+        with self._lock:
+            self._drop_deleted()
+            queue = self._queues.get(key)
+            if queue is None:
+                queue = self._queues[key] = _EntityQueue(key)
+            queue.forgotten = False
+            stats = queue.stats
+
+            if self._closed:
+                stats.dropped += 1
+                return False
+
+            if event in queue.pending:
+                stats.coalesced += 1
+                return True
+
+            if len(queue.events) >= self.queue_size:
+                if self.overflow == Overflow.DropNewest:
+                    stats.dropped += 1
+                    return False
+                elif self.overflow == Overflow.DropOldest:
+                    dropped = queue.events.popleft()
+                    queue.pending.discard(dropped[0])
+                    stats.dropped += 1
+                elif not self._on_worker():
+                    # A callback that triggers a listener of its own would wait for itself
+                    while len(queue.events) >= self.queue_size and not self._closed:
+                        self._space.wait()
+                    if self._closed:
+                        stats.dropped += 1
+                        return False
+
+            queue.events.append((event, callback, args, now))
+            if event in self.coalesce:
+                queue.pending.add(event)
+            stats.depth = len(queue.events)
+            stats.max_depth = max(stats.max_depth, stats.depth)
+
+            if not queue.scheduled:
+                queue.scheduled = True
+                if self.loop is None:
+                    self._runnable.append(queue)
+                    self._ready.notify()
+                else:
+                    self.loop.call_soon_threadsafe(self._run_on_loop, queue)
+        return True
+
+    def metrics(self) -> Dict[int, QueueStats]:
+        """Copy of the statistics of every entity queue, by entity handle."""
+        with self._lock:
+            self._drop_deleted()
+            return {key: replace(queue.stats) for key, queue in self._queues.items()}
+
+    def forget(self, key: int) -> None:
+        """Drop the queue and statistics of the entity with handle key, events that are still
+        queued run first. Entities do this when they are deleted."""
+        # Entities are deleted by the garbage collector, which may run while this thread holds
+        # the lock, so only note the key here
+        self._deleted.append(key)
+
+    def reset_metrics(self) -> None:
+        with self._lock:
+            for queue in self._queues.values():
+                queue.stats = QueueStats(depth=len(queue.events), max_depth=len(queue.events))
+
+    def close(self, wait: bool = True) -> None:
+        """Stop accepting events. The worker threads finish the queued ones first, when wait
+        is set this blocks until they are done."""
+        with self._lock:
+            self._closed = True
+            self._ready.notify_all()
+            self._space.notify_all()
+        if wait and not self._on_worker():
+            for thread in self._workers:
+                thread.join()
+
+    def __enter__(self) -> 'ListenerDispatcher':
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def _on_worker(self) -> bool:
+        if self.loop is not None:
+            try:
+                return asyncio.get_running_loop() is self.loop
+            except RuntimeError:
+                return False
+        return threading.current_thread() in self._workers
+
+    def _next(self, queue: _EntityQueue) -> Tuple[str, Callable[..., Any], tuple, int]:
+        # With the lock held
+        item = queue.events.popleft()
+        queue.pending.discard(item[0])
+        queue.stats.depth = len(queue.events)
+        self._space.notify_all()
+        return item
+
+    def _drop_deleted(self) -> None:
+        # With the lock held
+        while self._deleted:
+            key = self._deleted.popleft()
+            queue = self._queues.get(key)
+            if queue is None:
+                continue
+            if queue.scheduled:
+                queue.forgotten = True
+            else:
+                del self._queues[key]
+
+    def _idle(self, queue: _EntityQueue) -> None:
+        # With the lock held
+        queue.scheduled = False
+        if queue.forgotten and self._queues.get(queue.key) is queue:
+            del self._queues[queue.key]
+
+    def _run(self, queue: _EntityQueue, item: Tuple[str, Callable[..., Any], tuple, int]) -> Any:
+        _, callback, args, queued = item
+        start = perf_counter_ns()
+        result, failed = None, False
+        try:
+            result = callback(*args)
+        except Exception:
+            failed = True
+            traceback.print_exc()
+        end = perf_counter_ns()
+
+        with self._lock:
+            stats = queue.stats
+            stats.dispatched += 1
+            stats.errors += failed
+            stats.total_wait_ns += start - queued
+            stats.max_wait_ns = max(stats.max_wait_ns, start - queued)
+            stats.total_latency_ns += end - start
+            stats.max_latency_ns = max(stats.max_latency_ns, end - start)
+        return result
+
+    def _work(self) -> None:
+        while True:
+            with self._lock:
+                while not self._runnable and not self._closed:
+                    self._ready.wait()
+                if not self._runnable:
+                    return
+                queue = self._runnable.popleft()
+                item = self._next(queue)
+
+            self._run(queue, item)
+
+            with self._lock:
+                if queue.events:
+                    # Behind the other entities, so a busy one cannot starve them
+                    self._runnable.append(queue)
+                    self._ready.notify()
+                else:
+                    self._idle(queue)
+
+    def _run_on_loop(self, queue: _EntityQueue) -> None:
+        with self._lock:
+            if not queue.events:
+                self._idle(queue)
+                return
+            item = self._next(queue)
+
+        result = self._run(queue, item)
+        if asyncio.iscoroutine(result) or isinstance(result, asyncio.Future):
+            asyncio.ensure_future(result, loop=self.loop)
+
+        with self._lock:
+            if queue.events:
+                self.loop.call_soon(self._run_on_loop, queue)
+            else:
+                self._idle(queue)
+
+
+_dispatchers: 'WeakSet[ListenerDispatcher]' = WeakSet()
+
+
+def _entity_deleted(key: int) -> None:
+    # Events of an entity can come through the listener of any of its ancestors, so every
+    # dispatcher may have a queue for it
+    for dispatcher in list(_dispatchers):
+        dispatcher.forget(key)
+
+
+__all__ = ["ListenerDispatcher", "Overflow", "QueueStats"]
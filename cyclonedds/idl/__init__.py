@@ -25,6 +25,9 @@ _TIE = TypeVar('_TIE', bound='IdlEnum')
 
 
 class IdlStruct(metaclass=IdlMeta):
+    # Subclasses without __slots__ still get a __dict__, this allows slotted ones
+    __slots__ = ()
+
     def serialize(self, buffer: Optional[Buffer] = None, endianness: Optional[Endianness] = None, use_version_2: bool = None) -> bytes:
         return self.__idl__.serialize(self, buffer=buffer, endianness=endianness, use_version_2=use_version_2)
 
@@ -35,13 +38,17 @@ class IdlStruct(metaclass=IdlMeta):
 
 def make_idl_struct(class_name: str, typename: str, fields: Dict[str, Any], *, dataclassify=True,
                     field_annotations: Optional[Dict[str, Dict[str, Any]]] = None,
-                    bases: Tuple[Type[IdlStruct], ...] = ()) -> Type[IdlStruct]:
+                    bases: Tuple[Type[IdlStruct], ...] = (), slots: bool = False) -> Type[IdlStruct]:
     bases = tuple(list(*bases) + [IdlStruct])
     namespace = IdlMeta.__prepare__(class_name, bases, typename=typename)
 
     for fieldname, _type in fields.items():
         namespace['__annotations__'][fieldname] = _type
 
+    if slots:
+        # No per instance __dict__, readers set sample_info on received samples
+        namespace['__slots__'] = tuple(fields) + ('sample_info',)
+
     if field_annotations:
         namespace['__idl_field_annotations__'] = field_annotations
 
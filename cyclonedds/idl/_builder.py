@@ -20,7 +20,9 @@ from ._type_normalize import get_idl_annotations, get_idl_field_annotations, get
 from ._machinery import Machine, NoneMachine, PrimitiveMachine, StringMachine, BytesMachine, ByteArrayMachine, UnionMachine, \
     ArrayMachine, SequenceMachine, InstanceMachine, MappingMachine, EnumMachine, StructMachine, OptionalMachine, CharMachine, \
     PLCdrMutableStructMachine, DelimitedCdrAppendableStructMachine, MutableMember, DelimitedCdrAppendableUnionMachine, \
-    PlainCdrV2ArrayOfPrimitiveMachine, PlainCdrV2SequenceOfPrimitiveMachine, LenType, BitMaskMachine, BitBoundEnumMachine
+    PlainCdrV2ArrayOfPrimitiveMachine, PlainCdrV2SequenceOfPrimitiveMachine, LenType, BitMaskMachine, BitBoundEnumMachine, \
+    NdArrayArrayOfPrimitiveMachine, NdArraySequenceOfPrimitiveMachine, trusted_constructor
+from ._compiler import MachineCompiler
 
 from .types import array, bounded_str, sequence, _type_code_align_size_default_mapping, NoneType, char, typedef, uint8, \
     case, default
@@ -109,6 +111,16 @@ class Builder:
 
         raise TypeError(f"{_type} is not valid in IDL classes because it cannot be encoded.")
 
+    @classmethod
+    def _machine_ndarray(cls, name, machine):
+        if isinstance(machine, PlainCdrV2SequenceOfPrimitiveMachine):
+            return NdArraySequenceOfPrimitiveMachine(machine.subtype, max_length=machine.max_length)
+        elif isinstance(machine, PlainCdrV2ArrayOfPrimitiveMachine):
+            return NdArrayArrayOfPrimitiveMachine(machine.subtype, machine.length)
+        elif isinstance(machine, ByteArrayMachine):
+            return NdArrayArrayOfPrimitiveMachine(uint8, machine.size)
+        raise TypeError(f"Member {name} is annotated as ndarray but is not a sequence or array of primitives.")
+
     @classmethod
     def _machine_struct(cls, struct: Type[IdlStruct]) -> Tuple[Machine, bool]:
         fields = get_extended_type_hints(struct)
@@ -138,6 +150,11 @@ class Builder:
             for name, field_type in fields.items()
         }
 
+        for name, f_annotations in field_annotations.items():
+            if f_annotations.get("ndarray"):
+                v0_members[name] = cls._machine_ndarray(name, v0_members[name])
+                v2_members[name] = cls._machine_ndarray(name, v2_members[name])
+
         v0_machine = StructMachine(struct, v0_members, keylist)
 
         if extensibility and extensibility != "final":
@@ -235,13 +252,20 @@ class Builder:
         return v0_machine, v2_machine
 
     @classmethod
-    def build_machines(cls, _type):
+    def build_machines(cls, _type, compiled=False, native=True, trusted=False):
         if issubclass(_type, IdlUnion):
             v0_machine, v2_machine = cls._machine_union(_type)
             keyless = False
         elif issubclass(_type, IdlStruct):
             v0_machine, v2_machine, keyless = cls._machine_struct(_type)
+            if trusted:
+                v0_machine.construct = v2_machine.construct = \
+                    trusted_constructor(_type, v0_machine.members_machines.keys())
         else:
             raise Exception(f"Cannot build for {_type}, not struct or union.")
 
+        if compiled:
+            v0_machine = MachineCompiler.compile(v0_machine, use_version_2=False, native=native)
+            v2_machine = MachineCompiler.compile(v2_machine, use_version_2=True, native=native)
+
         return v0_machine, v2_machine, keyless
@@ -0,0 +1,502 @@
+"""
+ * Copyright(c) 2021 ADLINK Technology Limited and others
+ *
+ * This program and the accompanying materials are made available under the
+ * terms of the Eclipse Public License v. 2.0 which is available at
+ * http://www.eclipse.org/legal/epl-2.0, or the Eclipse Distribution License
+ * v. 1.0 which is available at
+ * http://www.eclipse.org/org/documents/edl-v10.php.
+ *
+ * SPDX-License-Identifier: EPL-2.0 OR BSD-3-Clause
+"""
+
+from struct import Struct
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .types import _type_code_align_size_default_mapping
+from ._support import KeyScanner, CdrSerVmOp, CdrSerVMOpType
+from ._machinery import Machine, PrimitiveMachine, CharMachine, StringMachine, PlainCdrV2ArrayOfPrimitiveMachine, \
+    PlainCdrV2SequenceOfPrimitiveMachine, InstanceMachine, StructMachine, DelimitedCdrAppendableStructMachine
+
+
+class CompiledMachine(Machine):
+    """Wraps a struct machine and replaces its serialize/deserialize with generated code.
+
+    Everything that is not on the hot path (keys, defaults) is delegated to the wrapped
+    machine, which is also used as fallback whenever the generated code cannot handle
+    a situation, so error messages are identical to the interpreted machines.
+    """
+    def __init__(self, machine, serialize, deserialize, source):
+        self.machine = machine
+        self.type = machine.type
+        self.alignment = getattr(machine, "alignment", 1)
+        self.source = source
+        self.serialize = serialize
+        self.deserialize = deserialize
+
+    def key_scan(self) -> KeyScanner:
+        return self.machine.key_scan()
+
+    def cdr_key_machine_op(self, skip):
+        return self.machine.cdr_key_machine_op(skip)
+
+    def default_initialize(self):
+        return self.machine.default_initialize()
+
+
+class NativeMachine(CompiledMachine):
+    """Runs an op program in the C serializer VM of the _clayer extension.
+
+    The wrapped machine (compiled or interpreted) takes over for keys and whenever the
+    VM refuses a value or stream, for example values of unexpected types or truncated
+    appendable structs, so behaviour is identical to the Python machines.
+    """
+    def __init__(self, machine, ops, program, align_max, native):
+        self.machine = machine
+        self.type = machine.type
+        self.alignment = getattr(machine, "alignment", 1)
+        self.source = getattr(machine, "source", None)
+        self.ops = ops
+        self.program = program
+        self.align_max = align_max
+        self._serialize, self._deserialize = native
+
+    def serialize(self, buffer, value, for_key=False):
+        if for_key or buffer._align_max != self.align_max:
+            return self.machine.serialize(buffer, value, for_key)
+
+        buffer.ensure_size(0)
+        try:
+            buffer._pos = self._serialize(
+                self.program, value, buffer._bytes, buffer._pos, buffer._align_offset, buffer._endian == '<'
+            )
+        except Exception:
+            buffer._size = len(buffer._bytes)
+            self.machine.serialize(buffer, value, False)
+        buffer._size = len(buffer._bytes)
+        buffer._end = max(buffer._end, buffer._pos)
+
+    def deserialize(self, buffer):
+        if buffer._align_max != self.align_max:
+            return self.machine.deserialize(buffer)
+
+        try:
+            value, buffer._pos = self._deserialize(
+                self.program, buffer._bytes, buffer._pos, buffer._align_offset, buffer._endian == '<'
+            )
+        except Exception:
+            return self.machine.deserialize(buffer)
+        return value
+
+
+class NativeProgram:
+    """Export the machine tree of a struct as an op program for the C serializer VM.
+
+    Supported are final and appendable structs containing primitives, chars, strings,
+    arrays and sequences of primitives and nested structs of the same. For anything else
+    export returns None and the Python machines are used.
+    """
+
+    class Unsupported(Exception):
+        pass
+
+    @staticmethod
+    def _unwrap(machine: Machine) -> Machine:
+        while isinstance(machine, CompiledMachine):
+            machine = machine.machine
+        return machine
+
+    @classmethod
+    def _member(cls, name: str, machine: Machine, align_max: int, seen: List[type]) -> List[CdrSerVmOp]:
+        machine = cls._unwrap(machine)
+
+        if type(machine) == PrimitiveMachine:
+            return [CdrSerVmOp(CdrSerVMOpType.Primitive, name, machine.code, min(machine.alignment, align_max),
+                               machine.size)]
+        if type(machine) == CharMachine:
+            return [CdrSerVmOp(CdrSerVMOpType.Char, name, 'b', 1, 1)]
+        if type(machine) == StringMachine:
+            return [CdrSerVmOp(CdrSerVMOpType.String, name, align=4, length=machine.bound or 0)]
+        if type(machine) == PlainCdrV2ArrayOfPrimitiveMachine:
+            code, alignment, size, _ = _type_code_align_size_default_mapping[machine.subtype]
+            return [CdrSerVmOp(CdrSerVMOpType.ArrayOfPrimitive, name, code, min(alignment, align_max), size,
+                               machine.length)]
+        if type(machine) == PlainCdrV2SequenceOfPrimitiveMachine:
+            return [CdrSerVmOp(CdrSerVMOpType.SequenceOfPrimitive, name, machine.code,
+                               min(machine.alignment, align_max), machine.size, machine.max_length or 0)]
+        if type(machine) == InstanceMachine:
+            idl = machine.type.__idl__
+            if idl.v0_machine is None:
+                idl.populate()
+            return cls._struct(name, idl.v2_machine if machine.use_version_2 else idl.v0_machine, align_max, seen)
+        raise cls.Unsupported()
+
+    @classmethod
+    def _struct(cls, name: Optional[str], machine: Machine, align_max: int, seen: List[type]) -> List[CdrSerVmOp]:
+        machine = cls._unwrap(machine)
+
+        if type(machine) == StructMachine:
+            members, appendable = machine.members_machines, False
+        elif type(machine) == DelimitedCdrAppendableStructMachine:
+            members, appendable = machine.member_machines, True
+        else:
+            raise cls.Unsupported()
+
+        if machine.type in seen:
+            # Recursive types need a call stack, leave those to Python
+            raise cls.Unsupported()
+
+        ops = [CdrSerVmOp(CdrSerVMOpType.StructBegin, name, pytype=machine.construct)]
+        if appendable:
+            ops.append(CdrSerVmOp(CdrSerVMOpType.AppendableBegin, align=4))
+        for member, submachine in members.items():
+            ops += cls._member(member, submachine, align_max, seen + [machine.type])
+        if appendable:
+            ops.append(CdrSerVmOp(CdrSerVMOpType.AppendableEnd))
+        ops.append(CdrSerVmOp(CdrSerVMOpType.StructEnd))
+        return ops
+
+    @classmethod
+    def export(cls, machine: Machine, use_version_2: bool) -> Optional[List[CdrSerVmOp]]:
+        """Return the op program for machine or None if the C serializer cannot handle it."""
+        try:
+            return cls._struct(None, machine, 4 if use_version_2 else 8, [])
+        except cls.Unsupported:
+            return None
+
+
+def _native_functions():
+    try:
+        from cyclonedds._clayer import ddspy_cdr_program, ddspy_cdr_serialize, ddspy_cdr_deserialize
+    except ImportError:
+        return None
+    return ddspy_cdr_program, ddspy_cdr_serialize, ddspy_cdr_deserialize
+
+
+class _Run:
+    """A run of adjacent primitive members packed with a single precomputed struct format."""
+    def __init__(self, alignment: int) -> None:
+        self.alignment = alignment
+        self.fmt = ""
+        self.size = 0
+        # (member name, machine, first value index, number of values)
+        self.members: List[Tuple[str, Machine, int, int]] = []
+        self.nvalues = 0
+
+    def accepts(self, alignment: int) -> bool:
+        return alignment <= self.alignment
+
+    def add(self, name: str, machine: Machine, alignment: int, code: str, size: int, nvalues: int) -> None:
+        padding = ((self.size + alignment - 1) & ~(alignment - 1)) - self.size
+        if padding:
+            self.fmt += f"{padding}x"
+        self.fmt += code
+        self.size += padding + size
+        self.members.append((name, machine, self.nvalues, nvalues))
+        self.nvalues += nvalues
+
+    def structs(self) -> Dict[str, Struct]:
+        return {'<': Struct('<' + self.fmt), '>': Struct('>' + self.fmt)}
+
+
+class MachineCompiler:
+    """Turn the machine tree of a struct into one generated serialize and deserialize function.
+
+    Adjacent primitive members (primitives, chars and arrays of primitives) are merged
+    into a single ``struct.Struct`` per endianness. Other members keep calling their machine.
+    """
+
+    @staticmethod
+    def _primitive_info(machine: Machine, align_max: int):
+        if type(machine) == PrimitiveMachine:
+            return min(machine.alignment, align_max), machine.code, machine.size, 1
+        if type(machine) == CharMachine:
+            return 1, 'b', 1, 1
+        if type(machine) == PlainCdrV2ArrayOfPrimitiveMachine:
+            return min(machine.alignment, align_max), machine.code, machine.size, machine.length
+        return None
+
+    @classmethod
+    def _plan(cls, members: Dict[str, Machine], align_max: int) -> List[Any]:
+        plan: List[Any] = []
+        run = None
+        for name, machine in members.items():
+            info = cls._primitive_info(machine, align_max)
+            if info is None:
+                run = None
+                plan.append((name, machine))
+                continue
+
+            alignment, code, size, nvalues = info
+            if run is None or not run.accepts(alignment):
+                run = _Run(alignment)
+                plan.append(run)
+            run.add(name, machine, alignment, code, size, nvalues)
+        return plan
+
+    @staticmethod
+    def _pack_expr(name: str, machine: Machine) -> str:
+        if isinstance(machine, CharMachine):
+            return f"ord(value.{name})"
+        if isinstance(machine, PlainCdrV2ArrayOfPrimitiveMachine):
+            return f"*value.{name}"
+        return f"value.{name}"
+
+    @staticmethod
+    def _unpack_expr(var: str, machine: Machine, index: int, nvalues: int) -> str:
+        if isinstance(machine, CharMachine):
+            return f"chr({var}[{index}])"
+        if isinstance(machine, PlainCdrV2ArrayOfPrimitiveMachine):
+            return f"list({var}[{index}:{index + nvalues}])"
+        return f"{var}[{index}]"
+
+    @classmethod
+    def _serialize_body(cls, plan: List[Any], namespace: Dict[str, Any], indent: str) -> List[str]:
+        lines = []
+        for i, step in enumerate(plan):
+            if isinstance(step, _Run):
+                namespace[f"_s{i}"] = step.structs()
+                if step.alignment > 1:
+                    lines.append(f"{indent}buffer.align({step.alignment})")
+                args = ", ".join(cls._pack_expr(name, machine) for name, machine, _, _ in step.members)
+                lines += [
+                    f"{indent}buffer.ensure_size({step.size})",
+                    f"{indent}_s{i}[buffer._endian].pack_into(buffer._bytes, buffer._pos, {args})",
+                    f"{indent}buffer._pos += {step.size}"
+                ]
+            else:
+                name, machine = step
+                namespace[f"_m{i}"] = machine
+                lines.append(f"{indent}_m{i}.serialize(buffer, value.{name}, False)")
+        return lines or [f"{indent}pass"]
+
+    @classmethod
+    def _generate_final(cls, machine: StructMachine, align_max: int, namespace: Dict[str, Any]) -> str:
+        plan = cls._plan(machine.members_machines, align_max)
+
+        lines = [
+            "def serialize(buffer, value, for_key=False):",
+            f"    if for_key or buffer._align_max != {align_max}:",
+            "        return _machine.serialize(buffer, value, for_key)",
+            "    _start = buffer._pos",
+            "    try:"
+        ]
+        lines += cls._serialize_body(plan, namespace, "        ")
+        lines += [
+            "    except Exception:",
+            "        buffer.rewind(_start)",
+            "        _machine.serialize(buffer, value, False)",
+            "",
+            "def deserialize(buffer):",
+            f"    if buffer._align_max != {align_max}:",
+            "        return _machine.deserialize(buffer)"
+        ]
+
+        values = []
+        for i, step in enumerate(plan):
+            if isinstance(step, _Run):
+                if step.alignment > 1:
+                    lines.append(f"    buffer.align({step.alignment})")
+                lines += [
+                    f"    _r{i} = _s{i}[buffer._endian].unpack_from(buffer._bytes, buffer._pos)",
+                    f"    buffer._pos += {step.size}"
+                ]
+                values += [
+                    f"{name}={cls._unpack_expr(f'_r{i}', m, index, n)}" for name, m, index, n in step.members
+                ]
+            else:
+                lines.append(f"    _v{i} = _m{i}.deserialize(buffer)")
+                values.append(f"{step[0]}=_v{i}")
+        lines.append(f"    return _type({', '.join(values)})")
+        return "\n".join(lines) + "\n"
+
+    @classmethod
+    def _generate_appendable(cls, machine: DelimitedCdrAppendableStructMachine, align_max: int,
+                             namespace: Dict[str, Any]) -> str:
+        plan = cls._plan(machine.member_machines, align_max)
+
+        lines = [
+            "def serialize(buffer, value, for_key=False):",
+            f"    if for_key or buffer._align_max != {align_max}:",
+            "        return _machine.serialize(buffer, value, for_key)",
+            "    _start = buffer._pos",
+            "    try:",
+            "        buffer.align(4)",
+            "        _hpos = buffer._pos",
+            "        buffer.write('I', 4, 0)",
+            "        _dpos = buffer._pos"
+        ]
+        lines += cls._serialize_body(plan, namespace, "        ")
+        lines += [
+            "        _fpos = buffer._pos",
+            "        buffer.seek(_hpos)",
+            "        buffer.write('I', 4, _fpos - _dpos)",
+            "        buffer.seek(_fpos)",
+            "    except Exception:",
+            "        buffer.rewind(_start)",
+            "        _machine.serialize(buffer, value, False)",
+            "",
+            "def deserialize(buffer):",
+            f"    if buffer._align_max != {align_max}:",
+            "        return _machine.deserialize(buffer)",
+            "    _start = buffer._pos",
+            "    buffer.align(4)",
+            "    _size = buffer.read('I', 4)",
+            "    _hpos = buffer._pos"
+        ]
+
+        # Any member that is not (fully) present in the stream is handed back to the
+        # interpreted machine, which knows how to default initialize members.
+        values = []
+        for i, step in enumerate(plan):
+            if isinstance(step, _Run):
+                if step.alignment > 1:
+                    lines.append(f"    buffer.align({step.alignment})")
+                lines += [
+                    f"    if buffer._pos + {step.size} - _hpos > _size:",
+                    "        buffer.seek(_start)",
+                    "        return _machine.deserialize(buffer)",
+                    f"    _r{i} = _s{i}[buffer._endian].unpack_from(buffer._bytes, buffer._pos)",
+                    f"    buffer._pos += {step.size}"
+                ]
+                values += [
+                    f"{name}={cls._unpack_expr(f'_r{i}', m, index, n)}" for name, m, index, n in step.members
+                ]
+            else:
+                lines += [
+                    "    if buffer._pos - _hpos >= _size:",
+                    "        buffer.seek(_start)",
+                    "        return _machine.deserialize(buffer)",
+                    f"    _v{i} = _m{i}.deserialize(buffer)",
+                    "    if buffer._pos - _hpos > _size:",
+                    "        buffer.seek(_start)",
+                    "        return _machine.deserialize(buffer)"
+                ]
+                values.append(f"{step[0]}=_v{i}")
+        lines += [
+            "    buffer.seek(_hpos + _size)",
+            f"    return _type({', '.join(values)})"
+        ]
+        return "\n".join(lines) + "\n"
+
+    @classmethod
+    def compile(cls, machine: Machine, use_version_2: bool, native: bool = True) -> Machine:
+        """Return a NativeMachine or CompiledMachine for machine, or machine itself if it cannot be compiled.
+        The C serializer is used when native is set, the _clayer extension is available and the type is
+        supported, the generated Python code serves as its fallback."""
+        compiled = cls._compile_python(machine, use_version_2)
+
+        functions = _native_functions() if native else None
+        ops = NativeProgram.export(machine, use_version_2) if functions else None
+        if ops is None:
+            return compiled
+
+        make_program, serialize, deserialize = functions
+        return NativeMachine(compiled, ops, make_program(ops), 4 if use_version_2 else 8, (serialize, deserialize))
+
+    @classmethod
+    def _compile_python(cls, machine: Machine, use_version_2: bool) -> Machine:
+        align_max = 4 if use_version_2 else 8
+        namespace: Dict[str, Any] = {"_machine": machine, "_type": getattr(machine, "construct", None)}
+
+        if type(machine) == StructMachine:
+            source = cls._generate_final(machine, align_max, namespace)
+        elif type(machine) == DelimitedCdrAppendableStructMachine:
+            source = cls._generate_appendable(machine, align_max, namespace)
+        else:
+            # Mutable structs and unions keep their interpreted machines
+            return machine
+
+        code = compile(source, f"<cyclonedds-compiled {machine.type.__idl_typename__}>", "exec")
+        exec(code, namespace)
+        return CompiledMachine(machine, namespace["serialize"], namespace["deserialize"], source)
+
+    @classmethod
+    def _key_members(cls, path: str, machine: Machine, align_max: int, seen: List[type]) -> List[Tuple[str, Machine]]:
+        machine = NativeProgram._unwrap(machine)
+
+        if type(machine) == StructMachine:
+            members = machine.members_machines
+        elif type(machine) == DelimitedCdrAppendableStructMachine:
+            # Appendable structs have no delimiter header in key mode
+            members = machine.member_machines
+        else:
+            raise NativeProgram.Unsupported()
+
+        if machine.type in seen:
+            raise NativeProgram.Unsupported()
+
+        keys: List[Tuple[str, Machine]] = []
+        for name, submachine in members.items():
+            if machine.keylist and name not in machine.keylist:
+                continue
+            submachine = NativeProgram._unwrap(submachine)
+            member_path = f"{path}.{name}" if path else name
+            if type(submachine) == InstanceMachine:
+                idl = submachine.type.__idl__
+                if idl.v0_machine is None:
+                    idl.populate()
+                keys += cls._key_members(member_path, idl.v2_machine if submachine.use_version_2 else idl.v0_machine,
+                                         align_max, seen + [machine.type])
+            elif type(submachine) == StringMachine or cls._primitive_info(submachine, align_max) is not None:
+                keys.append((member_path, submachine))
+            else:
+                raise NativeProgram.Unsupported()
+        return keys
+
+    @classmethod
+    def compile_key(cls, machine: Machine, use_version_2: bool) -> Optional[Callable[[Any], bytes]]:
+        """Generate a function that builds the key of a sample (as serialized with for_key, big endian)
+        straight from its key members. Key members up to the first string are packed with one precomputed
+        struct format. Returns None if a key member is not a primitive, string or struct thereof. The
+        generated function raises on any value it cannot pack, the machine reports the actual error."""
+        align_max = 4 if use_version_2 else 8
+        try:
+            members = cls._key_members("", machine, align_max, [])
+        except NativeProgram.Unsupported:
+            return None
+
+        namespace: Dict[str, Any] = {"_len": Struct(">I"), "_zeros": bytes(8)}
+        # The first run starts at offset zero, so it can hold members of any alignment
+        steps: List[Any] = [_Run(align_max)]
+        for path, member in members:
+            if type(member) == StringMachine:
+                steps.append((path, member))
+                continue
+            alignment, code, size, nvalues = cls._primitive_info(member, align_max)
+            if not isinstance(steps[-1], _Run) or not steps[-1].accepts(alignment):
+                steps.append(_Run(alignment))
+            steps[-1].add(path, member, alignment, code, size, nvalues)
+
+        first = steps[0]
+        namespace["_s0"] = Struct('>' + first.fmt)
+        args = ", ".join(cls._pack_expr(path, member) for path, member, _, _ in first.members)
+        if len(steps) == 1:
+            source = f"def key(value):\n    return _s0.pack({args})\n"
+        else:
+            lines = ["def key(value):", f"    _b = bytearray(_s0.pack({args}))"]
+            for i, step in enumerate(steps[1:], 1):
+                if isinstance(step, _Run):
+                    namespace[f"_s{i}"] = Struct('>' + step.fmt)
+                    args = ", ".join(cls._pack_expr(path, member) for path, member, _, _ in step.members)
+                    if step.alignment > 1:
+                        lines.append(f"    _b += _zeros[:-len(_b) & {step.alignment - 1}]")
+                    lines.append(f"    _b += _s{i}.pack({args})")
+                else:
+                    path, member = step
+                    if member.bound:
+                        lines.append(f"    if len(value.{path}) > {member.bound}:")
+                        lines.append("        raise ValueError('String longer than bound.')")
+                    lines += [
+                        f"    _e{i} = value.{path}.encode('utf-8')",
+                        "    _b += _zeros[:-len(_b) & 3]",
+                        f"    _b += _len.pack(len(_e{i}) + 1)",
+                        f"    _b += _e{i}",
+                        "    _b.append(0)"
+                    ]
+            lines.append("    return bytes(_b)")
+            source = "\n".join(lines) + "\n"
+
+        code = compile(source, f"<cyclonedds-compiled key {machine.type.__idl_typename__}>", "exec")
+        exec(code, namespace)
+        return namespace["key"]
@@ -0,0 +1,362 @@
+"""
+ * Copyright(c) 2021 ADLINK Technology Limited and others
+ *
+ * This program and the accompanying materials are made available under the
+ * terms of the Eclipse Public License v. 2.0 which is available at
+ * http://www.eclipse.org/legal/epl-2.0, or the Eclipse Distribution License
+ * v. 1.0 which is available at
+ * http://www.eclipse.org/org/documents/edl-v10.php.
+ *
+ * SPDX-License-Identifier: EPL-2.0 OR BSD-3-Clause
+"""
+
+import ast
+import io
+import sys
+import operator
+import tokenize
+
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from ._machinery import Machine, PrimitiveMachine, CharMachine, PlainCdrV2ArrayOfPrimitiveMachine
+from ._support import CdrFilterVmOp, CdrFilterVMOpType, CdrFilterVMCompare, struct_for
+from ._type_normalize import get_extended_type_hints
+from .types import _type_code_align_size_default_mapping
+
+
+# Must match CDR_FILTER_VM_MAX_DEPTH in clayer/cdrfiltervm.h
+_max_depth = 64
+
+_constants: Tuple[type, ...] = (ast.Constant,)
+_subscripts: Tuple[type, ...] = (ast.Subscript,)
+if sys.version_info < (3, 8):
+    _constants += (ast.Num, ast.Str, ast.NameConstant)
+if sys.version_info < (3, 9):
+    _subscripts += (ast.Index,)
+
+_allowed_nodes = (
+    ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub, ast.UAdd,
+    ast.Compare, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.In, ast.NotIn,
+    ast.Name, ast.Attribute, ast.Load, ast.Tuple, ast.List, ast.Set
+) + _constants + _subscripts
+
+_compare_ops = {
+    ast.Eq: CdrFilterVMCompare.Eq,
+    ast.NotEq: CdrFilterVMCompare.Ne,
+    ast.Lt: CdrFilterVMCompare.Lt,
+    ast.LtE: CdrFilterVMCompare.Le,
+    ast.Gt: CdrFilterVMCompare.Gt,
+    ast.GtE: CdrFilterVMCompare.Ge
+}
+
+# a < b is b > a
+_mirrored = {
+    CdrFilterVMCompare.Eq: CdrFilterVMCompare.Eq,
+    CdrFilterVMCompare.Ne: CdrFilterVMCompare.Ne,
+    CdrFilterVMCompare.Lt: CdrFilterVMCompare.Gt,
+    CdrFilterVMCompare.Le: CdrFilterVMCompare.Ge,
+    CdrFilterVMCompare.Gt: CdrFilterVMCompare.Lt,
+    CdrFilterVMCompare.Ge: CdrFilterVMCompare.Le
+}
+
+_python_compare: Dict[CdrFilterVMCompare, Callable[[Any, Any], bool]] = {
+    CdrFilterVMCompare.Eq: operator.eq,
+    CdrFilterVMCompare.Ne: operator.ne,
+    CdrFilterVMCompare.Lt: operator.lt,
+    CdrFilterVMCompare.Le: operator.le,
+    CdrFilterVMCompare.Gt: operator.gt,
+    CdrFilterVMCompare.Ge: operator.ge
+}
+
+_no_builtins: Dict[str, Any] = {"__builtins__": {}}
+
+_param_prefix = "__param"
+
+
+def _param_index(node: ast.AST) -> Optional[int]:
+    if isinstance(node, ast.Name) and node.id.startswith(_param_prefix):
+        return int(node.id[len(_param_prefix):])
+    return None
+
+
+def _substitute_params(expression: str) -> str:
+    """Replace the %0, %1, ... parameter references with names that Python can parse."""
+    tokens = []
+    percent = False
+    for token in tokenize.generate_tokens(io.StringIO(expression.strip()).readline):
+        if percent:
+            if token.type != tokenize.NUMBER or not token.string.isdigit():
+                raise ValueError(f"Invalid parameter reference in filter expression {expression!r}")
+            tokens.append((tokenize.NAME, f"{_param_prefix}{int(token.string)}"))
+            percent = False
+        elif token.type == tokenize.OP and token.string == "%":
+            percent = True
+        else:
+            tokens.append((token.type, token.string))
+    return tokenize.untokenize(tokens)
+
+
+class _Unsupported(Exception):
+    pass
+
+
+class _SampleMembers(ast.NodeTransformer):
+    """Turn member names into attributes of the sample under evaluation."""
+    def visit_Name(self, node: ast.Name) -> ast.AST:
+        if _param_index(node) is not None:
+            return node
+        return ast.copy_location(ast.Attribute(
+            value=ast.Name(id="__sample", ctx=ast.Load()), attr=node.id, ctx=ast.Load()
+        ), node)
+
+
+class _ProgramBuilder:
+    """Compile the expression to a CdrFilterVmOp program for one encoding. Every node pushes
+    one boolean on the stack of the VM, And, Or and Not combine the topmost ones."""
+    def __init__(self, layout, parameters: Sequence[Any]) -> None:
+        self.layout = layout
+        self.parameters = parameters
+        self.ops: List[CdrFilterVmOp] = []
+        self.depth = 0
+        self.max_depth = 0
+
+    def build(self, node: ast.AST) -> List[CdrFilterVmOp]:
+        self._node(node)
+        if self.max_depth > _max_depth:
+            raise _Unsupported()
+        return self.ops
+
+    def _push(self, op: CdrFilterVmOp, pops: int = 0) -> None:
+        self.ops.append(op)
+        self.depth += 1 - pops
+        self.max_depth = max(self.max_depth, self.depth)
+
+    def _node(self, node: ast.AST) -> None:
+        if isinstance(node, ast.BoolOp):
+            for value in node.values:
+                self._node(value)
+            optype = CdrFilterVMOpType.And if isinstance(node.op, ast.And) else CdrFilterVMOpType.Or
+            self._push(CdrFilterVmOp(optype, count=len(node.values)), pops=len(node.values))
+        elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            self._node(node.operand)
+            self._push(CdrFilterVmOp(CdrFilterVMOpType.Not), pops=1)
+        elif isinstance(node, ast.Compare):
+            # a < b < c is a < b and b < c
+            left = node.left
+            for op, right in zip(node.ops, node.comparators):
+                self._compare(left, op, right)
+                left = right
+            if len(node.ops) > 1:
+                self._push(CdrFilterVmOp(CdrFilterVMOpType.And, count=len(node.ops)), pops=len(node.ops))
+        elif isinstance(node, (ast.Name, ast.Subscript)):
+            # A bare member is true when it is not zero
+            offset, code, size, _ = self._member(node)
+            mode, values = self._mode(code, [0])
+            self._push(CdrFilterVmOp(CdrFilterVMOpType.Compare, code, offset, size, self.layout.delimited,
+                                     cmp=CdrFilterVMCompare.Ne, mode=mode, values=values))
+        else:
+            raise _Unsupported()
+
+    def _compare(self, left: ast.AST, op: ast.cmpop, right: ast.AST) -> None:
+        if isinstance(op, (ast.In, ast.NotIn)):
+            offset, code, size, machine = self._member(left)
+            if isinstance(right, (ast.Tuple, ast.List, ast.Set)):
+                values = [self._literal(element, machine) for element in right.elts]
+            elif _param_index(right) is not None and isinstance(self._value(right), (tuple, list, set, frozenset)):
+                values = [self._check(value, machine) for value in self._value(right)]
+            else:
+                raise _Unsupported()
+            mode, values = self._mode(code, values)
+            self._push(CdrFilterVmOp(CdrFilterVMOpType.In, code, offset, size, self.layout.delimited,
+                                     mode=mode, values=values))
+            if isinstance(op, ast.NotIn):
+                self._push(CdrFilterVmOp(CdrFilterVMOpType.Not), pops=1)
+            return
+
+        cmp = _compare_ops.get(type(op))
+        if cmp is None:
+            raise _Unsupported()
+        try:
+            offset, code, size, machine = self._member(left)
+            literal = right
+        except _Unsupported:
+            offset, code, size, machine = self._member(right)
+            literal, cmp = left, _mirrored[cmp]
+
+        mode, values = self._mode(code, [self._literal(literal, machine)])
+        self._push(CdrFilterVmOp(CdrFilterVMOpType.Compare, code, offset, size, self.layout.delimited,
+                                 cmp=cmp, mode=mode, values=values))
+
+    def _member(self, node: ast.AST) -> Tuple[int, str, int, Machine]:
+        if isinstance(node, ast.Name):
+            offset, size, _, machine = self.layout.members.get(node.id, (0, 0, None, None))
+            if type(machine) == PrimitiveMachine:
+                return offset, machine.code, size, machine
+            if type(machine) == CharMachine:
+                return offset, 'b', 1, machine
+            raise _Unsupported()
+
+        if isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name):
+            offset, _, _, machine = self.layout.members.get(node.value.id, (0, 0, None, None))
+            if type(machine) != PlainCdrV2ArrayOfPrimitiveMachine:
+                raise _Unsupported()
+            index = node.slice.value if sys.version_info < (3, 9) else node.slice
+            try:
+                index = ast.literal_eval(index)
+            except ValueError:
+                raise _Unsupported()
+            if type(index) != int or not 0 <= index < machine.length:
+                raise _Unsupported()
+            code, _, size, _ = _type_code_align_size_default_mapping[machine.subtype]
+            return offset + index * size, code, size, machine
+
+        raise _Unsupported()
+
+    def _value(self, node: ast.AST) -> Any:
+        index = _param_index(node)
+        if index is not None:
+            return self.parameters[index]
+        try:
+            return ast.literal_eval(node)
+        except ValueError:
+            raise _Unsupported()
+
+    def _literal(self, node: ast.AST, machine: Machine) -> Any:
+        return self._check(self._value(node), machine)
+
+    @staticmethod
+    def _check(value: Any, machine: Machine) -> Any:
+        if type(machine) == CharMachine:
+            if type(value) != str or len(value) != 1 or ord(value) > 255:
+                raise _Unsupported()
+            # Chars are read as signed bytes
+            value = ord(value)
+            return value - 256 if value > 127 else value
+        if type(value) == bool:
+            return int(value)
+        if type(value) not in (int, float):
+            raise _Unsupported()
+        return value
+
+    @staticmethod
+    def _mode(code: str, values: List[Any]) -> Tuple[str, List[Any]]:
+        if code not in "fd" and all(type(v) == int for v in values):
+            if code in "BHIQ?" and all(0 <= v < 2 ** 64 for v in values):
+                return "u", values
+            if code in "bhiq" and all(-2 ** 63 <= v < 2 ** 63 for v in values):
+                return "i", values
+        return "d", [float(v) for v in values]
+
+
+class FilterExpression:
+    """A declarative filter on the members of a struct, like ``speed > 30 and id in (1, 2)``.
+
+    Member names, array elements with a constant index and nested members can be compared
+    with literals using ==, !=, <, <=, >, >=, in and not in, and combined with and, or and
+    not. Expressions that only compare primitive members of the struct itself, or elements
+    of its arrays, in the fixed layout prefix of the type (see LazyLayout) compile to op
+    programs, one per encoding, that are evaluated directly on the serialized data. Anything
+    else, including every comparison of a nested member like ``inner.level``, is evaluated
+    in Python on a lazily decoded sample, in which case ``programs`` is None.
+
+    Parameters are referenced as %0, %1, ... like in DDS filter expressions, for example
+    ``speed > %0``, and can be replaced later with set_parameters.
+    """
+    def __init__(self, datatype: type, expression: str, parameters: Sequence[Any] = ()) -> None:
+        self.datatype = datatype
+        self.expression = expression
+
+        try:
+            source = _substitute_params(expression)
+            tree = ast.parse(source, mode="eval")
+        except (SyntaxError, tokenize.TokenError) as e:
+            raise ValueError(f"Invalid filter expression {expression!r}") from e
+
+        members = get_extended_type_hints(datatype)
+        self._nparams = 0
+        for node in ast.walk(tree):
+            if not isinstance(node, _allowed_nodes):
+                raise ValueError(f"Unsupported {type(node).__name__} in filter expression {expression!r}")
+            if _param_index(node) is not None:
+                self._nparams = max(self._nparams, _param_index(node) + 1)
+            elif isinstance(node, ast.Name) and node.id not in members:
+                raise ValueError(f"Unknown member {node.id} in filter expression {expression!r}")
+            if isinstance(node, ast.Attribute) and node.attr.startswith("_"):
+                raise ValueError(f"Invalid member {node.attr} in filter expression {expression!r}")
+
+        # The transformer rewrites the tree in place, the programs are built from a fresh one
+        self._code = compile(
+            ast.fix_missing_locations(_SampleMembers().visit(tree)), f"<cyclonedds-filter {expression}>", "eval"
+        )
+        self._tree = ast.parse(source, mode="eval")
+        self.set_parameters(parameters)
+
+    def set_parameters(self, parameters: Sequence[Any]) -> None:
+        """Replace the values of the %0, %1, ... parameters of the expression and rebuild the programs."""
+        if len(parameters) < self._nparams:
+            raise ValueError(f"Filter expression {self.expression!r} needs {self._nparams} parameters.")
+
+        idl = self.datatype.__idl__
+        programs: Optional[Tuple[List[CdrFilterVmOp], List[CdrFilterVmOp]]]
+        try:
+            programs = (
+                _ProgramBuilder(idl.lazy_layout(False), parameters).build(self._tree.body),
+                _ProgramBuilder(idl.lazy_layout(True), parameters).build(self._tree.body)
+            )
+        except _Unsupported:
+            programs = None
+
+        self.parameters = tuple(parameters)
+        self._names = {f"{_param_prefix}{i}": value for i, value in enumerate(self.parameters)}
+        self.programs = programs
+
+    def matches(self, sample: Any) -> bool:
+        """Evaluate the expression on a (lazy) sample."""
+        names = dict(self._names)
+        names["__sample"] = sample
+        return bool(eval(self._code, _no_builtins, names))
+
+    def evaluate(self, data: bytes) -> bool:
+        """Evaluate the expression on serialized data, including the encapsulation header."""
+        if self.programs is None:
+            return self.matches(self.datatype.__idl__.deserialize_lazy(data))
+        return _run(self.programs[1 if data[1] > 1 else 0], data)
+
+
+def _read(op: CdrFilterVmOp, data: bytes, endian: str) -> Tuple[bool, Any]:
+    if op.delimited:
+        if len(data) < 8:
+            return False, None
+        if op.offset + op.size > 8 + struct_for('I')[endian].unpack_from(data, 4)[0]:
+            # Not in the data, so it has its default value
+            return True, 0
+    if op.offset + op.size > len(data):
+        return False, None
+    return True, struct_for(op.code)[endian].unpack_from(data, op.offset)[0]
+
+
+def _run(ops: List[CdrFilterVmOp], data: bytes) -> bool:
+    """Python version of cdr_filter_vm_eval, truncated data does not match."""
+    if len(data) < 4:
+        return False
+
+    endian = '<' if data[1] & 1 else '>'
+    stack: List[bool] = []
+    for op in ops:
+        if op.type == CdrFilterVMOpType.Compare or op.type == CdrFilterVMOpType.In:
+            ok, value = _read(op, data, endian)
+            if not ok:
+                return False
+            if op.mode == "d":
+                value = float(value)
+            if op.type == CdrFilterVMOpType.Compare:
+                stack.append(_python_compare[op.cmp](value, op.values[0]))
+            else:
+                stack.append(value in op.values)
+        elif op.type == CdrFilterVMOpType.Not:
+            stack.append(not stack.pop())
+        else:
+            operands = stack[-op.count:]
+            del stack[-op.count:]
+            stack.append(all(operands) if op.type == CdrFilterVMOpType.And else any(operands))
+    return stack.pop()
@@ -0,0 +1,117 @@
+"""
+ * Copyright(c) 2021 ADLINK Technology Limited and others
+ *
+ * This program and the accompanying materials are made available under the
+ * terms of the Eclipse Public License v. 2.0 which is available at
+ * http://www.eclipse.org/legal/epl-2.0, or the Eclipse Distribution License
+ * v. 1.0 which is available at
+ * http://www.eclipse.org/org/documents/edl-v10.php.
+ *
+ * SPDX-License-Identifier: EPL-2.0 OR BSD-3-Clause
+"""
+
+from struct import Struct
+from typing import Any, Dict, Tuple
+
+from ._machinery import Machine, CharMachine, PlainCdrV2ArrayOfPrimitiveMachine, StructMachine, \
+    DelimitedCdrAppendableStructMachine
+from ._compiler import CompiledMachine, MachineCompiler
+
+
+_dheader = {'<': Struct('<I'), '>': Struct('>I')}
+
+
+class LazyLayout:
+    """Offsets of the fixed layout prefix of a struct: the leading primitive members, which can
+    be read straight from the serialized data without decoding anything in front of them.
+    """
+    def __init__(self, machine: Machine, use_version_2: bool) -> None:
+        align_max = 4 if use_version_2 else 8
+        while isinstance(machine, CompiledMachine):
+            machine = machine.machine
+
+        self.delimited = type(machine) == DelimitedCdrAppendableStructMachine
+        if type(machine) == StructMachine:
+            members, offset = machine.members_machines, 0
+        elif self.delimited:
+            members, offset = machine.member_machines, 4
+        else:
+            # Mutable structs and unions have no fixed layout
+            members, offset = {}, 0
+
+        # member name -> (offset in the data, size, struct per endianness, machine)
+        self.members: Dict[str, Tuple[int, int, Dict[str, Struct], Machine]] = {}
+        for name, member in members.items():
+            info = MachineCompiler._primitive_info(member, align_max)
+            if info is None:
+                break
+            alignment, code, size, _ = info
+            offset = (offset + alignment - 1) & ~(alignment - 1)
+            # Data starts with the four byte encapsulation header
+            self.members[name] = (4 + offset, size, {'<': Struct('<' + code), '>': Struct('>' + code)}, member)
+            offset += size
+
+    def read(self, name: str, data: bytes, endian: str) -> Tuple[bool, Any]:
+        entry = self.members.get(name)
+        if entry is None:
+            return False, None
+
+        offset, size, structs, machine = entry
+        if self.delimited and offset + size > 8 + _dheader[endian].unpack_from(data, 4)[0]:
+            # Member is not in the data, the machine knows its default
+            return False, None
+        if offset + size > len(data):
+            return False, None
+
+        values = structs[endian].unpack_from(data, offset)
+        if type(machine) == CharMachine:
+            return True, chr(values[0])
+        if type(machine) == PlainCdrV2ArrayOfPrimitiveMachine:
+            return True, list(values)
+        return True, values[0]
+
+
+class LazySample:
+    """Proxy for a received sample that keeps the serialized data and only decodes members
+    when they are accessed. Members in the fixed layout prefix of the type are read straight
+    from the data, any other member decodes the whole sample once. Decoded values are cached
+    on the proxy, use ``decode()`` to get the actual object.
+    """
+    def __init__(self, idl, data: bytes, sample_info=None) -> None:
+        self.__dict__['_lazy_idl'] = idl
+        self.__dict__['_lazy_data'] = data
+        self.__dict__['_lazy_sample'] = None
+        self.sample_info = sample_info
+
+    def __getattr__(self, name: str) -> Any:
+        # Only called for attributes that are not cached in __dict__ yet
+        if name.startswith('__'):
+            raise AttributeError(name)
+
+        sample = self.__dict__['_lazy_sample']
+        if sample is None:
+            data = self._lazy_data
+            found, value = self._lazy_idl.lazy_layout(data[1] > 1).read(name, data, '<' if data[1] & 1 else '>')
+            if not found:
+                value = getattr(self.decode(), name)
+        else:
+            value = getattr(sample, name)
+
+        self.__dict__[name] = value
+        return value
+
+    def decode(self) -> Any:
+        sample = self.__dict__['_lazy_sample']
+        if sample is None:
+            sample = self._lazy_idl.deserialize(self._lazy_data)
+            sample.sample_info = self.sample_info
+            self.__dict__['_lazy_sample'] = sample
+        return sample
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, LazySample):
+            other = other.decode()
+        return self.decode() == other
+
+    def __repr__(self) -> str:
+        return f"LazySample({self.decode()!r})"
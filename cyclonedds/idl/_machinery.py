@@ -13,12 +13,46 @@
 from math import log2
 from enum import Enum
 from dataclasses import dataclass
+from types import MemberDescriptorType
+from typing import Any, Callable, Dict, Iterable
 
 from .types import _type_code_align_size_default_mapping
-from ._support import Buffer, CdrKeyVmOp, CdrKeyVMOpType, KeyScanner
+from ._support import Buffer, CdrKeyVmOp, CdrKeyVMOpType, KeyScanner, struct_for
 from . import types as types
 
 
+_uint32 = struct_for('I')
+_int8 = struct_for('b')
+_bool = struct_for('?')
+
+
+def trusted_constructor(type: type, members: Iterable[str]) -> Callable[..., Any]:
+    """Generate a function that builds an instance of struct type from its members, passed as
+    keyword arguments, without calling __init__. Dataclass validation in __post_init__ and
+    frozen checks are skipped, so only use it for values produced by the machines."""
+    namespace: Dict[str, Any] = {"__idl_new": object.__new__, "__idl_type": type}
+    lines = ["__idl_value = __idl_new(__idl_type)"]
+    # Plain attribute stores are the fastest, frozen dataclasses need to bypass their __setattr__
+    direct = type.__setattr__ is object.__setattr__
+    if not direct and type.__dictoffset__:
+        lines.append("__idl_dict = __idl_value.__dict__")
+
+    members = list(members)
+    for i, member in enumerate(members):
+        if direct:
+            lines.append(f"__idl_value.{member} = {member}")
+        elif isinstance(getattr(type, member, None), MemberDescriptorType):
+            namespace[f"__idl_set{i}"] = getattr(type, member).__set__
+            lines.append(f"__idl_set{i}(__idl_value, {member})")
+        else:
+            lines.append(f"__idl_dict['{member}'] = {member}")
+    lines.append("return __idl_value")
+
+    source = f"def construct({', '.join(members)}):\n" + "".join(f"    {line}\n" for line in lines)
+    exec(compile(source, f"<cyclonedds-constructor {type.__idl_typename__}>", "exec"), namespace)
+    return namespace["construct"]
+
+
 class Machine:
     """Given a type, serialize and deserialize"""
     def __init__(self, type):
@@ -64,14 +98,15 @@ class PrimitiveMachine(Machine):
     def __init__(self, type):
         self.type = type
         self.code, self.alignment, self.size, self.default = _type_code_align_size_default_mapping[type]
+        self.struct = struct_for(self.code)
 
     def serialize(self, buffer, value, for_key=False):
         buffer.align(self.alignment)
-        buffer.write(self.code, self.size, value)
+        buffer.write_struct(self.struct, self.size, value)
 
     def deserialize(self, buffer):
         buffer.align(self.alignment)
-        return buffer.read(self.code, self.size)
+        return buffer.read_struct(self.struct, self.size)
 
     def key_scan(self) -> KeyScanner:
         return KeyScanner.simple(self.alignment, self.size)
@@ -93,10 +128,10 @@ class CharMachine(Machine):
         self.alignment = 1
 
     def serialize(self, buffer, value, for_key=False):
-        buffer.write('b', 1, ord(value))
+        buffer.write_struct(_int8, 1, ord(value))
 
     def deserialize(self, buffer):
-        return chr(buffer.read('b', 1))
+        return chr(buffer.read_struct(_int8, 1))
 
     def cdr_key_machine_op(self, skip):
         return [CdrKeyVmOp(CdrKeyVMOpType.StreamStatic, skip, 1, align=1)]
@@ -118,15 +153,15 @@ class StringMachine(Machine):
             raise Exception("String longer than bound.")
         buffer.align(4)
         bytes = value.encode('utf-8')
-        buffer.write('I', 4, len(bytes) + 1)
+        buffer.write_struct(_uint32, 4, len(bytes) + 1)
         buffer.write_bytes(bytes)
-        buffer.write('b', 1, 0)
+        buffer.write_struct(_int8, 1, 0)
 
     def deserialize(self, buffer):
         buffer.align(4)
-        numbytes = buffer.read('I', 4)
+        numbytes = buffer.read_struct(_uint32, 4)
         bytes = buffer.read_bytes(numbytes - 1)
-        buffer.read('b', 1)
+        buffer.read_struct(_int8, 1)
         return bytes.decode('utf-8')
 
     def key_scan(self) -> KeyScanner:
@@ -151,12 +186,12 @@ class BytesMachine(Machine):
         if self.bound and len(value) > self.bound:
             raise Exception("Bytes longer than bound.")
         buffer.align(4)
-        buffer.write('I', 4, len(value))
+        buffer.write_struct(_uint32, 4, len(value))
         buffer.write_bytes(value)
 
     def deserialize(self, buffer):
         buffer.align(4)
-        numbytes = buffer.read('I', 4)
+        numbytes = buffer.read_struct(_uint32, 4)
         return buffer.read_bytes(numbytes)
 
     def key_scan(self) -> KeyScanner:
@@ -208,7 +243,7 @@ class ArrayMachine(Machine):
 
         if self.add_size_header and not for_key:
             buffer.align(4)
-            buffer.write('I', 4, 0)
+            buffer.write_struct(_uint32, 4, 0)
             hpos = buffer.tell()
 
         for v in value:
@@ -217,13 +252,13 @@ class ArrayMachine(Machine):
         if self.add_size_header and not for_key:
             mpos = buffer.tell()
             buffer.seek(hpos - 4)
-            buffer.write('I', 4, mpos - hpos)
+            buffer.write_struct(_uint32, 4, mpos - hpos)
             buffer.seek(mpos)
 
     def deserialize(self, buffer):
         if self.add_size_header:
             buffer.align(4)
-            size = buffer.read('I', 4)
+            size = buffer.read_struct(_uint32, 4)
             mpos = buffer.tell()
 
         v = [self.submachine.deserialize(buffer) for i in range(self.size)]
@@ -265,10 +300,10 @@ class SequenceMachine(Machine):
         buffer.align(4)
 
         if self.add_size_header and not for_key:
-            buffer.write('I', 4, 0)
+            buffer.write_struct(_uint32, 4, 0)
             hpos = buffer.tell()
 
-        buffer.write('I', 4, len(value))
+        buffer.write_struct(_uint32, 4, len(value))
 
         for v in value:
             self.submachine.serialize(buffer, v, for_key)
@@ -276,17 +311,17 @@ class SequenceMachine(Machine):
         if self.add_size_header and not for_key:
             mpos = buffer.tell()
             buffer.seek(hpos - 4)
-            buffer.write('I', 4, mpos - hpos)
+            buffer.write_struct(_uint32, 4, mpos - hpos)
             buffer.seek(mpos)
 
     def deserialize(self, buffer):
         buffer.align(4)
 
         if self.add_size_header:
-            size = buffer.read('I', 4)
+            size = buffer.read_struct(_uint32, 4)
             mpos = buffer.tell()
 
-        num = buffer.read('I', 4)
+        num = buffer.read_struct(_uint32, 4)
         v = [self.submachine.deserialize(buffer) for i in range(num)]
 
         if self.add_size_header:
@@ -440,7 +475,7 @@ class MappingMachine(Machine):
 
     def serialize(self, buffer, values, for_key=False):
         buffer.align(4)
-        buffer.write('I', 4, len(values))
+        buffer.write_struct(_uint32, 4, len(values))
 
         for key, value in values.items():
             self.key_machine.serialize(buffer, key, for_key)
@@ -449,7 +484,7 @@ class MappingMachine(Machine):
     def deserialize(self, buffer):
         ret = {}
         buffer.align(4)
-        num = buffer.read('I', 4)
+        num = buffer.read_struct(_uint32, 4)
 
         for _i in range(num):
             key = self.key_machine.deserialize(buffer)
@@ -473,6 +508,8 @@ class StructMachine(Machine):
         self.type = object
         self.members_machines = members_machines
         self.keylist = keylist
+        # Called with the deserialized members, see trusted_constructor
+        self.construct = object
 
     def serialize(self, buffer, value, for_key=False):
         #  We use the fact here that dicts retain their insertion order
@@ -491,7 +528,7 @@ class StructMachine(Machine):
         valuedict = {}
         for member, machine in self.members_machines.items():
             valuedict[member] = machine.deserialize(buffer)
-        return self.type(**valuedict)
+        return self.construct(**valuedict)
 
     def key_scan(self) -> KeyScanner:
         scan = KeyScanner()
@@ -568,13 +605,13 @@ class EnumMachine(Machine):
     def serialize(self, buffer, value, for_key=False):
         buffer.align(4)
         if type(value) == int:
-            buffer.write("I", 4, value)
+            buffer.write_struct(_uint32, 4, value)
             return
-        buffer.write("I", 4, value.value)
+        buffer.write_struct(_uint32, 4, value.value)
 
     def deserialize(self, buffer):
         buffer.align(4)
-        v = buffer.read("I", 4)
+        v = buffer.read_struct(_uint32, 4)
         try:
             return self.enum(v)
         except ValueError:
@@ -599,18 +636,19 @@ class BitBoundEnumMachine(Machine):
         self.encoder = [types.uint8, types.uint16, types.uint32, types.uint64][int(log2(bit_bound)) - 3]
         self.enum: Enum = enum
         self.code, self.alignment, self.size, _ = _type_code_align_size_default_mapping[self.encoder]
+        self.struct = struct_for(self.code)
 
     def serialize(self, buffer, value, for_key=False):
         if type(value) == int:
             buffer.align(self.alignment)
-            buffer.write(self.code, self.size, value)
+            buffer.write_struct(self.struct, self.size, value)
             return
         buffer.align(self.alignment)
-        buffer.write(self.code, self.size, value.value)
+        buffer.write_struct(self.struct, self.size, value.value)
 
     def deserialize(self, buffer):
         buffer.align(self.alignment)
-        v = buffer.read(self.code, self.size)
+        v = buffer.read_struct(self.struct, self.size)
         try:
             return self.enum(v)
         except ValueError:
@@ -636,13 +674,13 @@ class OptionalMachine(Machine):
     def serialize(self, buffer, value, for_key=False):
         assert not for_key
         if value is None:
-            buffer.write('?', 1, False)
+            buffer.write_struct(_bool, 1, False)
         else:
-            buffer.write('?', 1, True)
+            buffer.write_struct(_bool, 1, True)
             self.submachine.serialize(buffer, value, for_key)
 
     def deserialize(self, buffer):
-        if buffer.read('?', 1):
+        if buffer.read_struct(_bool, 1):
             return self.submachine.deserialize(buffer)
         return None
 
@@ -665,17 +703,18 @@ class PlainCdrV2ArrayOfPrimitiveMachine(Machine):
         self.length = length
         self.size = size * length
         self.code = str(length) + code
+        self.struct = struct_for(self.code)
         self.default = [default] * length
         self.subtype = type
 
     def serialize(self, buffer, value, for_key=False):
         assert len(value) == self.length
         buffer.align(self.alignment)
-        buffer.write_multi(self.code, self.size, *value)
+        buffer.write_struct(self.struct, self.size, *value)
 
     def deserialize(self, buffer):
         buffer.align(self.alignment)
-        return list(buffer.read_multi(self.code, self.size))
+        return list(buffer.read_struct_multi(self.struct, self.size))
 
     def key_scan(self) -> KeyScanner:
         return KeyScanner.simple(self.alignment, self.size)
@@ -694,21 +733,22 @@ class PlainCdrV2SequenceOfPrimitiveMachine(Machine):
     def __init__(self, type, max_length=None):
         self.code, self.alignment, self.size, _ = types._type_code_align_size_default_mapping[type]
         self.max_length = max_length
+        self.subtype = type
 
     def serialize(self, buffer, value, for_key=False):
         assert self.max_length is None or len(value) <= self.max_length
         buffer.align(4)
-        buffer.write('I', 4, len(value))
+        buffer.write_struct(_uint32, 4, len(value))
         if value:
             buffer.align(self.alignment)
-            buffer.write_multi(f"{len(value)}{self.code}", self.size * len(value), *value)
+            buffer.write_struct(struct_for(f"{len(value)}{self.code}"), self.size * len(value), *value)
 
     def deserialize(self, buffer):
         buffer.align(4)
-        length = buffer.read('I', 4)
+        length = buffer.read_struct(_uint32, 4)
         if length:
             buffer.align(self.alignment)
-            return list(buffer.read_multi(f"{length}{self.code}", self.size * length))
+            return list(buffer.read_struct_multi(struct_for(f"{length}{self.code}"), self.size * length))
         else:
             return []
 
@@ -739,19 +779,108 @@ class PlainCdrV2SequenceOfPrimitiveMachine(Machine):
         return []
 
 
+class _NdArrayMixin:
+    """Shared conversion for the ndarray machines, numpy is only imported when such a member is used."""
+
+    def _init_dtypes(self, type):
+        import numpy
+        self.numpy = numpy
+        code = types._type_code_align_size_default_mapping[type][0]
+        self.dtype = numpy.dtype(code)
+        self.dtypes = {'<': numpy.dtype('<' + code), '>': numpy.dtype('>' + code)}
+
+    def _as_ndarray(self, value, endian):
+        numpy = self.numpy
+        if not isinstance(value, numpy.ndarray):
+            try:
+                view = memoryview(value)
+            except TypeError:
+                # Plain Python sequences
+                view = None
+
+            if view is None:
+                value = numpy.asarray(value, dtype=self.dtype)
+            elif view.format in ('B', 'b', 'c'):
+                # Raw bytes are interpreted as native elements
+                value = numpy.frombuffer(view, dtype=self.dtype)
+            else:
+                value = numpy.asarray(view)
+
+        # Only copies (and byteswaps) when the dtype, byte order or layout differs
+        return numpy.ascontiguousarray(value, dtype=self.dtypes[endian]).reshape(-1)
+
+    def _write_ndarray(self, buffer, array):
+        buffer.align(self.alignment)
+        buffer.write_bytes(memoryview(array).cast('B'))
+
+    def _read_ndarray(self, buffer, count):
+        buffer.align(self.alignment)
+        array = self.numpy.frombuffer(buffer._bytes, dtype=self.dtypes[buffer._endian], count=count, offset=buffer._pos)
+        buffer._pos += array.nbytes
+        return array
+
+
+class NdArrayArrayOfPrimitiveMachine(_NdArrayMixin, PlainCdrV2ArrayOfPrimitiveMachine):
+    """Array of primitives that is exchanged as a numpy.ndarray instead of a list."""
+
+    def __init__(self, type, length):
+        super().__init__(type, length)
+        self._init_dtypes(type)
+
+    def serialize(self, buffer, value, for_key=False):
+        array = self._as_ndarray(value, buffer._endian)
+        if len(array) != self.length:
+            raise Exception("Incorrectly sized array.")
+        self._write_ndarray(buffer, array)
+
+    def deserialize(self, buffer):
+        return self._read_ndarray(buffer, self.length)
+
+    def default_initialize(self):
+        return self.numpy.zeros(self.length, dtype=self.dtype)
+
+
+class NdArraySequenceOfPrimitiveMachine(_NdArrayMixin, PlainCdrV2SequenceOfPrimitiveMachine):
+    """Sequence of primitives that is exchanged as a numpy.ndarray instead of a list."""
+
+    def __init__(self, type, max_length=None):
+        super().__init__(type, max_length)
+        self._init_dtypes(type)
+
+    def serialize(self, buffer, value, for_key=False):
+        array = self._as_ndarray(value, buffer._endian)
+        if self.max_length is not None and len(array) > self.max_length:
+            raise Exception("Sequence longer than bound.")
+        buffer.align(4)
+        buffer.write_struct(_uint32, 4, len(array))
+        if len(array):
+            self._write_ndarray(buffer, array)
+
+    def deserialize(self, buffer):
+        buffer.align(4)
+        length = buffer.read_struct(_uint32, 4)
+        if length:
+            return self._read_ndarray(buffer, length)
+        return self.numpy.zeros(0, dtype=self.dtype)
+
+    def default_initialize(self):
+        return self.numpy.zeros(0, dtype=self.dtype)
+
+
 class DelimitedCdrAppendableStructMachine(Machine):
     def __init__(self, type, member_machines, keylist):
         self.alignment = 4
         self.type = type
         self.member_machines = member_machines
         self.keylist = keylist
+        self.construct = type
 
     def serialize(self, buffer, value, for_key=False):
         # write dummy header
         if not for_key:
             buffer.align(4)
             hpos = buffer.tell()
-            buffer.write('I', 4, 0)
+            buffer.write_struct(_uint32, 4, 0)
 
         # write member data
         dpos = buffer.tell()
@@ -769,13 +898,13 @@ class DelimitedCdrAppendableStructMachine(Machine):
 
             # Write size header word back
             buffer.seek(hpos)
-            buffer.write('I', 4, fpos - dpos)
+            buffer.write_struct(_uint32, 4, fpos - dpos)
             buffer.seek(fpos)
 
     def deserialize(self, buffer):
         # read header
         buffer.align(4)
-        size = buffer.read('I', 4)
+        size = buffer.read_struct(_uint32, 4)
         hpos = buffer.tell()
 
         data = {}
@@ -789,7 +918,7 @@ class DelimitedCdrAppendableStructMachine(Machine):
                 raise Exception("Struct was not contained inside header indicated size, stream corrupt.")
 
         buffer.seek(hpos + size)
-        return self.type(**data)
+        return self.construct(**data)
 
     def key_scan(self) -> KeyScanner:
         scan = KeyScanner()
@@ -841,7 +970,7 @@ class DelimitedCdrAppendableUnionMachine(Machine):
         if not for_key:
             buffer.align(4)
             hpos = buffer.tell()
-            buffer.write('I', 4, 0)
+            buffer.write_struct(_uint32, 4, 0)
 
         dpos = buffer.tell()
         discr, value = union.get()
@@ -876,13 +1005,13 @@ class DelimitedCdrAppendableUnionMachine(Machine):
 
             # Write size header word back
             buffer.seek(hpos)
-            buffer.write('I', 4, fpos - dpos)
+            buffer.write_struct(_uint32, 4, fpos - dpos)
             buffer.seek(fpos)
 
     def deserialize(self, buffer):
         # read header
         buffer.align(4)
-        size = buffer.read('I', 4)
+        size = buffer.read_struct(_uint32, 4)
         hpos = buffer.tell()
 
         label = self.discriminator.deserialize(buffer)
@@ -1004,6 +1133,7 @@ class PLCdrMutableStructMachine(Machine):
     def __init__(self, type, mutablemembers):
         self.alignment = 4
         self.type = type
+        self.construct = type
         self.mutablemembers = mutablemembers
         self.mutmem_by_id = {
             m.memberid: m for m in mutablemembers
@@ -1017,7 +1147,7 @@ class PLCdrMutableStructMachine(Machine):
             # write dummy header
             buffer.align(4)
             hpos = buffer.tell()
-            buffer.write('I', 4, 0)
+            buffer.write_struct(_uint32, 4, 0)
 
         if for_key:
             for m_id in sorted(self.mutmem_by_id.keys()):
@@ -1035,18 +1165,18 @@ class PLCdrMutableStructMachine(Machine):
                     continue
 
                 buffer.align(4)
-                buffer.write('I', 4, mutablemember.header)
+                buffer.write_struct(_uint32, 4, mutablemember.header)
 
                 mpos = buffer.tell()
                 if mutablemember.lentype == LenType.NextIntLen:
-                    buffer.write('I', 4, 0)
+                    buffer.write_struct(_uint32, 4, 0)
 
                 mutablemember.machine.serialize(buffer, member_value)
 
                 if mutablemember.lentype == LenType.NextIntLen:
                     ampos = buffer.tell()
                     buffer.seek(mpos)
-                    buffer.write('I', 4, ampos - mpos - 4)
+                    buffer.write_struct(_uint32, 4, ampos - mpos - 4)
                     buffer.seek(ampos)
 
         if not for_key:
@@ -1054,19 +1184,19 @@ class PLCdrMutableStructMachine(Machine):
 
             # Write size header word back
             buffer.seek(hpos)
-            buffer.write('I', 4, fpos - dpos)
+            buffer.write_struct(_uint32, 4, fpos - dpos)
             buffer.seek(fpos)
 
     def deserialize(self, buffer):
         # read header
         buffer.align(4)
-        struct_size = buffer.read('I', 4)
+        struct_size = buffer.read_struct(_uint32, 4)
         hpos = buffer.tell()
 
         data = self.init_map.copy()
         while buffer.tell() - hpos < struct_size:
             buffer.align(4)
-            header = buffer.read('I', 4)
+            header = buffer.read_struct(_uint32, 4)
             must_understand = ((header >> 31) & 1) > 0
             lc = (header >> 28) & 0x7
             memberid = header & 0x0fffffff
@@ -1074,7 +1204,7 @@ class PLCdrMutableStructMachine(Machine):
 
             if mutmem:
                 if lc == 4:
-                    buffer.read('I', 4)
+                    buffer.read_struct(_uint32, 4)
                 data[mutmem.name] = mutmem.machine.deserialize(buffer)
             else:
                 if must_understand:
@@ -1084,7 +1214,7 @@ class PLCdrMutableStructMachine(Machine):
                 if lc < 4:
                     buffer.seek(mpos + 2 ** lc)
                 else:
-                    size = buffer.read('I', 4)
+                    size = buffer.read_struct(_uint32, 4)
                     if lc == 6:
                         size *= 4
                     elif lc == 7:
@@ -1096,7 +1226,7 @@ class PLCdrMutableStructMachine(Machine):
                 data[mutmem.name] = mutmem.machine.default_initialize()
 
         buffer.seek(hpos + struct_size)
-        return self.type(**data)
+        return self.construct(**data)
 
     def key_scan(self) -> KeyScanner:
         scan = KeyScanner()
@@ -1150,14 +1280,15 @@ class BitMaskMachine(Machine):
             types.uint64
         self.code, self.alignment, self.size, self.default = \
             types._type_code_align_size_default_mapping[self.primitive_type]
+        self.struct = struct_for(self.code)
 
     def serialize(self, buffer, value, for_key=False):
         buffer.align(self.alignment)
-        buffer.write(self.code, self.size, value.as_mask())
+        buffer.write_struct(self.struct, self.size, value.as_mask())
 
     def deserialize(self, buffer):
         buffer.align(self.alignment)
-        return self.type.from_mask(buffer.read(self.code, self.size))
+        return self.type.from_mask(buffer.read_struct(self.struct, self.size))
 
     def key_scan(self) -> KeyScanner:
         return KeyScanner.simple(self.alignment, self.size)
@@ -10,14 +10,16 @@
  * SPDX-License-Identifier: EPL-2.0 OR BSD-3-Clause
 """
 
-from typing import Optional, cast, Any, ClassVar, Mapping, Dict, Tuple, TYPE_CHECKING
+from typing import Optional, cast, Any, Callable, ClassVar, Mapping, Dict, Tuple, TYPE_CHECKING
 from collections import deque
+from copy import copy
+from threading import local, RLock
 from enum import EnumMeta, Enum
 from inspect import isclass
 from struct import unpack
 from hashlib import md5
 
-from ._support import Buffer, Endianness, CdrKeyVmNamedJumpOp, KeyScanner, KeyScanResult
+from ._support import Buffer, Endianness, CdrKeyVmNamedJumpOp, KeyScanner, KeyScanResult, struct_for
 from ._type_helper import get_origin, get_args, Annotated
 from ._type_normalize import get_idl_annotations, get_idl_field_annotations, get_extended_type_hints
 from ._machinery import Machine
@@ -27,6 +29,7 @@ from . import types
 
 if TYPE_CHECKING:
     from ._typesupport.DDS.XTypes import TypeMapping, TypeInformation, TypeIdentifier
+    from ._lazy import LazyLayout, LazySample
     from cyclonedds.idl import IdlEnum
 
 
@@ -48,9 +51,16 @@ class IDLNamespaceScope:
             cls.current = None
 
 
+# Building machines and scanning keys walks (possibly recursive) member types and
+# flags them while doing so, only one thread at a time may do that.
+_populate_lock = RLock()
+# Encapsulation header, the endianness of the buffer does not matter for single bytes
+_header = struct_for('4b')
+
+
 class IDL:
     def __init__(self, datatype):
-        self.buffer: Buffer = Buffer()
+        self._local = local()
         self.datatype: type = datatype
         self.keyless: bool = None
         self.xcdrv2: Optional[bool] = None
@@ -64,86 +74,145 @@ class IDL:
         self._xt_data: Tuple[TypeInformation, TypeMapping] = (None, None)
         self._xt_bytedata: Tuple[Optional[bytes], Optional[bytes]] = (None, None)
         self.member_ids: Dict[str, int] = None
+        self.compiled: bool = False
+        self.compiled_native: bool = True
+        self.trusted: bool = False
+        self._lazy_layouts: Dict[bool, 'LazyLayout'] = {}
+        self._key_functions: Dict[bool, Optional[Callable[[Any], bytes]]] = {}
+        self._keyhash_cache: Dict[bytes, bytes] = {}
+        self._key_template: Any = None
+
+    @property
+    def buffer(self) -> Buffer:
+        # Serialization scratch space is per thread, so that threads writing the same
+        # type do not serialize into each other's samples.
+        try:
+            return self._local.buffer
+        except AttributeError:
+            self._local.buffer = Buffer()
+            return self._local.buffer
 
     def populate(self):
         if self.v0_machine is None:
-            annotations = get_idl_annotations(self.datatype)
-            field_annotations = get_idl_field_annotations(self.datatype)
-
-            a = annotations.get('extensibility', 'final')
-            if a == 'appendable':
-                self.xcdrv2_head = 0x08
-            elif a == 'mutable':
-                self.xcdrv2_head = 0x0a
-            else:
-                self.xcdrv2_head = 0x06
+            with _populate_lock:
+                if self.v0_machine is None:
+                    self._populate()
+
+    def _populate(self):
+        annotations = get_idl_annotations(self.datatype)
+        field_annotations = get_idl_field_annotations(self.datatype)
+
+        a = annotations.get('extensibility', 'final')
+        if a == 'appendable':
+            self.xcdrv2_head = 0x08
+        elif a == 'mutable':
+            self.xcdrv2_head = 0x0a
+        else:
+            self.xcdrv2_head = 0x06
 
-            if annotations.get('xcdrv2', True):
-                self.buffer._align_max = 4
-                self.xcdrv2 = True
-            else:
-                self.buffer._align_max = 8
-                self.xcdrv2 = False
+        self.xcdrv2 = bool(annotations.get('xcdrv2', True))
 
-            if self.member_ids is None:
-                ids = {}
-                is_hash_id = annotations.get("autoid", "sequential") == "hash"
-                idc = 0
+        if self.member_ids is None:
+            ids = {}
+            is_hash_id = annotations.get("autoid", "sequential") == "hash"
+            idc = 0
 
-                for name, _ in get_extended_type_hints(self.datatype).items():
-                    f_annot = field_annotations.get(name, {})
+            for name, _ in get_extended_type_hints(self.datatype).items():
+                f_annot = field_annotations.get(name, {})
 
-                    if "id" in f_annot:
-                        mid = f_annot["id"]
-                    elif "hash_id" in f_annot or is_hash_id:
-                        # compute 4 byte hash, interpret as little endian 32 bit integer and zero out top four bits
-                        mid = unpack("<I", md5(f_annot.get("hash_id", "") or name.encode()).digest()[:4])[0] & 0x0FFFFFFF
-                    else:
-                        mid = idc
+                if "id" in f_annot:
+                    mid = f_annot["id"]
+                elif "hash_id" in f_annot or is_hash_id:
+                    # compute 4 byte hash, interpret as little endian 32 bit integer and zero out top four bits
+                    mid = unpack("<I", md5(f_annot.get("hash_id", "") or name.encode()).digest()[:4])[0] & 0x0FFFFFFF
+                else:
+                    mid = idc
 
-                    idc = mid + 1
-                    ids[name] = mid
+                idc = mid + 1
+                ids[name] = mid
 
-                self.member_ids = ids
+            self.member_ids = ids
 
-            from ._builder import Builder
-            self.v0_machine, self.v2_machine, self.keyless = Builder.build_machines(self.datatype)
-            self.v0_keyresult: KeyScanner = self.v0_machine.key_scan()
-            self.v2_keyresult: KeyScanner = self.v2_machine.key_scan()
+        from ._builder import Builder
+        v0_machine, v2_machine, self.keyless = Builder.build_machines(
+            self.datatype, self.compiled, self.compiled_native, self.trusted)
 
-            if self.v0_keyresult.rtype != KeyScanResult.PossiblyInfinite and self.v0_keyresult.size <= 16:
-                self.v0_key_max_size = self.v0_keyresult.size
-            else:
-                self.v0_key_max_size = 17  # or bigger ;)
+        # Other threads only take the unlocked path once v0_machine is set, so the key
+        # scan has to be done first. A recursion back into this type ends up in key_scan,
+        # which treats it as unbounded.
+        self.re_entrancy_protection = True
+        try:
+            self.v0_keyresult: KeyScanner = v0_machine.key_scan()
+            self.v2_keyresult: KeyScanner = v2_machine.key_scan()
+        finally:
+            self.re_entrancy_protection = False
+
+        if self.v0_keyresult.rtype != KeyScanResult.PossiblyInfinite and self.v0_keyresult.size <= 16:
+            self.v0_key_max_size = self.v0_keyresult.size
+        else:
+            self.v0_key_max_size = 17  # or bigger ;)
 
-            if self.v2_keyresult.rtype != KeyScanResult.PossiblyInfinite and self.v2_keyresult.size <= 16:
-                self.v2_key_max_size = self.v2_keyresult.size
-            else:
-                self.v2_key_max_size = 17  # or bigger ;)
+        if self.v2_keyresult.rtype != KeyScanResult.PossiblyInfinite and self.v2_keyresult.size <= 16:
+            self.v2_key_max_size = self.v2_keyresult.size
+        else:
+            self.v2_key_max_size = 17  # or bigger ;)
+
+        self.v2_machine = v2_machine
+        self.v0_machine = v0_machine
+
+    def use_compiled_machines(self, enable: bool = True, native: bool = True) -> None:
+        """Opt in to (or out of) generated serializer functions for this type. The generated
+        code produces the exact same bytes as the interpreted machines, but packs runs of
+        adjacent primitive members with a single precomputed struct format. With native set
+        supported types are (de)serialized by the C extension instead, if it is available."""
+        if enable == self.compiled and native == self.compiled_native:
+            return
+
+        self.compiled = enable
+        self.compiled_native = native
+        self._rebuild_machines()
+
+    def use_trusted_decode(self, enable: bool = True) -> None:
+        """Opt in to (or out of) creating deserialized samples without calling their __init__.
+        The members are stored on a bare instance instead, which skips dataclass overhead and
+        any validation in __post_init__. Nested struct types decode according to their own
+        setting, enable it on those as well for deeply nested types."""
+        if enable == self.trusted:
+            return
+
+        self.trusted = enable
+        self._rebuild_machines()
+
+    def _rebuild_machines(self) -> None:
+        if self.v0_machine is not None:
+            from ._builder import Builder
+            self.v0_machine, self.v2_machine, self.keyless = Builder.build_machines(
+                self.datatype, self.compiled, self.compiled_native, self.trusted)
 
     def serialize(self, object, use_version_2: bool = None, buffer=None, endianness=None) -> bytes:
+        return self._serialize_into(object, use_version_2, buffer, endianness).asbytes()
+
+    def serialize_view(self, object, use_version_2: bool = None, buffer=None, endianness=None) -> memoryview:
+        """Like serialize, but return a view on the (reused) serialization buffer instead
+        of copying the data out. The view is only valid until the next serialization into
+        the same buffer, so pass your own buffer if the data needs to outlive that."""
+        return self._serialize_into(object, use_version_2, buffer, endianness).asview()
+
+    def _serialize_into(self, object, use_version_2: bool, buffer: Optional[Buffer], endianness) -> Buffer:
         if self.v0_machine is None:
             self.populate()
 
         use_version_2 = use_version_2 if use_version_2 is not None else self.xcdrv2
 
         ibuffer = buffer or self.buffer
-        ibuffer.seek(0)
-        ibuffer.zero_out()
-        ibuffer.set_align_offset(0)
+        ibuffer.reset()
         ibuffer.set_endianness(endianness or Endianness.native())
         ibuffer._align_max = 4 if use_version_2 else 8
 
         if ibuffer.endianness == Endianness.Big:
-            ibuffer.write('b', 1, 0)
-            ibuffer.write('b', 1, 0 | (self.xcdrv2_head if use_version_2 else 0))
-            ibuffer.write('b', 1, 0)
-            ibuffer.write('b', 1, 0)
+            ibuffer.write_struct(_header, 4, 0, 0 | (self.xcdrv2_head if use_version_2 else 0), 0, 0)
         else:
-            ibuffer.write('b', 1, 0)
-            ibuffer.write('b', 1, 1 | (self.xcdrv2_head if use_version_2 else 0))
-            ibuffer.write('b', 1, 0)
-            ibuffer.write('b', 1, 0)
+            ibuffer.write_struct(_header, 4, 0, 1 | (self.xcdrv2_head if use_version_2 else 0), 0, 0)
 
         ibuffer.set_align_offset(4)
 
@@ -152,7 +221,7 @@ class IDL:
         else:
             self.v0_machine.serialize(ibuffer, object)
 
-        return ibuffer.asbytes()
+        return ibuffer
 
     def deserialize(self, data, has_header=True) -> object:
         if self.v0_machine is None:
@@ -161,14 +230,11 @@ class IDL:
         buffer = Buffer(data, align_offset=4 if has_header else 0) if not isinstance(data, Buffer) else data
 
         if has_header and buffer.tell() == 0:
-            buffer.read('b', 1)
-            v = buffer.read('b', 1)
+            v = buffer.read_struct_multi(_header, 4)[1]
             if (v & 1) > 0:
                 buffer.set_endianness(Endianness.Little)
             else:
                 buffer.set_endianness(Endianness.Big)
-            buffer.read('b', 1)
-            buffer.read('b', 1)
             if v > 1:
                 buffer._align_max = 4
                 machine = self.v2_machine
@@ -185,6 +251,21 @@ class IDL:
 
         return machine.deserialize(buffer)
 
+    def deserialize_lazy(self, data: bytes, sample_info=None) -> 'LazySample':
+        """Wrap serialized data (with header) in a proxy that only decodes members on access."""
+        from ._lazy import LazySample
+        return LazySample(self, data, sample_info)
+
+    def lazy_layout(self, use_version_2: bool) -> 'LazyLayout':
+        layout = self._lazy_layouts.get(use_version_2)
+        if layout is None:
+            if self.v0_machine is None:
+                self.populate()
+            from ._lazy import LazyLayout
+            layout = LazyLayout(self.v2_machine if use_version_2 else self.v0_machine, use_version_2)
+            self._lazy_layouts[use_version_2] = layout
+        return layout
+
     def key(self, object, use_version_2: bool = None) -> bytes:
         if self.v0_machine is None:
             self.populate()
@@ -194,18 +275,32 @@ class IDL:
         if self.keyless:
             return b''
 
-        self.buffer.seek(0)
-        self.buffer.zero_out()
-        self.buffer.set_align_offset(0)
-        self.buffer.set_endianness(Endianness.Big)
-        self.buffer._align_max = 4 if use_version_2 else 8
+        try:
+            key_function = self._key_functions[use_version_2]
+        except KeyError:
+            from ._compiler import MachineCompiler
+            key_function = MachineCompiler.compile_key(self.v2_machine if use_version_2 else self.v0_machine,
+                                                       use_version_2)
+            self._key_functions[use_version_2] = key_function
+
+        if key_function is not None:
+            try:
+                return key_function(object)
+            except Exception:
+                # Let the machine produce the error
+                pass
+
+        buffer = self.buffer
+        buffer.reset()
+        buffer.set_endianness(Endianness.Big)
+        buffer._align_max = 4 if use_version_2 else 8
 
         if use_version_2:
-            self.v2_machine.serialize(self.buffer, object, for_key=True)
+            self.v2_machine.serialize(buffer, object, for_key=True)
         else:
-            self.v0_machine.serialize(self.buffer, object, for_key=True)
+            self.v0_machine.serialize(buffer, object, for_key=True)
 
-        return self.buffer.asbytes()
+        return buffer.asbytes()
 
     def keyhash(self, object, use_version_2: bool = None) -> bytes:
         if self.v0_machine is None:
@@ -213,18 +308,45 @@ class IDL:
 
         use_version_2 = use_version_2 if use_version_2 is not None else self.xcdrv2
 
-        if use_version_2:
-            if self.v2_key_max_size <= 16:
-                return self.key(object, True).ljust(16, b'\0')
-        else:
-            if self.v0_key_max_size <= 16:
-                return self.key(object, False).ljust(16, b'\0')
+        key = self.key(object, use_version_2)
+        if (self.v2_key_max_size if use_version_2 else self.v0_key_max_size) <= 16:
+            return key.ljust(16, b'\0')
+
+        keyhash = self._keyhash_cache.get(key)
+        if keyhash is None:
+            keyhash = md5(key).digest()
+            if len(self._keyhash_cache) >= 4096:
+                self._keyhash_cache.clear()
+            self._keyhash_cache[key] = keyhash
+        return keyhash
+
+    def key_sample(self, **fields) -> Any:
+        """Make a sample that has the given key members and default values for all other members,
+        for the instance oriented writer calls that only look at the key."""
+        if self.v0_machine is None:
+            self.populate()
+
+        if self.keyless:
+            raise TypeError(f"{self.datatype.__name__} has no key members")
 
-        m = md5()
-        m.update(self.key(object, use_version_2))
-        return m.digest()
+        from ._compiler import NativeProgram
+        keylist = getattr(NativeProgram._unwrap(self.v0_machine), "keylist", None) or ()
+        if set(fields) != set(keylist):
+            raise TypeError(f"Expected the key members {', '.join(keylist)} of {self.datatype.__name__}, "
+                            f"got {', '.join(fields) or 'none'}")
+
+        if self._key_template is None:
+            self._key_template = self.v0_machine.default_initialize()
+        sample = copy(self._key_template)
+        for name, value in fields.items():
+            setattr(sample, name, value)
+        return sample
 
     def cdr_key_machine(self, skip: bool = False, use_version_2: bool = None):
+        with _populate_lock:
+            return self._cdr_key_machine(skip, use_version_2)
+
+    def _cdr_key_machine(self, skip: bool, use_version_2: Optional[bool]):
         if self.re_entrancy_protection:
             # If we get here then there is a recursion in the type
             # We will need to use a jump instruction
@@ -247,6 +369,10 @@ class IDL:
         return ops
 
     def key_scan(self, use_version_2: bool = None):
+        with _populate_lock:
+            return self._key_scan(use_version_2)
+
+    def _key_scan(self, use_version_2: Optional[bool]):
         if self.re_entrancy_protection:
             # If we get here then there is a recursion in the type
             # This always means the keysize can be infinite
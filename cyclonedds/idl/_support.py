@@ -11,11 +11,12 @@
 """
 
 import sys
-import struct
 
 from dataclasses import dataclass, field
 from enum import IntEnum, Enum, auto
-from typing import Any, List, Optional, Tuple
+from functools import lru_cache
+from struct import Struct
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 
 class CdrKeyVMOpType(IntEnum):
@@ -55,6 +56,66 @@ class CdrKeyVmNamedJumpOp(CdrKeyVmOp):
     jumpto: str = ""
 
 
+class CdrSerVMOpType(IntEnum):
+    Done = 0
+    Primitive = 1
+    Char = 2
+    String = 3
+    ArrayOfPrimitive = 4
+    SequenceOfPrimitive = 5
+    StructBegin = 6
+    StructEnd = 7
+    AppendableBegin = 8
+    AppendableEnd = 9
+
+
+@dataclass
+class CdrSerVmOp:
+    type: CdrSerVMOpType
+    member: Optional[str] = None
+    code: str = ""
+    align: int = 1
+    size: int = 0
+    length: int = 0
+    # Called with the members of the struct as keyword arguments
+    pytype: Optional[Callable[..., Any]] = None
+
+
+class CdrFilterVMOpType(IntEnum):
+    Done = 0
+    Compare = 1
+    In = 2
+    And = 3
+    Or = 4
+    Not = 5
+
+
+class CdrFilterVMCompare(IntEnum):
+    Eq = 0
+    Ne = 1
+    Lt = 2
+    Le = 3
+    Gt = 4
+    Ge = 5
+
+
+@dataclass
+class CdrFilterVmOp:
+    type: CdrFilterVMOpType
+    # Compare and In read a primitive member at offset (including the encapsulation header)
+    code: str = ""
+    offset: int = 0
+    size: int = 0
+    # Member of an appendable struct, it has its default value if it is beyond the dheader
+    delimited: bool = False
+    cmp: CdrFilterVMCompare = CdrFilterVMCompare.Eq
+    # Values are compared as int64 ('i'), uint64 ('u') or double ('d')
+    mode: str = "i"
+    values: List[Any] = field(default_factory=list)
+    # Number of operands of And and Or
+    count: int = 0
+
+
 class Endianness(Enum):
     Little = auto()
     Big = auto()
@@ -64,15 +125,38 @@ class Endianness(Enum):
         return Endianness.Little if sys.byteorder == "little" else Endianness.Big
 
 
+@lru_cache(maxsize=1024)
+def struct_for(fmt: str) -> Dict[str, Struct]:
+    """Precompiled ``struct.Struct`` for fmt per endianness, indexed by ``Buffer._endian``.
+    Machines look these up once when they are built instead of for every value."""
+    return {'<': Struct('<' + fmt), '>': Struct('>' + fmt)}
+
+
 class Buffer:
     def __init__(self, _bytes: Optional[bytes] = None, align_offset: int = 0, align_max: int = 8) -> None:
         self._bytes: bytearray = bytearray(_bytes) if _bytes else bytearray(512)
         self._pos: int = 0
+        # Everything before _end has been written since the last reset, anything
+        # after it may be stale data from an earlier use of the buffer.
+        self._end: int = len(self._bytes) if _bytes else 0
         self._size: int = len(self._bytes)
         self._align_offset: int = align_offset
         self._align_max: int = align_max
         self.set_endianness(Endianness.native())
 
+    @classmethod
+    def view(cls, data: Any, align_offset: int = 0, align_max: int = 8) -> 'Buffer':
+        """Buffer for reading straight from data, any object supporting the buffer protocol,
+        without copying it. The data must stay unchanged while anything reads from it."""
+        buffer = cls.__new__(cls)
+        buffer._bytes = memoryview(data).cast('B')
+        buffer._pos = 0
+        buffer._end = buffer._size = len(buffer._bytes)
+        buffer._align_offset = align_offset
+        buffer._align_max = align_max
+        buffer.set_endianness(Endianness.native())
+        return buffer
+
     def set_endianness(self, endianness: Endianness) -> None:
         self.endianness = endianness
         if self.endianness == Endianness.Little:
@@ -84,6 +168,21 @@ class Buffer:
         # As per testing (https://stackoverflow.com/questions/19671145)
         # Quickest way to zero is to re-alloc..
         self._bytes = bytearray(self._size)
+        self._end = 0
+
+    def reset(self) -> 'Buffer':
+        """Prepare the buffer for writing a new sample without reallocating it. Padding
+        is zeroed when it is written over instead of clearing the whole buffer upfront."""
+        self._pos = 0
+        self._end = 0
+        self._align_offset = 0
+        return self
+
+    def rewind(self, pos: int) -> 'Buffer':
+        """Seek back to pos and treat everything written after it as stale."""
+        self._pos = pos
+        self._end = min(self._end, pos)
+        return self
 
     def set_align_offset(self, offset: int) -> None:
         self._align_offset = offset
@@ -96,6 +195,7 @@ class Buffer:
         return self._pos
 
     def ensure_size(self, size: int) -> None:
+        # Callers write size bytes at the current position after this call
         if self._pos + size > self._size:
             old_bytes = self._bytes
             old_size = self._size
@@ -103,6 +203,11 @@ class Buffer:
                 self._size *= 2
             self._bytes = bytearray(self._size)
             self._bytes[0:old_size] = old_bytes
+        if self._pos > self._end:
+            # Alignment padding skipped since the last write
+            self._bytes[self._end:self._pos] = bytes(self._pos - self._end)
+        if self._pos + size > self._end:
+            self._end = self._pos + size
 
     def align(self, alignment: int) -> 'Buffer':
         alignment = min(alignment, self._align_max)
@@ -111,7 +216,7 @@ class Buffer:
 
     def write(self, pack: str, size: int, value: Any) -> 'Buffer':
         self.ensure_size(size)
-        struct.pack_into(self._endian + pack, self._bytes, self._pos, value)
+        struct_for(pack)[self._endian].pack_into(self._bytes, self._pos, value)
         self._pos += size
         return self
 
@@ -124,7 +229,13 @@ class Buffer:
 
     def write_multi(self, pack: str, size: int, *values: Any) -> 'Buffer':
         self.ensure_size(size)
-        struct.pack_into(self._endian + pack, self._bytes, self._pos, *values)
+        struct_for(pack)[self._endian].pack_into(self._bytes, self._pos, *values)
+        self._pos += size
+        return self
+
+    def write_struct(self, structs: Dict[str, Struct], size: int, *values: Any) -> 'Buffer':
+        self.ensure_size(size)
+        structs[self._endian].pack_into(self._bytes, self._pos, *values)
         self._pos += size
         return self
 
@@ -134,18 +245,34 @@ class Buffer:
         return b
 
     def read(self, pack: str, size: int) -> Any:
-        v = struct.unpack_from(self._endian + pack, buffer=self._bytes, offset=self._pos)
+        v = struct_for(pack)[self._endian].unpack_from(self._bytes, self._pos)
         self._pos += size
         return v[0]
 
     def read_multi(self, pack: str, size: int) -> Tuple[Any, ...]:
-        v = struct.unpack_from(self._endian + pack, buffer=self._bytes, offset=self._pos)
+        v = struct_for(pack)[self._endian].unpack_from(self._bytes, self._pos)
+        self._pos += size
+        return v
+
+    def read_struct(self, structs: Dict[str, Struct], size: int) -> Any:
+        v = structs[self._endian].unpack_from(self._bytes, self._pos)
+        self._pos += size
+        return v[0]
+
+    def read_struct_multi(self, structs: Dict[str, Struct], size: int) -> Tuple[Any, ...]:
+        v = structs[self._endian].unpack_from(self._bytes, self._pos)
         self._pos += size
         return v
 
     def asbytes(self) -> bytes:
+        self.ensure_size(0)
         return bytes(self._bytes[0:self._pos])
 
+    def asview(self) -> memoryview:
+        """Zero-copy view of the data written so far, only valid until the buffer is written again."""
+        self.ensure_size(0)
+        return memoryview(self._bytes)[0:self._pos]
+
 
 class KeyScanResult(Enum):
     FixedSize = 1
@@ -56,6 +56,10 @@ def external(apply_to: str) -> None:
     __field_annotate(apply_to, "external", True)
 
 
+def ndarray(apply_to: str) -> None:
+    __field_annotate(apply_to, "ndarray", True)
+
+
 def xcdrv2(cls: T) -> T:
     __annotate(cls, "xcdrv2", True)
     return cls
@@ -134,7 +138,7 @@ def bit_bound(amount: int) -> Callable[[TIBE], TIBE]:
 
 
 __all__ = [
-    "default_literal", "key", "position", "member_id", "member_hash_id", "xcdrv2", "cdrv0",
+    "default_literal", "key", "position", "member_id", "member_hash_id", "ndarray", "xcdrv2", "cdrv0",
     "nested", "must_understand", "autoid", "extensibility", "final", "appendable", "mutable",
     "keylist", "bit_bound"
 ]
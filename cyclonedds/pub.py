@@ -10,7 +10,10 @@
  * SPDX-License-Identifier: EPL-2.0 OR BSD-3-Clause
 """
 
-from typing import Optional, Union, TYPE_CHECKING
+from array import array
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple, Union, TYPE_CHECKING
 
 from .internal import c_call, dds_c_t
 from .core import Entity, DDSException, Listener
@@ -21,7 +24,8 @@ from .qos import _CQos, Qos, LimitedScopeQos, PublisherQos, DataWriterQos
 from cyclonedds._clayer import ddspy_write, ddspy_write_ts, ddspy_dispose, ddspy_writedispose, ddspy_writedispose_ts, \
     ddspy_dispose_handle, ddspy_dispose_handle_ts, ddspy_register_instance, ddspy_unregister_instance,   \
     ddspy_unregister_instance_handle, ddspy_unregister_instance_ts, ddspy_unregister_instance_handle_ts, \
-    ddspy_lookup_instance, ddspy_dispose_ts
+    ddspy_lookup_instance, ddspy_dispose_ts, ddspy_write_batch, ddspy_write_key, \
+    ddspy_write_key_ts
 
 
 if TYPE_CHECKING:
@@ -106,7 +110,27 @@ class DataWriter(Entity):
                  publisher_or_participant: Union[DomainParticipant, Publisher],
                  topic: Topic,
                  qos: Optional[Qos] = None,
-                 listener: Optional[Listener] = None):
+                 listener: Optional[Listener] = None,
+                 instance_cache: int = 0):
+        """Create a DataWriter.
+
+        Parameters
+        ----------
+        publisher_or_participant: DomainParticipant, Publisher
+            The publisher (or participant) the writer belongs to.
+        topic: Topic
+            The topic to write to.
+        qos: Qos, optional
+            Qos of the writer.
+        listener: Listener, optional
+            Listener of the writer.
+        instance_cache: int
+            Number of recently registered or looked up instances whose key is remembered.
+            Writes of those instances without a handle hand the key to Cyclone, so it does
+            not have to extract it from the serialized sample. The key is still built from
+            the sample in Python to find it in the cache, writing by handle avoids that too.
+            Disabled by default.
+        """
         if not isinstance(publisher_or_participant, (DomainParticipant, Publisher)):
             raise TypeError(f"{publisher_or_participant} is not a cyclonedds.domain.DomainParticipant"
                             " or cyclonedds.pub.Publisher.")
@@ -139,6 +163,16 @@ class DataWriter(Entity):
         self.data_type = topic.data_type
         self._keepalive_entities = [self.publisher, self.topic]
 
+        # The keys of the cached instances in least recently used order, and once the instance
+        # cache or write(handle=) is used, the keys of the instances by handle and the reverse
+        self.data_type.__idl__.populate()
+        self._instance_cache_size = instance_cache if not self.data_type.__idl__.keyless else 0
+        self._instance_cache: 'OrderedDict[bytes, None]' = OrderedDict()
+        self._track_instances = bool(self._instance_cache_size)
+        self._instance_keys: Dict[int, bytes] = {}
+        self._instance_handles: Dict[bytes, int] = {}
+        self._instance_lock = Lock()
+
         cqos = _CQos.cqos_create()
         ret = self._get_qos(self._ref, cqos)
         if ret == 0:
@@ -155,14 +189,107 @@ class DataWriter(Entity):
     def topic(self) -> 'cyclonedds.topic.Topic':
         return self._topic
 
-    def write(self, sample, timestamp=None):
+    def _serialize(self, sample) -> memoryview:
+        # Serialized into the per-thread buffer of the type, the returned view is only
+        # valid until the next sample of that type is serialized on this thread.
+        idl = sample.__idl__
+        ser = idl.serialize_view(sample, use_version_2=self._use_version_2)
+        if len(ser) % 4:
+            padding = len(ser) % 4
+            ser.release()
+            ser = idl.buffer.write_bytes(b'\0' * padding).asview()
+        return ser
+
+    def _key(self, sample) -> bytes:
+        # Must be called before _serialize, key extraction may use the same buffer
+        idl = sample.__idl__
+        return idl.key(sample, self._use_version_2 if self._use_version_2 is not None else idl.xcdrv2)
+
+    def _cache_instance(self, key: bytes, handle: int) -> None:
+        with self._instance_lock:
+            self._instance_keys[handle] = key
+            self._instance_handles[key] = handle
+            if not self._instance_cache_size:
+                return
+            if key in self._instance_cache:
+                self._instance_cache.move_to_end(key)
+                return
+            self._instance_cache[key] = None
+            if len(self._instance_cache) > self._instance_cache_size:
+                # The handle stays known, it can still be written by handle
+                self._instance_cache.popitem(last=False)
+
+    def _handle_key(self, sample, handle: int) -> Tuple[bytes, memoryview]:
+        # The key and serialized sample of a write by handle
+        with self._instance_lock:
+            key = self._instance_keys.get(handle)
+        if key is not None:
+            return key, self._serialize(sample)
+
+        # Not seen before, Cyclone knows whether the sample belongs to the handle. From now on
+        # registered and looked up instances are remembered too.
+        self._track_instances = True
+        key = self._key(sample)
+        ser = self._serialize(sample)
+        if ddspy_lookup_instance(self._ref, ser) != handle:
+            ser.release()
+            raise ValueError(f"Instance handle {handle} is not the instance of {sample} in {repr(self)}")
+        self._cache_instance(key, handle)
+        return key, ser
+
+    def _cached_key(self, sample) -> Optional[bytes]:
+        key = self._key(sample)
+        with self._instance_lock:
+            if key not in self._instance_cache:
+                return None
+            self._instance_cache.move_to_end(key)
+            return key
+
+    def _forget_instance(self, key: Optional[bytes] = None, handle: Optional[int] = None) -> None:
+        with self._instance_lock:
+            if key is None:
+                key = self._instance_keys.pop(handle, None)
+            else:
+                self._instance_keys.pop(self._instance_handles.get(key), None)
+            self._instance_handles.pop(key, None)
+            self._instance_cache.pop(key, None)
+
+    def write(self, sample, timestamp=None, handle: Optional[int] = None):
+        """Write a sample.
+
+        Parameters
+        ----------
+        sample: object
+            The sample, an instance of the data type of the topic.
+        timestamp: int, optional
+            Source timestamp in nanoseconds, by default the current time.
+        handle: int, optional
+            Instance handle of the sample as returned by register_instance or lookup_instance
+            of this writer. The first write of a handle checks it with Cyclone, later writes
+            do not extract the key from the sample at all, neither in Python nor by Cyclone,
+            so the sample must belong to that instance.
+
+        Raises
+        ------
+        ValueError
+            If the sample does not belong to the instance of the handle.
+        DDSException
+            If any error code is returned by the DDS API it is converted into an exception.
+        """
         if not isinstance(sample, self.data_type):
             raise TypeError(f"{sample} is not of type {self.data_type}")
 
-        ser = sample.serialize(use_version_2=self._use_version_2)
-        ser += b'\0' * (len(ser) % 4)
-
-        if timestamp is not None:
+        if handle is not None:
+            key, ser = self._handle_key(sample, handle)
+        else:
+            key = self._cached_key(sample) if self._instance_cache_size else None
+            ser = self._serialize(sample)
+
+        if key is not None and timestamp is not None:
+            ret = ddspy_write_key_ts(self._ref, ser, key, timestamp)
+        elif key is not None:
+            ret = ddspy_write_key(self._ref, ser, key)
+        elif timestamp is not None:
             ret = ddspy_write_ts(self._ref, ser, timestamp)
         else:
             ret = ddspy_write(self._ref, ser)
@@ -170,9 +297,31 @@ class DataWriter(Entity):
         if ret < 0:
             raise DDSException(ret, f"Occurred while writing sample in {repr(self)}")
 
+    def write_many(self, samples: Iterable, timestamps: Optional[Iterable[int]] = None) -> List[int]:
+        """Write a batch of samples with a single call into the C layer, which writes them
+        one after another without holding the GIL. Unlike write this does not stop at the
+        first failure, instead it returns the DDS return code of each sample in order.
+        """
+        data = bytearray()
+        sizes = array('I')
+        for sample in samples:
+            if not isinstance(sample, self.data_type):
+                raise TypeError(f"{sample} is not of type {self.data_type}")
+            ser = self._serialize(sample)
+            data += ser
+            sizes.append(len(ser))
+            # A live view would stop the native serializer from resizing the buffer for the next sample
+            ser.release()
+
+        if timestamps is not None:
+            timestamps = array('q', timestamps)
+            if len(timestamps) != len(sizes):
+                raise ValueError(f"Got {len(timestamps)} timestamps for {len(sizes)} samples")
+
+        return ddspy_write_batch(self._ref, data, sizes, timestamps)
+
     def write_dispose(self, sample, timestamp=None):
-        ser = sample.serialize(use_version_2=self._use_version_2)
-        ser += b'\0' * (len(ser) % 4)
+        ser = self._serialize(sample)
 
         if timestamp is not None:
             ret = ddspy_writedispose_ts(self._ref, ser, timestamp)
@@ -183,8 +332,7 @@ class DataWriter(Entity):
             raise DDSException(ret, f"Occurred while writedisposing sample in {repr(self)}")
 
     def dispose(self, sample, timestamp=None):
-        ser = sample.serialize(use_version_2=self._use_version_2)
-        ser += b'\0' * (len(ser) % 4)
+        ser = self._serialize(sample)
 
         if timestamp is not None:
             ret = ddspy_dispose_ts(self._ref, ser, timestamp)
@@ -194,6 +342,12 @@ class DataWriter(Entity):
         if ret < 0:
             raise DDSException(ret, f"Occurred while disposing in {repr(self)}")
 
+    def dispose_key(self, timestamp=None, **key):
+        """Dispose the instance with the given key members, for example ``writer.dispose_key(id=5)``.
+        All other members are default initialized, so no full sample needs to be built or serialized.
+        """
+        self.dispose(self.data_type.__idl__.key_sample(**key), timestamp)
+
     def dispose_instance_handle(self, handle, timestamp=None):
         if timestamp is not None:
             ret = ddspy_dispose_handle_ts(self._ref, handle, timestamp)
@@ -204,17 +358,20 @@ class DataWriter(Entity):
             raise DDSException(ret, f"Occurred while disposing in {repr(self)}")
 
     def register_instance(self, sample):
-        ser = sample.serialize(use_version_2=self._use_version_2)
-        ser += b'\0' * (len(ser) % 4)
+        key = self._key(sample) if self._track_instances else None
+        ser = self._serialize(sample)
 
         ret = ddspy_register_instance(self._ref, ser)
         if ret < 0:
             raise DDSException(ret, f"Occurred while registering instance in {repr(self)}")
+        if key is not None:
+            self._cache_instance(key, ret)
         return ret
 
     def unregister_instance(self, sample, timestamp: int = None):
-        ser = sample.serialize(use_version_2=self._use_version_2)
-        ser += b'\0' * (len(ser) % 4)
+        if self._track_instances:
+            self._forget_instance(key=self._key(sample))
+        ser = self._serialize(sample)
 
         if timestamp is not None:
             ret = ddspy_unregister_instance_ts(self._ref, ser, timestamp)
@@ -224,7 +381,13 @@ class DataWriter(Entity):
         if ret < 0:
             raise DDSException(ret, f"Occurred while unregistering instance in {repr(self)}")
 
+    def unregister_key(self, timestamp: int = None, **key):
+        """Unregister the instance with the given key members, see dispose_key."""
+        self.unregister_instance(self.data_type.__idl__.key_sample(**key), timestamp)
+
     def unregister_instance_handle(self, handle, timestamp: int = None):
+        if self._track_instances:
+            self._forget_instance(handle=handle)
         if timestamp is not None:
             ret = ddspy_unregister_instance_handle_ts(self._ref, handle, timestamp)
         else:
@@ -242,16 +405,22 @@ class DataWriter(Entity):
         raise DDSException(ret, f"Occurred while waiting for acks from {repr(self)}")
 
     def lookup_instance(self, sample):
-        ser = sample.serialize(use_version_2=self._use_version_2)
-        ser += b'\0' * (len(ser) % 4)
+        key = self._key(sample) if self._track_instances else None
+        ser = self._serialize(sample)
 
         ret = ddspy_lookup_instance(self._ref, ser)
         if ret < 0:
             raise DDSException(ret, f"Occurred while lookup up instance from {repr(self)}")
         if ret == 0:
             return None
+        if key is not None:
+            self._cache_instance(key, ret)
         return ret
 
+    def lookup_key(self, **key):
+        """Look up the instance handle for the given key members, see dispose_key."""
+        return self.lookup_instance(self.data_type.__idl__.key_sample(**key))
+
     @c_call("dds_create_writer")
     def _create_writer(self, publisher: dds_c_t.entity, topic: dds_c_t.entity, qos: dds_c_t.qos_p,
                        listener: dds_c_t.listener_p) -> dds_c_t.entity:
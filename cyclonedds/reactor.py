@@ -0,0 +1,257 @@
+"""
+ * Copyright(c) 2021 ADLINK Technology Limited and others
+ *
+ * This program and the accompanying materials are made available under the
+ * terms of the Eclipse Public License v. 2.0 which is available at
+ * http://www.eclipse.org/legal/epl-2.0, or the Eclipse Distribution License
+ * v. 1.0 which is available at
+ * http://www.eclipse.org/org/documents/edl-v10.php.
+ *
+ * SPDX-License-Identifier: EPL-2.0 OR BSD-3-Clause
+"""
+
+import asyncio
+import threading
+import traceback
+
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union, TYPE_CHECKING
+
+from .core import DDSException, ReadCondition, WaitSet, SampleState, ViewState, InstanceState
+
+
+if TYPE_CHECKING:
+    import cyclonedds
+
+
+@dataclass
+class Registration:
+    """A reader served by a Reactor, with counters of what was delivered to its callback."""
+    reader: 'cyclonedds.sub.DataReader'
+    callback: Callable[[List[Any]], Any]
+    batch_size: int
+    take: bool
+    lazy: bool
+    condition: ReadCondition = field(repr=False)
+    is_coroutine: bool = False
+    samples: int = 0
+    batches: int = 0
+    errors: int = 0
+
+
+class _Shard:
+    """One waitset and the thread that dispatches it."""
+    def __init__(self, reactor: 'Reactor', index: int) -> None:
+        self.reactor = reactor
+        self.index = index
+        self.waitset = WaitSet(reactor.participant)
+        self.registrations: Dict[int, Registration] = {}
+        self.thread: Optional[threading.Thread] = None
+
+    def run(self) -> None:
+        while self.reactor._running:
+            self.waitset.dispatch()
+
+
+class Reactor:
+    """Serves many readers from a few threads. Each thread owns a WaitSet with a ReadCondition
+    per reader it serves, readers are spread over the threads when they are registered.
+
+    When a reader triggers, its samples are taken (or read) in batches of at most batch_size
+    and passed to its callback as a list. Every reader gets at most batches_per_round batches
+    before the other triggered readers of its thread get their turn, the reader simply
+    triggers again on the next wait if it has more. Callbacks of one reader never run
+    concurrently. A reader that cannot be read, for example because it was deleted, is
+    counted as an error and unregistered.
+
+    Plain callbacks run on the reactor threads. Coroutine functions run on the event loop of
+    :meth:`run_async`, the reactor thread waits for each to finish before serving the reader
+    again, or with ``asyncio.run`` when the reactor runs without an event loop.
+
+    Parameters
+    ----------
+    participant: DomainParticipant
+        The participant the waitsets are created in.
+    threads: int, optional
+        The number of threads, and waitsets, serving the readers.
+    batches_per_round: int, optional
+        How many batches a reader gets per trigger before the others get their turn.
+    """
+
+    def __init__(self, participant: 'cyclonedds.domain.DomainParticipant', threads: int = 1,
+                 batches_per_round: int = 1) -> None:
+        if threads < 1:
+            raise ValueError("A reactor needs at least one thread.")
+        if batches_per_round < 1:
+            raise ValueError("batches_per_round must be at least 1.")
+
+        self.participant = participant
+        self.batches_per_round = batches_per_round
+        self._lock = threading.Lock()
+        self._shards = [_Shard(self, i) for i in range(threads)]
+        self._registrations: Dict[int, Tuple[_Shard, Registration]] = {}
+        self._running = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopped: Optional[asyncio.Future] = None
+
+    def register(self, reader: 'cyclonedds.sub.DataReader', callback: Callable[[List[Any]], Any],
+                 batch_size: int = 64, take: bool = True, lazy: bool = False) -> Registration:
+        """Serve a reader, this can be done while the reactor runs.
+
+        Parameters
+        ----------
+        reader: DataReader
+            The reader to serve, it can only be registered once.
+        callback: Callable[[List[Any]], Any]
+            Receives the samples, a list of at most batch_size, may be a coroutine function.
+        batch_size: int, optional
+            The maximum number of samples per call.
+        take: bool, optional
+            Take the samples, or read the ones that were not read before.
+        lazy: bool, optional
+            Pass lazily decoded samples, see :meth:`DataReader.read<cyclonedds.sub.DataReader.read>`.
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1.")
+
+        mask = (SampleState.Any if take else SampleState.NotRead) | ViewState.Any | InstanceState.Any
+        registration = Registration(
+            reader, callback, batch_size, take, lazy, ReadCondition(reader, mask),
+            is_coroutine=asyncio.iscoroutinefunction(callback)
+        )
+
+        with self._lock:
+            if reader._ref in self._registrations:
+                raise ValueError(f"{reader!r} is already registered.")
+            shard = min(self._shards, key=lambda s: len(s.registrations))
+            shard.registrations[reader._ref] = registration
+            self._registrations[reader._ref] = (shard, registration)
+        shard.waitset.attach(registration.condition, lambda condition: self._serve(registration))
+        return registration
+
+    def unregister(self, reader_or_registration: Union['cyclonedds.sub.DataReader', Registration]) -> None:
+        """Stop serving a reader, a callback that is running may still finish."""
+        reader = getattr(reader_or_registration, "reader", reader_or_registration)
+        with self._lock:
+            shard, registration = self._registrations.pop(reader._ref, (None, None))
+            if shard is None:
+                return
+            del shard.registrations[reader._ref]
+        try:
+            shard.waitset.detach(registration.condition)
+        except DDSException:
+            # The condition was deleted together with its reader
+            pass
+        # Now, not when the registration is collected, so registering again does not pile them up
+        registration.condition.__del__()
+
+    def registrations(self) -> List[Registration]:
+        with self._lock:
+            return [registration for _, registration in self._registrations.values()]
+
+    def run_forever(self) -> None:
+        """Serve the readers on the calling thread and threads - 1 others until :meth:`stop`."""
+        self._start(self._shards[1:])
+        try:
+            self._shards[0].run()
+        finally:
+            self.stop()
+
+    def start(self) -> None:
+        """Serve the readers on background threads until :meth:`stop`."""
+        self._start(self._shards)
+
+    async def run_async(self) -> None:
+        """Serve the readers on background threads until :meth:`stop`, running coroutine
+        callbacks on the current event loop."""
+        loop = asyncio.get_running_loop()
+        self._loop = loop
+        self._stopped = loop.create_future()
+        self.start()
+        try:
+            await self._stopped
+        finally:
+            # The threads may be waiting for a coroutine callback, keep the loop running
+            await loop.run_in_executor(None, self._join, self._halt())
+            self._loop = self._stopped = None
+
+    def stop(self) -> None:
+        """Stop serving, callbacks that are running finish first. Waits for the reactor threads
+        unless called from one of them or from the event loop of :meth:`run_async`."""
+        threads = self._halt()
+        try:
+            on_loop = self._loop is not None and asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if not on_loop:
+            self._join(threads)
+
+    def _halt(self) -> List[threading.Thread]:
+        with self._lock:
+            self._running = False
+            threads = [shard.thread for shard in self._shards if shard.thread is not None]
+            for shard in self._shards:
+                shard.thread = None
+                shard.waitset.stop_dispatch()
+
+        stopped, loop = self._stopped, self._loop
+        if stopped is not None and loop is not None:
+            loop.call_soon_threadsafe(lambda: stopped.done() or stopped.set_result(None))
+        return threads
+
+    @staticmethod
+    def _join(threads: List[threading.Thread]) -> None:
+        current = threading.current_thread()
+        for thread in threads:
+            if thread is not current:
+                thread.join()
+
+    def __enter__(self) -> 'Reactor':
+        self.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+    def _start(self, shards: List[_Shard]) -> None:
+        with self._lock:
+            if self._running:
+                raise RuntimeError("The reactor is already running.")
+            self._running = True
+            for shard in shards:
+                shard.thread = threading.Thread(target=shard.run, name=f"cyclonedds-reactor-{shard.index}", daemon=True)
+                shard.thread.start()
+
+    def _serve(self, registration: Registration) -> None:
+        reader = registration.reader
+        method = reader.take if registration.take else reader.read
+        for _ in range(self.batches_per_round):
+            try:
+                samples = method(N=registration.batch_size, condition=registration.condition, lazy=registration.lazy)
+            except Exception:
+                # Most likely the reader was deleted, it must not end the thread serving the others
+                registration.errors += 1
+                traceback.print_exc()
+                self.unregister(registration)
+                return
+            if not samples:
+                return
+
+            registration.samples += len(samples)
+            registration.batches += 1
+            try:
+                if not registration.is_coroutine:
+                    registration.callback(samples)
+                elif self._loop is not None:
+                    asyncio.run_coroutine_threadsafe(registration.callback(samples), self._loop).result()
+                else:
+                    asyncio.run(registration.callback(samples))
+            except Exception:
+                registration.errors += 1
+                traceback.print_exc()
+
+            if len(samples) < registration.batch_size:
+                return
+
+
+__all__ = ["Reactor", "Registration"]
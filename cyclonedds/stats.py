@@ -0,0 +1,161 @@
+"""
+ * Copyright(c) 2021 ADLINK Technology Limited and others
+ *
+ * This program and the accompanying materials are made available under the
+ * terms of the Eclipse Public License v. 2.0 which is available at
+ * http://www.eclipse.org/legal/epl-2.0, or the Eclipse Distribution License
+ * v. 1.0 which is available at
+ * http://www.eclipse.org/org/documents/edl-v10.php.
+ *
+ * SPDX-License-Identifier: EPL-2.0 OR BSD-3-Clause
+"""
+
+from dataclasses import dataclass, replace
+from functools import wraps
+from threading import Lock
+from time import perf_counter_ns
+from typing import Any, Callable, Dict, List, Tuple
+
+
+@dataclass
+class OpStats:
+    """Statistics of one operation on one type. Bytes are only counted for operations that
+    see the serialized data: serialize, deserialize, key and keyhash. The write, read and take
+    latencies include the (de)serialization and the time spent in Cyclone, like the key VM.
+    """
+    count: int = 0
+    bytes: int = 0
+    total_ns: int = 0
+    max_ns: int = 0
+
+    @property
+    def mean_ns(self) -> float:
+        return self.total_ns / self.count if self.count else 0.0
+
+
+_lock = Lock()
+_stats: Dict[str, Dict[str, OpStats]] = {}
+# (class, attribute, original function) of every replaced method
+_originals: List[Tuple[type, str, Callable]] = []
+
+
+def _record(typename: str, op: str, nbytes: int, elapsed: int) -> None:
+    with _lock:
+        ops = _stats.get(typename)
+        if ops is None:
+            ops = _stats[typename] = {}
+        stats = ops.get(op)
+        if stats is None:
+            stats = ops[op] = OpStats()
+        stats.count += 1
+        stats.bytes += nbytes
+        stats.total_ns += elapsed
+        if elapsed > stats.max_ns:
+            stats.max_ns = elapsed
+
+
+def _instrument(func: Callable, op: str, typename: Callable[[Any], str],
+                size: Callable[[tuple, Any], int]) -> Callable:
+    @wraps(func)
+    def instrumented(self, *args, **kwargs):
+        start = perf_counter_ns()
+        result = func(self, *args, **kwargs)
+        _record(typename(self), op, size(args, result), perf_counter_ns() - start)
+        return result
+    return instrumented
+
+
+def _idl_typename(idl) -> str:
+    return idl.datatype.__idl_typename__
+
+
+def _entity_typename(entity) -> str:
+    # Readers only know their type through the topic
+    return entity.topic.data_type.__idl_typename__
+
+
+def _no_size(args: tuple, result: Any) -> int:
+    return 0
+
+
+def _result_size(args: tuple, result: Any) -> int:
+    return len(result)
+
+
+def _buffer_size(args: tuple, buffer: Any) -> int:
+    return buffer.tell()
+
+
+def _data_size(args: tuple, result: Any) -> int:
+    # deserialize accepts bytes-like objects and Buffers
+    data = args[0]
+    return len(data._bytes) if hasattr(data, "_bytes") else len(data)
+
+
+def _instrumented_methods():
+    from .idl._main import IDL
+    from .pub import DataWriter
+    from .sub import DataReader
+
+    return [
+        # serialize and serialize_view (which the writers use) both go through _serialize_into
+        (IDL, "_serialize_into", "serialize", _idl_typename, _buffer_size),
+        (IDL, "deserialize", "deserialize", _idl_typename, _data_size),
+        (IDL, "key", "key", _idl_typename, _result_size),
+        (IDL, "keyhash", "keyhash", _idl_typename, _result_size),
+        (DataWriter, "write", "write", _entity_typename, _no_size),
+        (DataWriter, "write_many", "write_many", _entity_typename, _no_size),
+        (DataReader, "read", "read", _entity_typename, _no_size),
+        (DataReader, "take", "take", _entity_typename, _no_size),
+    ]
+
+
+def enable() -> None:
+    """Start recording per type statistics of serialization, deserialization, key extraction,
+    writes and reads. This replaces the instrumented methods by timing wrappers, disable puts
+    the originals back, so the statistics cost nothing while they are disabled.
+
+    Examples
+    --------
+    >>> from cyclonedds import stats
+    >>> stats.enable()
+    >>> ...
+    >>> for typename, ops in stats.snapshot().items():
+    >>>     print(typename, ops["serialize"].count, ops["serialize"].mean_ns)
+    """
+    with _lock:
+        if _originals:
+            return
+        for cls, attribute, op, typename, size in _instrumented_methods():
+            original = cls.__dict__[attribute]
+            _originals.append((cls, attribute, original))
+            setattr(cls, attribute, _instrument(original, op, typename, size))
+
+
+def disable() -> None:
+    """Stop recording statistics and restore the uninstrumented methods. The statistics
+    recorded so far are kept until reset."""
+    with _lock:
+        for cls, attribute, original in _originals:
+            setattr(cls, attribute, original)
+        _originals.clear()
+
+
+def enabled() -> bool:
+    return bool(_originals)
+
+
+def reset() -> None:
+    """Forget all statistics recorded so far."""
+    with _lock:
+        _stats.clear()
+
+
+def snapshot() -> Dict[str, Dict[str, OpStats]]:
+    """Copy of the statistics recorded so far, by type name and then by operation
+    (serialize, deserialize, key, keyhash, write, write_many, read and take)."""
+    with _lock:
+        return {typename: {op: replace(stats) for op, stats in ops.items()} for typename, ops in _stats.items()}
+
+
+__all__ = ["OpStats", "enable", "disable", "enabled", "reset", "snapshot"]
@@ -10,18 +10,23 @@
  * SPDX-License-Identifier: EPL-2.0 OR BSD-3-Clause
 """
 
-import asyncio
-import concurrent.futures
-from typing import AsyncGenerator, List, Optional, Union, Generator, TYPE_CHECKING
+import weakref
 
-from .core import Entity, Listener, DDSException, WaitSet, ReadCondition, SampleState, InstanceState, ViewState
+from struct import Struct
+from typing import AsyncGenerator, Dict, Iterator, List, Optional, Union, Generator, TYPE_CHECKING
+
+from .core import Entity, Listener, DDSException, WaitSet, ReadCondition, SampleState, InstanceState, ViewState, \
+    _AsyncWaiter
 from .domain import DomainParticipant
 from .topic import Topic
-from .internal import c_call, dds_c_t, InvalidSample
+from .internal import c_call, dds_c_t, InvalidSample, SampleInfo
 from .qos import _CQos, Qos, LimitedScopeQos, SubscriberQos, DataReaderQos
 from .util import duration
+from .idl._lazy import LazySample
+from .idl._support import Buffer
 
-from cyclonedds._clayer import ddspy_read, ddspy_take, ddspy_read_handle, ddspy_take_handle, ddspy_lookup_instance
+from cyclonedds._clayer import ddspy_read, ddspy_take, ddspy_read_handle, ddspy_take_handle, ddspy_lookup_instance, \
+    ddspy_read_bulk, ddspy_take_bulk, ddspy_read_loan, ddspy_take_loan
 
 
 if TYPE_CHECKING:
@@ -78,6 +83,102 @@ class Subscriber(Entity):
         pass
 
 
+class SampleBatch:
+    """Samples returned by :meth:`DataReader.read_batch` or :meth:`DataReader.take_batch`.
+
+    All serialized samples are packed in one bytearray, ``batch[i]`` is a memoryview on the
+    data of sample i. Sample infos are kept in one packed buffer as well and are only turned
+    into :class:`SampleInfo` objects on request.
+
+    Attributes
+    ----------
+    data: bytearray
+        The serialized samples, back to back.
+    offsets: memoryview
+        Offset of each sample in data, with one extra entry for the end of the data.
+    infos: bytes
+        One ``info_struct`` record per sample, the fields in SampleInfo order.
+    """
+
+    info_struct = Struct("@4Iq2Q5I4x")
+
+    def __init__(self, data_type, data: bytearray, offsets: bytes, infos: bytes) -> None:
+        self.data_type = data_type
+        self.data = data
+        self.offsets = memoryview(offsets).cast('Q')
+        self.infos = infos
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> memoryview:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("SampleBatch index out of range")
+        return memoryview(self.data)[self.offsets[index]:self.offsets[index + 1]]
+
+    def valid_data(self, index: int) -> bool:
+        return self.info_struct.unpack_from(self.infos, index * self.info_struct.size)[3] != 0
+
+    def sample_info(self, index: int) -> SampleInfo:
+        values = list(self.info_struct.unpack_from(self.infos, index * self.info_struct.size))
+        values[3] = values[3] != 0
+        return SampleInfo(*values)
+
+    def sample(self, index: int, lazy: bool = False) -> object:
+        info = self.sample_info(index)
+        if not info.valid_data:
+            return InvalidSample(bytes(self[index]), info)
+        if lazy:
+            return LazySample(self.data_type.__idl__, self[index], info)
+        sample = self.data_type.deserialize(self[index])
+        sample.sample_info = info
+        return sample
+
+    def samples(self, lazy: bool = False) -> Iterator[object]:
+        for i in range(len(self)):
+            yield self.sample(i, lazy)
+
+
+class LoanedSample:
+    """A received sample that references the serialized data in Cyclone's memory instead of
+    a copy, returned by :meth:`DataReader.read_loan` and :meth:`DataReader.take_loan`.
+
+    The data stays loaned until the sample is garbage collected or :meth:`release` is called.
+    Samples decoded from a loan are decoded without copying the data, members annotated with
+    ``ndarray`` are read-only views on the loaned memory and keep it alive.
+    """
+
+    def __init__(self, data_type, loan, sample_info: SampleInfo) -> None:
+        self.data_type = data_type
+        self.loan = loan
+        self.sample_info = sample_info
+
+    @property
+    def data(self) -> memoryview:
+        return memoryview(self.loan)
+
+    def decode(self, lazy: bool = False) -> object:
+        if not self.sample_info.valid_data:
+            return InvalidSample(bytes(self.loan), self.sample_info)
+        if lazy:
+            return LazySample(self.data_type.__idl__, self.data, self.sample_info)
+        sample = self.data_type.deserialize(Buffer.view(self.loan, align_offset=4))
+        sample.sample_info = self.sample_info
+        return sample
+
+    def release(self) -> None:
+        """Return the loan, raises BufferError while memoryviews on the data still exist."""
+        self.loan.release()
+
+    def __enter__(self) -> 'LoanedSample':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
 class DataReader(Entity):
     """Subscribe to a topic and read/take the data published to it.
     """
@@ -138,13 +239,15 @@ class DataReader(Entity):
         self._topic = topic
         self._topic_ref = topic._ref
         self._next_condition = None
+        # Condition handle -> idle WaitSets for iterating on it
+        self._iter_waitsets: Dict[int, List[WaitSet]] = {}
         self._keepalive_entities = [self.subscriber, topic]
 
     @property
     def topic(self) -> 'cyclonedds.topic.Topic':
         return self._topic
 
-    def read(self, N: int = 1, condition: Entity = None, instance_handle: int = None) -> List[object]:
+    def read(self, N: int = 1, condition: Entity = None, instance_handle: int = None, lazy: bool = False) -> List[object]:
         """Read a maximum of N samples, non-blocking. Optionally use a read/query-condition to select which samples
         you are interested in.
 
@@ -154,6 +257,9 @@ class DataReader(Entity):
             The maximum number of samples to read.
         condition: cyclonedds.core.ReadCondition, cyclonedds.core.QueryCondition, optional
             Only read samples that satisfy the supplied condition.
+        lazy: bool, optional
+            Return proxies that keep the serialized data and only decode members on access,
+            call ``decode()`` on a proxy to get the full sample.
 
         Raises
         ------
@@ -168,16 +274,9 @@ class DataReader(Entity):
         if type(ret) == int:
             raise DDSException(ret, f"Occurred while reading data in {repr(self)}")
 
-        samples = []
-        for (data, info) in ret:
-            if info.valid_data:
-                samples.append(self._topic.data_type.deserialize(data))
-                samples[-1].sample_info = info
-            else:
-                samples.append(InvalidSample(data, info))
-        return samples
+        return self._make_samples(ret, lazy)
 
-    def take(self, N: int = 1, condition: Entity = None, instance_handle: int = None) -> List[object]:
+    def take(self, N: int = 1, condition: Entity = None, instance_handle: int = None, lazy: bool = False) -> List[object]:
         """Take a maximum of N samples, non-blocking. Optionally use a read/query-condition to select which samples
         you are interested in.
 
@@ -187,6 +286,9 @@ class DataReader(Entity):
             The maximum number of samples to read.
         condition: cyclonedds.core.ReadCondition, cyclonedds.core.QueryCondition, optional
             Only take samples that satisfy the supplied condition.
+        lazy: bool, optional
+            Return proxies that keep the serialized data and only decode members on access,
+            call ``decode()`` on a proxy to get the full sample.
 
         Raises
         ------
@@ -201,7 +303,103 @@ class DataReader(Entity):
         if type(ret) == int:
             raise DDSException(ret, f"Occurred while taking data in {repr(self)}")
 
+        return self._make_samples(ret, lazy)
+
+    def read_batch(self, N: int = 1, condition: Entity = None) -> SampleBatch:
+        """Read a maximum of N samples, non-blocking, into a single :class:`SampleBatch`
+        without creating any per sample Python objects.
+
+        Parameters
+        ----------
+        N: int
+            The maximum number of samples to read.
+        condition: cyclonedds.core.ReadCondition, cyclonedds.core.QueryCondition, optional
+            Only read samples that satisfy the supplied condition.
+
+        Raises
+        ------
+        DDSException
+            If any error code is returned by the DDS API it is converted into an exception.
+        """
+        ret = ddspy_read_bulk(condition._ref if condition else self._ref, N)
+        if type(ret) == int:
+            raise DDSException(ret, f"Occurred while reading data in {repr(self)}")
+        return SampleBatch(self._topic.data_type, *ret)
+
+    def take_batch(self, N: int = 1, condition: Entity = None) -> SampleBatch:
+        """Take a maximum of N samples, non-blocking, into a single :class:`SampleBatch`
+        without creating any per sample Python objects.
+
+        Parameters
+        ----------
+        N: int
+            The maximum number of samples to take.
+        condition: cyclonedds.core.ReadCondition, cyclonedds.core.QueryCondition, optional
+            Only take samples that satisfy the supplied condition.
+
+        Raises
+        ------
+        DDSException
+            If any error code is returned by the DDS API it is converted into an exception.
+        """
+        ret = ddspy_take_bulk(condition._ref if condition else self._ref, N)
+        if type(ret) == int:
+            raise DDSException(ret, f"Occurred while taking data in {repr(self)}")
+        return SampleBatch(self._topic.data_type, *ret)
+
+    def read_loan(self, N: int = 1, condition: Entity = None) -> List[LoanedSample]:
+        """Read a maximum of N samples, non-blocking, without copying their serialized data out
+        of Cyclone. See :class:`LoanedSample`.
+
+        Parameters
+        ----------
+        N: int
+            The maximum number of samples to read.
+        condition: cyclonedds.core.ReadCondition, cyclonedds.core.QueryCondition, optional
+            Only read samples that satisfy the supplied condition.
+
+        Raises
+        ------
+        DDSException
+            If any error code is returned by the DDS API it is converted into an exception.
+        """
+        ret = ddspy_read_loan(condition._ref if condition else self._ref, N)
+        if type(ret) == int:
+            raise DDSException(ret, f"Occurred while reading data in {repr(self)}")
+        return [LoanedSample(self._topic.data_type, loan, info) for (loan, info) in ret]
+
+    def take_loan(self, N: int = 1, condition: Entity = None) -> List[LoanedSample]:
+        """Take a maximum of N samples, non-blocking, without copying their serialized data out
+        of Cyclone. See :class:`LoanedSample`.
+
+        Parameters
+        ----------
+        N: int
+            The maximum number of samples to take.
+        condition: cyclonedds.core.ReadCondition, cyclonedds.core.QueryCondition, optional
+            Only take samples that satisfy the supplied condition.
+
+        Raises
+        ------
+        DDSException
+            If any error code is returned by the DDS API it is converted into an exception.
+        """
+        ret = ddspy_take_loan(condition._ref if condition else self._ref, N)
+        if type(ret) == int:
+            raise DDSException(ret, f"Occurred while taking data in {repr(self)}")
+        return [LoanedSample(self._topic.data_type, loan, info) for (loan, info) in ret]
+
+    def _make_samples(self, ret, lazy: bool) -> List[object]:
         samples = []
+        if lazy:
+            idl = self._topic.data_type.__idl__
+            for (data, info) in ret:
+                if info.valid_data:
+                    samples.append(LazySample(idl, data, info))
+                else:
+                    samples.append(InvalidSample(data, info))
+            return samples
+
         for (data, info) in ret:
             if info.valid_data:
                 samples.append(self._topic.data_type.deserialize(data))
@@ -218,9 +416,7 @@ class DataReader(Entity):
         DDSException
             If any error code is returned by the DDS API it is converted into an exception.
         """
-        self._next_condition = self._next_condition or \
-            ReadCondition(self, ViewState.Any | SampleState.NotRead | InstanceState.Alive)
-        samples = self.read(condition=self._next_condition)
+        samples = self.read(condition=self._default_condition())
         if samples:
             return samples[0]
         return None
@@ -233,35 +429,74 @@ class DataReader(Entity):
         DDSException
             If any error code is returned by the DDS API it is converted into an exception.
         """
-        self._next_condition = self._next_condition or \
-            ReadCondition(self, ViewState.Any | SampleState.NotRead | InstanceState.Alive)
-        samples = self.take(condition=self._next_condition)
+        samples = self.take(condition=self._default_condition())
         if samples:
             return samples[0]
         return None
 
-    def read_iter(self, condition=None, timeout: int = None) -> Generator[object, None, None]:
+    def _default_condition(self) -> ReadCondition:
+        self._next_condition = self._next_condition or \
+            ReadCondition(self, ViewState.Any | SampleState.NotRead | InstanceState.Alive)
+        return self._next_condition
+
+    def _batches(self, method, N: int, condition, timeout: Optional[int]) -> Generator[List[object], None, None]:
+        # The WaitSets are pooled per condition, so calling read_one/take_one or iterating
+        # in a loop does not create and delete entities every time.
+        default = condition is None
+        if default:
+            condition = self._default_condition()
+        pool = self._iter_waitsets.get(condition._ref)
+        if pool is None:
+            pool = self._iter_waitsets.setdefault(condition._ref, [])
+            if not default:
+                weakref.finalize(condition, self._iter_waitsets.pop, condition._ref, None)
+        waitset = pool.pop() if pool else WaitSet(self.participant)
+        waitset.attach(condition)
+        timeout = timeout or duration(weeks=99999)
+
+        try:
+            while True:
+                while True:
+                    samples = method(N=N, condition=condition)
+                    if not samples:
+                        break
+                    yield samples
+                if not waitset.wait(timeout):
+                    break
+        finally:
+            if not default:
+                # An idle WaitSet must not keep the condition alive, its pool goes away with it
+                waitset.detach(condition)
+            pool.append(waitset)
+
+    def read_iter(self, condition=None, timeout: int = None, batch_size: int = 1,
+                  batches: bool = False) -> Generator[object, None, None]:
         """Shortcut method to iterate reading samples. Iteration will stop once the timeout you supply expires.
         Every time a sample is received the timeout is reset.
 
+        Parameters
+        ----------
+        condition: Entity, optional
+            Condition to read with and to wait for, by default all samples that were not read yet.
+        timeout: int, optional
+            Nanoseconds to wait for new data, reset every time data arrives.
+        batch_size: int
+            Maximum number of samples to read per call into DDS. Larger batches drain a backlog
+            much faster, but samples of the last batch are already marked read when you stop
+            iterating halfway through it.
+        batches: bool
+            Yield the lists of up to batch_size samples instead of the individual samples.
+
         Raises
         ------
         DDSException
             If any error code is returned by the DDS API it is converted into an exception.
         """
-        waitset = WaitSet(self.participant)
-        condition = condition or ReadCondition(self, ViewState.Any | InstanceState.Alive | SampleState.NotRead)
-        waitset.attach(condition)
-        timeout = timeout or duration(weeks=99999)
-
-        while True:
-            while True:
-                a = self.read(condition=condition)
-                if not a:
-                    break
-                yield a[0]
-            if waitset.wait(timeout) == 0:
-                break
+        if batches:
+            yield from self._batches(self.read, batch_size, condition, timeout)
+        else:
+            for samples in self._batches(self.read, batch_size, condition, timeout):
+                yield from samples
 
     def read_one(self, condition=None, timeout: int = None) -> object:
         """Shortcut method to block and take exactly one sample or raise a timeout"""
@@ -270,28 +505,34 @@ class DataReader(Entity):
             raise TimeoutError()
         return sample
 
-    def take_iter(self, condition=None, timeout: int = None) -> Generator[object, None, None]:
+    def take_iter(self, condition=None, timeout: int = None, batch_size: int = 1,
+                  batches: bool = False) -> Generator[object, None, None]:
         """Shortcut method to iterate taking samples. Iteration will stop once the timeout you supply expires.
         Every time a sample is received the timeout is reset.
 
+        Parameters
+        ----------
+        condition: Entity, optional
+            Condition to take with and to wait for, by default all samples that were not read yet.
+        timeout: int, optional
+            Nanoseconds to wait for new data, reset every time data arrives.
+        batch_size: int
+            Maximum number of samples to take per call into DDS. Larger batches drain a backlog
+            much faster, but samples of the last batch are lost when you stop iterating halfway
+            through it.
+        batches: bool
+            Yield the lists of up to batch_size samples instead of the individual samples.
+
         Raises
         ------
         DDSException
             If any error code is returned by the DDS API it is converted into an exception.
         """
-        waitset = WaitSet(self.participant)
-        condition = condition or ReadCondition(self, ViewState.Any | InstanceState.Alive | SampleState.NotRead)
-        waitset.attach(condition)
-        timeout = timeout or duration(weeks=99999)
-
-        while True:
-            while True:
-                a = self.take(condition=condition)
-                if not a:
-                    break
-                yield a[0]
-            if waitset.wait(timeout) == 0:
-                break
+        if batches:
+            yield from self._batches(self.take, batch_size, condition, timeout)
+        else:
+            for samples in self._batches(self.take, batch_size, condition, timeout):
+                yield from samples
 
     def take_one(self, condition=None, timeout: int = None) -> object:
         """Shortcut method to block and take exactly one sample or raise a timeout"""
@@ -300,57 +541,86 @@ class DataReader(Entity):
             raise TimeoutError()
         return sample
 
+    async def _batches_async(self, method, N: int, condition, timeout: Optional[int]) -> AsyncGenerator[List[object], None]:
+        condition = condition or self._default_condition()
+        waiter = _AsyncWaiter.for_participant(self.participant)
+
+        while True:
+            while True:
+                samples = method(N=N, condition=condition)
+                if not samples:
+                    break
+                yield samples
+            if not await waiter.wait(condition, timeout):
+                break
+
     async def read_aiter(self, condition=None, timeout: int = None) -> AsyncGenerator[object, None]:
         """Shortcut method to asycn iterate reading samples. Iteration will stop once the timeout you supply expires.
-        Every time a sample is received the timeout is reset.
+        Every time a sample is received the timeout is reset. Waiting does not block the event loop, all
+        async iterators within a domain participant share a single waiting thread.
 
         Raises
         ------
         DDSException
             If any error code is returned by the DDS API it is converted into an exception.
         """
-        waitset = WaitSet(self.participant)
-        condition = condition or ReadCondition(self, ViewState.Any | InstanceState.Alive | SampleState.NotRead)
-        waitset.attach(condition)
-        timeout = timeout or duration(weeks=99999)
-
-        loop = asyncio.get_running_loop()
-        with concurrent.futures.ThreadPoolExecutor() as pool:
-            while True:
-                while True:
-                    a = self.read(condition=condition)
-                    if not a:
-                        break
-                    yield a[0]
-                result = await loop.run_in_executor(pool, waitset.wait, timeout)
-                if result == 0:
-                    break
+        async for samples in self._batches_async(self.read, 1, condition, timeout):
+            yield samples[0]
 
     async def take_aiter(self, condition=None, timeout: int = None) -> AsyncGenerator[object, None]:
         """Shortcut method to asycn iterate taking samples. Iteration will stop once the timeout you supply expires.
-        Every time a sample is received the timeout is reset.
+        Every time a sample is received the timeout is reset. Waiting does not block the event loop, all
+        async iterators within a domain participant share a single waiting thread.
 
         Raises
         ------
         DDSException
             If any error code is returned by the DDS API it is converted into an exception.
         """
-        waitset = WaitSet(self.participant)
-        condition = condition or ReadCondition(self, ViewState.Any | InstanceState.Alive | SampleState.NotRead)
-        waitset.attach(condition)
-        timeout = timeout or duration(weeks=99999)
+        async for samples in self._batches_async(self.take, 1, condition, timeout):
+            yield samples[0]
 
-        loop = asyncio.get_running_loop()
-        with concurrent.futures.ThreadPoolExecutor() as pool:
-            while True:
-                while True:
-                    a = self.take(condition=condition)
-                    if not a:
-                        break
-                    yield a[0]
-                result = await loop.run_in_executor(pool, waitset.wait, timeout)
-                if result == 0:
-                    break
+    async def read_batches(self, max_n: int, condition=None, timeout: int = None) -> AsyncGenerator[List[object], None]:
+        """Async iterate over lists of at most max_n read samples, so a burst of data costs one wakeup
+        instead of one per sample. Iteration will stop once the timeout you supply expires.
+
+        Parameters
+        ----------
+        max_n: int
+            Maximum number of samples per list.
+        condition: Entity, optional
+            Condition to read with and to wait for, by default all samples that were not read yet.
+        timeout: int, optional
+            Nanoseconds to wait for new data, reset every time data arrives. Waits forever by default.
+
+        Raises
+        ------
+        DDSException
+            If any error code is returned by the DDS API it is converted into an exception.
+        """
+        async for samples in self._batches_async(self.read, max_n, condition, timeout):
+            yield samples
+
+    async def take_batches(self, max_n: int, condition=None, timeout: int = None) -> AsyncGenerator[List[object], None]:
+        """Async iterate over lists of at most max_n taken samples, so a burst of data costs one wakeup
+        instead of one per sample. Iteration will stop once the timeout you supply expires.
+
+        Parameters
+        ----------
+        max_n: int
+            Maximum number of samples per list.
+        condition: Entity, optional
+            Condition to take with and to wait for, by default all samples that were not read yet.
+        timeout: int, optional
+            Nanoseconds to wait for new data, reset every time data arrives. Waits forever by default.
+
+        Raises
+        ------
+        DDSException
+            If any error code is returned by the DDS API it is converted into an exception.
+        """
+        async for samples in self._batches_async(self.take, max_n, condition, timeout):
+            yield samples
 
     def wait_for_historical_data(self, timeout: int) -> bool:
         ret = self._wait_for_historical_data(self._ref, timeout)
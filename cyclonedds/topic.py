@@ -11,13 +11,14 @@
 """
 
 import ctypes as ct
-from typing import Any, AnyStr, Optional, TYPE_CHECKING
+from typing import Any, AnyStr, Optional, Sequence, TYPE_CHECKING
 
 from .internal import c_call, dds_c_t
 from .core import Entity, DDSException, Listener
 from .qos import _CQos, Qos, LimitedScopeQos, TopicQos
+from .idl._filter import FilterExpression
 
-from cyclonedds._clayer import ddspy_topic_create
+from cyclonedds._clayer import ddspy_topic_create, ddspy_topic_filter, ddspy_topic_filter_update, ddspy_filter_program
 
 
 if TYPE_CHECKING:
@@ -96,3 +97,65 @@ class Topic(Entity):
     @c_call("dds_get_type_name")
     def _get_type_name(self, topic: dds_c_t.entity, name: ct.c_char_p, size: ct.c_size_t) -> dds_c_t.returnv:
         pass
+
+
+class ContentFilteredTopic(Topic):
+    """A Topic that only passes the samples that match a filter expression. Readers created on
+    it never see the other samples and writers created on it do not send them. Expressions
+    like ``speed > %0 and id in (1, 2)`` that only compare primitive members are evaluated
+    natively on the serialized data, so rejected samples never reach Python, see
+    :class:`FilterExpression<cyclonedds.idl._filter.FilterExpression>`.
+    """
+
+    def __init__(
+            self,
+            topic: Topic,
+            filter_expression: str,
+            expression_parameters: Sequence[Any] = (),
+            listener: Optional[Listener] = None):
+        """Create a ContentFilteredTopic.
+
+        Parameters
+        ----------
+        topic: Topic
+            The topic to filter, the filtered topic has the same name, type and qos.
+        filter_expression: str
+            Expression on the members of the sample, parameters are referenced as %0, %1, ...
+        expression_parameters: Sequence[Any], optional
+            Values of the parameters, these can be changed later with set_expression_parameters.
+        listener: cyclonedds.core.Listener, optional
+            Optionally supply a Listener.
+
+        Raises
+        ------
+        ValueError
+            If the expression is invalid or parameters are missing.
+        """
+        if not isinstance(topic, Topic):
+            raise TypeError(f"{topic} is not a cyclonedds.topic.Topic.")
+
+        self.related_topic = topic
+        self.expression = FilterExpression(topic.data_type, filter_expression, expression_parameters)
+        super().__init__(topic.participant, topic.name, topic.data_type, qos=topic.get_qos(), listener=listener)
+        self._keepalive_entities.append(topic)
+        self._filter = ddspy_topic_filter(self._ref, self._program(), self.expression.evaluate)
+
+    def _program(self) -> Any:
+        if self.expression.programs is None:
+            return None
+        return ddspy_filter_program(*self.expression.programs)
+
+    @property
+    def filter_expression(self) -> str:
+        return self.expression.expression
+
+    def get_expression_parameters(self) -> Sequence[Any]:
+        return self.expression.parameters
+
+    def set_expression_parameters(self, expression_parameters: Sequence[Any]) -> None:
+        """Change the parameters of the filter expression, readers and writers on the topic
+        apply the new filter to the samples they get from then on."""
+        self.expression.set_parameters(expression_parameters)
+        ddspy_topic_filter_update(self._filter, self._program(), self.expression.evaluate)
+
+    expression_parameters = property(get_expression_parameters, set_expression_parameters)
@@ -104,6 +104,9 @@ setup(
         "docs": [
             "Sphinx>=4.0.0",
             "sphinx-rtd-theme>=0.5.2"
+        ],
+        "numpy": [
+            "numpy"
         ]
     },
     zip_safe=False,
@@ -0,0 +1,103 @@
+import pytest
+
+from dataclasses import dataclass
+
+from cyclonedds.idl import IdlStruct, make_idl_struct
+from cyclonedds.idl.annotations import appendable
+from cyclonedds.idl._support import Buffer, Endianness
+import cyclonedds.idl.types as pt
+
+
+@dataclass
+class Padded(IdlStruct, typename="Reuse.Padded"):
+    a: pt.int8
+    b: pt.int64
+    c: pt.int8
+    d: pt.int32
+    e: str
+    f: pt.int16
+    g: pt.float64
+
+
+@dataclass
+@appendable
+class AppendablePadded(IdlStruct, typename="Reuse.AppendablePadded"):
+    a: pt.uint8
+    b: pt.sequence[pt.int64]
+    c: pt.int8
+
+
+def _dirty_buffer():
+    return Buffer(b'\xff' * 64)
+
+
+@pytest.mark.parametrize("use_version_2", [False, True])
+@pytest.mark.parametrize("endianness", [Endianness.Little, Endianness.Big])
+def test_stale_buffer_padding_zeroed(use_version_2, endianness):
+    sample = Padded(a=1, b=2, c=3, d=4, e="x", f=5, g=6.0)
+    expected = sample.serialize(use_version_2=use_version_2, endianness=endianness)
+
+    buffer = _dirty_buffer()
+    assert sample.serialize(buffer=buffer, use_version_2=use_version_2, endianness=endianness) == expected
+    assert b'\xff' not in expected
+
+
+def test_buffer_reuse_shorter_sample():
+    buffer = Buffer()
+    AppendablePadded(a=1, b=[-1] * 64, c=-1).serialize(buffer=buffer)
+
+    sample = AppendablePadded(a=1, b=[2], c=3)
+    assert sample.serialize(buffer=buffer) == sample.serialize()
+    assert AppendablePadded.deserialize(sample.serialize(buffer=buffer)) == sample
+
+
+def test_buffer_reuse_compiled():
+    Compiled = make_idl_struct("Padded", "Reuse.Padded", Padded.__annotations__)
+    Compiled.__idl__.use_compiled_machines()
+
+    sample = Compiled(a=1, b=2, c=3, d=4, e="x", f=5, g=6.0)
+    for use_version_2 in (False, True):
+        buffer = _dirty_buffer()
+        data = sample.serialize(buffer=buffer, use_version_2=use_version_2)
+        assert data == Padded(**sample.__dict__).serialize(use_version_2=use_version_2)
+
+
+def test_serialize_view():
+    sample = Padded(a=1, b=2, c=3, d=4, e="hello", f=5, g=6.0)
+    data = sample.serialize()
+
+    buffer = Buffer()
+    view = Padded.__idl__.serialize_view(sample, buffer=buffer)
+    assert isinstance(view, memoryview)
+    assert view == data
+    assert view.obj is buffer._bytes
+    view.release()
+
+    # The buffer is reused by the next serialization
+    Padded.__idl__.serialize_view(Padded(a=0, b=0, c=0, d=0, e="", f=0, g=0.0), buffer=buffer).release()
+    assert Padded.__idl__.serialize_view(sample, buffer=buffer) == data
+
+
+def test_buffer_view_deserialize():
+    sample = Padded(a=1, b=2, c=3, d=4, e="hello", f=5, g=6.0)
+    for use_version_2 in (False, True):
+        data = bytearray(sample.serialize(use_version_2=use_version_2))
+        buffer = Buffer.view(data, align_offset=4)
+        assert buffer._bytes.obj is data
+        assert Padded.deserialize(buffer) == sample
+
+    appendable = AppendablePadded(a=1, b=[2, 3], c=4)
+    assert AppendablePadded.deserialize(Buffer.view(appendable.serialize(), align_offset=4)) == appendable
+
+
+def test_buffer_view_ndarray_zero_copy():
+    numpy = pytest.importorskip("numpy")
+
+    Cloud = make_idl_struct("Cloud", "Reuse.Cloud", {"points": pt.sequence[pt.float32]},
+                            field_annotations={"points": {"ndarray": True}})
+    data = Cloud(points=numpy.arange(16, dtype=numpy.float32)).serialize()
+
+    received = Cloud.deserialize(Buffer.view(data, align_offset=4))
+    assert received.points.tolist() == list(range(16))
+    assert not received.points.flags.writeable
+    assert numpy.shares_memory(received.points, numpy.frombuffer(data, dtype=numpy.uint8))
@@ -0,0 +1,220 @@
+import pytest
+
+from dataclasses import dataclass
+from hashlib import md5
+
+from cyclonedds.idl import IdlStruct, make_idl_struct
+from cyclonedds.idl.annotations import appendable, key
+from cyclonedds.idl._support import Buffer, Endianness, CdrSerVMOpType
+from cyclonedds.idl._compiler import NativeProgram, NativeMachine, MachineCompiler
+import cyclonedds.idl.types as pt
+
+import support_modules.test_classes as tc
+from support_modules.testtopics import KeyedArrayType
+
+
+@dataclass
+class Mixed(IdlStruct, typename="Compiled.Mixed"):
+    a: pt.int8
+    b: pt.int32
+    c: pt.char
+    d: pt.array[pt.int16, 3]
+    e: str
+    f: pt.uint64
+    g: bool
+    h: pt.float32
+    i: pt.sequence[pt.int32]
+    j: pt.float64
+    key("b")
+
+
+@dataclass
+@appendable
+class AppendableMixed(IdlStruct, typename="Compiled.AppendableMixed"):
+    a: pt.int16
+    b: pt.int64
+    c: str
+    d: pt.uint8
+    e: pt.array[pt.float32, 2]
+
+
+mixed_values = [
+    Mixed(a=-3, b=1 << 20, c='x', d=[1, -2, 3], e="hello", f=2 ** 63, g=True, h=0.5, i=[4, 5, 6], j=-1.25),
+    Mixed(a=0, b=0, c='\0', d=[0, 0, 0], e="", f=0, g=False, h=0.0, i=[], j=0.0)
+]
+appendable_values = [
+    AppendableMixed(a=1, b=-2, c="three", d=4, e=[5.0, 6.5]),
+    AppendableMixed(a=0, b=0, c="", d=0, e=[0.0, 0.0])
+]
+primitive_values = [tc.AllPrimitives(), tc.Keyed(a=1, b=2), tc.SingleNested(tc.SingleInt(3))]
+
+
+def _compiled_copy(_type):
+    compiled = make_idl_struct(_type.__name__, _type.__idl_typename__, _type.__annotations__,
+                               field_annotations=_type.__idl_field_annotations__)
+    compiled.__idl_annotations__.update(_type.__idl_annotations__)
+    compiled.__idl__.use_compiled_machines()
+    return compiled
+
+
+@pytest.mark.parametrize("value", mixed_values + appendable_values + primitive_values)
+@pytest.mark.parametrize("endianness", [Endianness.Little, Endianness.Big])
+@pytest.mark.parametrize("use_version_2", [False, True])
+def test_compiled_byte_identical(value, endianness, use_version_2):
+    _type = type(value)
+    compiled = _compiled_copy(_type)
+    cvalue = compiled(**value.__dict__)
+
+    data = value.serialize(endianness=endianness, use_version_2=use_version_2)
+    assert compiled.__idl__.serialize(cvalue, endianness=endianness, use_version_2=use_version_2) == data
+    assert compiled.deserialize(data) == cvalue
+    assert compiled.__idl__.key(cvalue, use_version_2) == _type.__idl__.key(value, use_version_2)
+
+
+def test_compiled_machines_are_used():
+    compiled = _compiled_copy(Mixed)
+    compiled.__idl__.populate()
+    assert compiled.__idl__.v0_machine.source
+    assert compiled.__idl__.v2_machine.source
+
+    compiled.__idl__.use_compiled_machines(False)
+    assert not hasattr(compiled.__idl__.v0_machine, "source")
+
+
+def test_compiled_error_matches_interpreted():
+    compiled = _compiled_copy(Mixed)
+    value = compiled(**mixed_values[0].__dict__)
+    value.d = [1, 2]
+
+    with pytest.raises(Exception) as exc:
+        value.serialize()
+    assert "Failed to encode member d" in str(exc.value)
+
+
+def test_compiled_appendable_truncated():
+    compiled = _compiled_copy(AppendableMixed)
+    data = AppendableMixed(a=1, b=2, c="", d=0, e=[0.0, 0.0]).serialize(use_version_2=True)
+
+    # Chop off trailing members and fix up the dheader, missing members are default initialized
+    short = bytearray(data[:4 + 4 + 12])
+    short[4:8] = (12).to_bytes(4, "little" if data[1] & 1 else "big")
+    assert compiled.deserialize(bytes(short)) == compiled(a=1, b=2, c="", d=0, e=[0.0, 0.0])
+
+
+def test_native_program_export():
+    Mixed.__idl__.populate()
+    ops = NativeProgram.export(Mixed.__idl__.v2_machine, use_version_2=True)
+
+    assert [op.type for op in ops] == [
+        CdrSerVMOpType.StructBegin,
+        CdrSerVMOpType.Primitive,
+        CdrSerVMOpType.Primitive,
+        CdrSerVMOpType.Char,
+        CdrSerVMOpType.ArrayOfPrimitive,
+        CdrSerVMOpType.String,
+        CdrSerVMOpType.Primitive,
+        CdrSerVMOpType.Primitive,
+        CdrSerVMOpType.Primitive,
+        CdrSerVMOpType.SequenceOfPrimitive,
+        CdrSerVMOpType.Primitive,
+        CdrSerVMOpType.StructEnd
+    ]
+    assert ops[0].pytype is Mixed
+    # uint64 is aligned to 4 in XCDR2
+    assert ops[6].member == "f" and ops[6].align == 4
+    assert NativeProgram.export(Mixed.__idl__.v0_machine, use_version_2=False)[6].align == 8
+
+    AppendableMixed.__idl__.populate()
+    ops = NativeProgram.export(AppendableMixed.__idl__.v2_machine, use_version_2=True)
+    assert ops[1].type == CdrSerVMOpType.AppendableBegin and ops[-2].type == CdrSerVMOpType.AppendableEnd
+
+
+def test_native_program_unsupported():
+    # Enums and unions are left to the Python machines
+    for _type in (tc.SingleEnum, tc.SingleUnion):
+        _type.__idl__.populate()
+        assert NativeProgram.export(_type.__idl__.v0_machine, use_version_2=False) is None
+
+
+def test_native_byte_identical():
+    pytest.importorskip("cyclonedds._clayer")
+
+    for value in mixed_values + appendable_values + primitive_values:
+        compiled = _compiled_copy(type(value))
+        compiled.__idl__.populate()
+        assert isinstance(compiled.__idl__.v2_machine, NativeMachine)
+
+        cvalue = compiled(**value.__dict__)
+        for endianness in (Endianness.Little, Endianness.Big):
+            for use_version_2 in (False, True):
+                data = value.serialize(endianness=endianness, use_version_2=use_version_2)
+                assert compiled.__idl__.serialize(cvalue, endianness=endianness, use_version_2=use_version_2) == data
+                assert compiled.deserialize(data) == cvalue
+
+
+@dataclass
+@appendable
+class KeyedStrings(IdlStruct, typename="Compiled.KeyedStrings"):
+    a: pt.uint8
+    key("a")
+    name: pt.bounded_str[8]
+    key("name")
+    b: pt.float64
+    key("b")
+    inner: tc.Keyed
+    key("inner")
+    c: pt.char
+    key("c")
+    d: pt.array[pt.int16, 3]
+    key("d")
+    payload: pt.sequence[pt.uint8]
+
+
+def _machine_key(value, use_version_2):
+    idl = type(value).__idl__
+    buffer = Buffer()
+    buffer.set_endianness(Endianness.Big)
+    buffer._align_max = 4 if use_version_2 else 8
+    (idl.v2_machine if use_version_2 else idl.v0_machine).serialize(buffer, value, for_key=True)
+    return buffer.asbytes()
+
+
+@pytest.mark.parametrize("value", [
+    KeyedStrings(a=1, name="hello", b=2.5, inner=tc.Keyed(a=3, b=4), c='q', d=[1, 2, 3], payload=[1]),
+    KeyedStrings(a=0, name="", b=0.0, inner=tc.Keyed(a=0, b=0), c='\0', d=[0, 0, 0], payload=[]),
+    tc.Keyed(a=1, b=2), mixed_values[0]
+])
+@pytest.mark.parametrize("use_version_2", [False, True])
+def test_compiled_key(value, use_version_2):
+    idl = type(value).__idl__
+    idl.populate()
+    key_function = MachineCompiler.compile_key(idl.v2_machine if use_version_2 else idl.v0_machine, use_version_2)
+    assert key_function is not None
+    assert key_function(value) == _machine_key(value, use_version_2)
+    assert idl.key(value, use_version_2) == _machine_key(value, use_version_2)
+
+
+def test_compiled_key_fallback():
+    value = KeyedStrings(a=1, name="much too long", b=2.5, inner=tc.Keyed(a=3, b=4), c='q', d=[1, 2, 3], payload=[])
+    with pytest.raises(Exception, match="Failed to encode member name"):
+        KeyedStrings.__idl__.key(value)
+
+    # Keys that are not made of primitives and strings keep using the machines
+    KeyedArrayType.__idl__.populate()
+    assert MachineCompiler.compile_key(KeyedArrayType.__idl__.v0_machine, False) is None
+
+
+def test_keyhash_md5():
+    value = KeyedStrings(a=1, name="hello", b=2.5, inner=tc.Keyed(a=3, b=4), c='q', d=[1, 2, 3], payload=[])
+    assert KeyedStrings.__idl__.keyhash(value) == md5(_machine_key(value, True)).digest()
+    assert KeyedStrings.__idl__.keyhash(value) == md5(_machine_key(value, True)).digest()
+    assert tc.Keyed.__idl__.keyhash(tc.Keyed(a=1, b=2)) == _machine_key(tc.Keyed(a=1, b=2), True).ljust(16, b'\0')
+
+
+def test_key_sample():
+    sample = tc.Keyed.__idl__.key_sample(a=5)
+    assert sample == tc.Keyed(a=5, b=0)
+    with pytest.raises(TypeError):
+        tc.Keyed.__idl__.key_sample(b=5)
+    with pytest.raises(TypeError):
+        tc.AllPrimitives.__idl__.key_sample(a=5)
@@ -0,0 +1,140 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from cyclonedds.dispatch import ListenerDispatcher, Overflow
+
+
+def test_dispatch_order_per_entity():
+    seen = {1: [], 2: []}
+    done = threading.Event()
+
+    def callback(key, i):
+        seen[key].append(i)
+        if len(seen[1]) + len(seen[2]) == 40:
+            done.set()
+
+    with ListenerDispatcher(workers=4, queue_size=100) as dispatcher:
+        for i in range(20):
+            dispatcher.submit(1, "on_sample_lost", callback, 1, i)
+            dispatcher.submit(2, "on_sample_lost", callback, 2, i)
+        assert done.wait(5)
+
+    assert seen == {1: list(range(20)), 2: list(range(20))}
+    metrics = dispatcher.metrics()
+    assert metrics[1].dispatched == metrics[2].dispatched == 20
+    assert metrics[1].depth == 0 and metrics[1].max_depth >= 1
+
+
+def test_dispatch_coalesce_and_drop():
+    gate = threading.Event()
+    calls = []
+
+    with ListenerDispatcher(workers=1, queue_size=2, overflow=Overflow.DropOldest) as dispatcher:
+        dispatcher.submit(1, "block", gate.wait)
+        time.sleep(0.1)
+        # The first is running, the rest are queued behind it
+        for _ in range(5):
+            dispatcher.submit(1, "on_data_available", calls.append, "data")
+        dispatcher.submit(1, "on_sample_lost", calls.append, "lost-1")
+        dispatcher.submit(1, "on_sample_lost", calls.append, "lost-2")
+        gate.set()
+
+    assert calls == ["lost-1", "lost-2"]
+    metrics = dispatcher.metrics()[1]
+    assert metrics.coalesced == 4
+    assert metrics.dropped == 1
+    assert metrics.dispatched == 3
+
+
+def test_dispatch_drop_newest():
+    gate = threading.Event()
+    calls = []
+
+    with ListenerDispatcher(workers=1, queue_size=1, overflow=Overflow.DropNewest) as dispatcher:
+        dispatcher.submit(1, "block", gate.wait)
+        time.sleep(0.1)
+        assert dispatcher.submit(1, "on_sample_lost", calls.append, 1)
+        assert not dispatcher.submit(1, "on_sample_lost", calls.append, 2)
+        gate.set()
+
+    assert calls == [1]
+
+
+def test_dispatch_block():
+    gate = threading.Event()
+    calls = []
+
+    with ListenerDispatcher(workers=1, queue_size=1, overflow=Overflow.Block) as dispatcher:
+        dispatcher.submit(1, "block", gate.wait)
+        time.sleep(0.1)
+        dispatcher.submit(1, "on_sample_lost", calls.append, 1)
+
+        blocked = threading.Thread(target=dispatcher.submit, args=(1, "on_sample_lost", calls.append, 2))
+        blocked.start()
+        blocked.join(0.2)
+        assert blocked.is_alive()
+
+        gate.set()
+        blocked.join(5)
+        assert not blocked.is_alive()
+
+    assert calls == [1, 2]
+
+
+def test_dispatch_errors_and_latency():
+    def fail():
+        raise RuntimeError("listener failed")
+
+    with ListenerDispatcher() as dispatcher:
+        dispatcher.submit(7, "on_sample_lost", fail)
+        dispatcher.submit(7, "on_sample_lost", time.sleep, 0.01)
+
+    metrics = dispatcher.metrics()[7]
+    assert metrics.errors == 1 and metrics.dispatched == 2
+    assert metrics.max_latency_ns >= 10_000_000
+    assert metrics.mean_latency_ns > 0
+
+    assert not dispatcher.submit(7, "on_sample_lost", fail)
+
+
+def test_dispatch_asyncio():
+    async def main():
+        loop = asyncio.get_running_loop()
+        dispatcher = ListenerDispatcher(loop=loop)
+        received = asyncio.Queue()
+
+        async def handler(value):
+            await received.put((value, asyncio.get_running_loop() is loop))
+
+        threading.Thread(target=dispatcher.submit, args=(1, "on_sample_lost", handler, "x")).start()
+        assert await asyncio.wait_for(received.get(), 5) == ("x", True)
+        dispatcher.close()
+
+    asyncio.run(main())
+
+
+def test_dispatch_invalid():
+    with pytest.raises(ValueError):
+        ListenerDispatcher(queue_size=0)
+    with pytest.raises(ValueError):
+        ListenerDispatcher(workers=0)
+
+
+def test_dispatch_forget_deleted_entities():
+    gate = threading.Event()
+
+    with ListenerDispatcher(workers=1) as dispatcher:
+        dispatcher.submit(1, "on_sample_lost", lambda: None)
+        dispatcher.submit(2, "block", gate.wait)
+        time.sleep(0.1)
+        dispatcher.forget(1)
+        dispatcher.forget(2)
+        dispatcher.forget(3)
+        # Entity 2 is still busy, its queue goes once it is idle
+        assert list(dispatcher.metrics()) == [2]
+        gate.set()
+
+    assert dispatcher.metrics() == {}
@@ -0,0 +1,156 @@
+import pytest
+
+from dataclasses import dataclass
+
+from cyclonedds.idl import IdlStruct
+from cyclonedds.idl.annotations import appendable
+from cyclonedds.idl._filter import FilterExpression, _run
+from cyclonedds.idl._support import Endianness
+import cyclonedds.idl.types as pt
+
+
+@dataclass
+class Inner(IdlStruct, typename="Filter.Inner"):
+    level: pt.uint8
+
+
+@dataclass
+class Sample(IdlStruct, typename="Filter.Sample"):
+    id: pt.int16
+    count: pt.uint64
+    speed: pt.float32
+    ratio: pt.float64
+    active: bool
+    grade: pt.char
+    axes: pt.array[pt.int32, 3]
+    inner: Inner
+    name: str
+    history: pt.sequence[pt.int32]
+
+
+@dataclass
+@appendable
+class Extended(IdlStruct, typename="Filter.Appendable"):
+    a: pt.int32
+    b: pt.float64
+
+
+@dataclass
+@appendable
+class Original(IdlStruct, typename="Filter.Appendable"):
+    a: pt.int32
+
+
+samples = [
+    Sample(1, 0, 12.5, -0.25, True, 'a', [0, -1, 2], Inner(3), "one", []),
+    Sample(-7, 2 ** 64 - 1, 40.0, 3.5, False, 'b', [5, 5, 5], Inner(0), "two", [1, 2]),
+    Sample(300, 17, -3.0, 0.0, True, 'z', [-9, 0, 9], Inner(255), "three", [3]),
+]
+
+
+@pytest.mark.parametrize("expression", [
+    "id == 1",
+    "id > 0 and speed >= 12.5",
+    "count in (0, 17) or ratio < 0",
+    f"count == {2 ** 64 - 1}",
+    "not active",
+    "active and grade == 'a'",
+    "grade not in ('a', 'z')",
+    "axes[1] < 0 or axes[2] == 5",
+    "-10 < id < 100",
+    "1.0 > ratio",
+    "speed != 40 and (id < 0 or count > 10)",
+])
+def test_filter_expression_program(expression):
+    expr = FilterExpression(Sample, expression)
+    assert expr.programs is not None
+
+    for sample in samples:
+        expected = eval(expression, {}, {k: getattr(sample, k) for k in sample.__dataclass_fields__})
+        assert expr.matches(sample) == expected
+        for use_version_2 in (False, True):
+            for endianness in (Endianness.Little, Endianness.Big):
+                data = sample.serialize(use_version_2=use_version_2, endianness=endianness)
+                assert _run(expr.programs[1 if use_version_2 else 0], data) == expected
+                assert expr.evaluate(data) == expected
+
+
+@pytest.mark.parametrize("expression", [
+    "name == 'two'",
+    "inner.level > 2",
+    "id > 0 and name != 'one'",
+    "axes[2] in history",
+])
+def test_filter_expression_fallback(expression):
+    expr = FilterExpression(Sample, expression)
+    assert expr.programs is None
+
+    for sample in samples:
+        assert expr.evaluate(sample.serialize()) == expr.matches(sample)
+
+
+def test_filter_expression_nested_member():
+    # Nested members are not compiled, even when the nested struct has a fixed layout
+    expr = FilterExpression(Sample, "inner.level > 2 and id > 0")
+    assert expr.programs is None
+    assert [expr.evaluate(s.serialize()) for s in samples] == [True, False, True]
+    assert FilterExpression(Sample, "id > 0").programs is not None
+
+
+def test_filter_expression_appendable_default():
+    expr = FilterExpression(Extended, "a == 4 and b == 0.0")
+    assert expr.programs is not None
+
+    assert expr.evaluate(Original(a=4).serialize(use_version_2=True))
+    assert not expr.evaluate(Extended(a=4, b=1.0).serialize(use_version_2=True))
+
+
+def test_filter_expression_truncated():
+    expr = FilterExpression(Sample, "count > 0")
+    data = samples[1].serialize()
+    assert expr.evaluate(data)
+    assert not expr.evaluate(data[:8])
+    assert not expr.evaluate(data[:2])
+
+
+@pytest.mark.parametrize("expression", [
+    "id ==",
+    "unknown > 1",
+    "len(name) > 2",
+    "id + 1 > 2",
+    "inner.__class__ == 1",
+    "[x for x in history]",
+])
+def test_filter_expression_invalid(expression):
+    with pytest.raises(ValueError):
+        FilterExpression(Sample, expression)
+
+
+def test_filter_expression_parameters():
+    expr = FilterExpression(Sample, "speed >= %0 and id in %1 and grade != '%'", [12.5, (1, 300)])
+    assert expr.programs is not None
+    assert expr.parameters == (12.5, (1, 300))
+    assert [expr.evaluate(s.serialize()) for s in samples] == [True, False, False]
+    assert [expr.matches(s) for s in samples] == [True, False, False]
+
+    expr.set_parameters([-5, [300]])
+    assert [expr.evaluate(s.serialize()) for s in samples] == [False, False, True]
+
+    # A parameter that cannot be compared natively falls back to Python
+    expr = FilterExpression(Sample, "%0 == name", ["two"])
+    assert expr.programs is None
+    assert [expr.evaluate(s.serialize()) for s in samples] == [False, True, False]
+
+    expr.set_parameters(["three"])
+    assert [expr.evaluate(s.serialize()) for s in samples] == [False, False, True]
+
+
+def test_filter_expression_missing_parameters():
+    with pytest.raises(ValueError):
+        FilterExpression(Sample, "id == %1", [1])
+    with pytest.raises(ValueError):
+        FilterExpression(Sample, "id == %name")
+
+    expr = FilterExpression(Sample, "id == %0", [1])
+    with pytest.raises(ValueError):
+        expr.set_parameters([])
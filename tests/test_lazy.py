@@ -0,0 +1,96 @@
+import pytest
+
+from dataclasses import dataclass
+
+from cyclonedds.idl import IdlStruct
+from cyclonedds.idl.annotations import appendable, mutable, key
+from cyclonedds.idl._support import Endianness
+import cyclonedds.idl.types as pt
+
+
+@dataclass
+class Telemetry(IdlStruct, typename="Lazy.Telemetry"):
+    id: pt.int16
+    key("id")
+    flag: bool
+    c: pt.char
+    ts: pt.int64
+    pose: pt.array[pt.float32, 3]
+    name: str
+    tail: pt.uint8
+
+
+@dataclass
+@appendable
+class AppendableTelemetry(IdlStruct, typename="Lazy.AppendableTelemetry"):
+    id: pt.int16
+    value: pt.float64
+    name: str
+
+
+@dataclass
+@mutable
+class MutableTelemetry(IdlStruct, typename="Lazy.MutableTelemetry"):
+    id: pt.int16
+    value: pt.float64
+
+
+telemetry = Telemetry(id=7, flag=True, c='q', ts=-2 ** 40, pose=[0.5, 1.5, -2.0], name="abc", tail=9)
+
+
+@pytest.mark.parametrize("use_version_2", [False, True])
+@pytest.mark.parametrize("endianness", [Endianness.Little, Endianness.Big])
+def test_lazy_prefix(use_version_2, endianness):
+    data = telemetry.serialize(use_version_2=use_version_2, endianness=endianness)
+    lazy = Telemetry.__idl__.deserialize_lazy(data, sample_info="info")
+
+    assert lazy.id == 7
+    assert lazy.flag is True
+    assert lazy.c == 'q'
+    assert lazy.ts == -2 ** 40
+    assert lazy.pose == [0.5, 1.5, -2.0]
+    assert lazy.sample_info == "info"
+    assert lazy.__dict__['_lazy_sample'] is None
+
+    assert lazy.tail == 9
+    assert lazy.__dict__['_lazy_sample'] is not None
+    assert lazy.name == "abc"
+    assert lazy == telemetry
+    assert lazy.decode().sample_info == "info"
+
+
+def test_lazy_layout_stops_at_variable_member():
+    layout = Telemetry.__idl__.lazy_layout(True)
+    assert list(layout.members) == ["id", "flag", "c", "ts", "pose"]
+    assert Telemetry.__idl__.lazy_layout(False).members["ts"][0] == 4 + 8
+
+
+def test_lazy_appendable():
+    sample = AppendableTelemetry(id=3, value=2.5, name="x")
+    lazy = AppendableTelemetry.__idl__.deserialize_lazy(sample.serialize(use_version_2=True))
+    assert lazy.value == 2.5
+    assert lazy.__dict__['_lazy_sample'] is None
+    assert lazy == sample
+
+    # Data from an older type version that lacks members falls back to the machine
+    @dataclass
+    @appendable
+    class Old(IdlStruct, typename="Lazy.AppendableTelemetry"):
+        id: pt.int16
+
+    lazy = AppendableTelemetry.__idl__.deserialize_lazy(Old(id=3).serialize(use_version_2=True))
+    assert lazy.id == 3
+    assert lazy.value == 0.0
+
+
+def test_lazy_mutable():
+    sample = MutableTelemetry(id=3, value=2.5)
+    lazy = MutableTelemetry.__idl__.deserialize_lazy(sample.serialize())
+    assert lazy.value == 2.5
+    assert lazy == sample
+
+
+def test_lazy_unknown_attribute():
+    lazy = Telemetry.__idl__.deserialize_lazy(telemetry.serialize())
+    with pytest.raises(AttributeError):
+        lazy.does_not_exist
@@ -1,6 +1,9 @@
 import pytest
 
+import threading
+
 from cyclonedds.core import Listener, Qos, Policy
+from cyclonedds.dispatch import ListenerDispatcher
 from cyclonedds.util import duration, timestamp
 from cyclonedds.domain import DomainParticipant
 from cyclonedds.pub import Publisher, DataWriter
@@ -20,6 +23,24 @@ def test_on_data_available(manual_setup, hitpoint):
     assert hitpoint.was_hit()
 
 
+def test_on_data_available_dispatched(manual_setup, hitpoint):
+    threads = []
+
+    def on_data_available(reader):
+        threads.append(threading.current_thread().name)
+        hitpoint.hit()
+
+    with ListenerDispatcher(workers=2) as dispatcher:
+        listener = Listener(dispatcher=dispatcher, on_data_available=on_data_available)
+        dr = manual_setup.dr(listener=listener)
+        manual_setup.dw().write(manual_setup.msg)
+
+        assert hitpoint.was_hit()
+        assert threads[0].startswith("cyclonedds-listener-")
+        assert dispatcher.metrics()[dr._ref].dispatched >= 1
+        assert listener.copy().dispatcher is dispatcher
+
+
 def test_data_available_listeners(manual_setup, hitpoint_factory):
     hpf = hitpoint_factory
 
@@ -0,0 +1,128 @@
+import pytest
+import array as pyarray
+
+from dataclasses import dataclass
+
+from cyclonedds.idl import IdlStruct, make_idl_struct
+from cyclonedds.idl.annotations import ndarray
+from cyclonedds.idl._support import Endianness
+import cyclonedds.idl.types as pt
+
+numpy = pytest.importorskip("numpy")
+
+
+@dataclass
+class Cloud(IdlStruct, typename="NdArray.Cloud"):
+    id: pt.int16
+    points: pt.sequence[pt.float32]
+    ndarray("points")
+    pose: pt.array[pt.float64, 3]
+    ndarray("pose")
+    mask: pt.array[pt.uint8, 4]
+    ndarray("mask")
+    ids: pt.sequence[pt.int64, 8]
+    ndarray("ids")
+
+
+@dataclass
+class ListCloud(IdlStruct, typename="NdArray.ListCloud"):
+    id: pt.int16
+    points: pt.sequence[pt.float32]
+    pose: pt.array[pt.float64, 3]
+    mask: pt.array[pt.uint8, 4]
+    ids: pt.sequence[pt.int64, 8]
+
+
+def _clouds():
+    points = [0.5, -1.0, 2.25, 1e6]
+    cloud = Cloud(
+        id=3,
+        points=numpy.array(points, dtype=numpy.float32),
+        pose=numpy.array([1.0, 2.0, 3.0]),
+        mask=numpy.array([1, 2, 3, 4], dtype=numpy.uint8),
+        ids=numpy.array([-1, 2**40], dtype=numpy.int64)
+    )
+    list_cloud = ListCloud(id=3, points=points, pose=[1.0, 2.0, 3.0], mask=bytes([1, 2, 3, 4]), ids=[-1, 2**40])
+    return cloud, list_cloud
+
+
+def _assert_equal(a, b):
+    assert a.id == b.id
+    for name in ("points", "pose", "mask", "ids"):
+        assert numpy.array_equal(getattr(a, name), getattr(b, name))
+
+
+@pytest.mark.parametrize("endianness", [Endianness.Little, Endianness.Big])
+@pytest.mark.parametrize("use_version_2", [False, True])
+def test_ndarray_byte_identical(endianness, use_version_2):
+    cloud, list_cloud = _clouds()
+
+    data = cloud.serialize(endianness=endianness, use_version_2=use_version_2)
+    assert data == list_cloud.serialize(endianness=endianness, use_version_2=use_version_2)
+    _assert_equal(Cloud.deserialize(data), cloud)
+
+
+def test_ndarray_deserialize_is_view():
+    cloud, _ = _clouds()
+    received = Cloud.deserialize(cloud.serialize(endianness=Endianness.Big))
+
+    assert isinstance(received.points, numpy.ndarray)
+    assert not received.points.flags.owndata
+    assert received.points.dtype == numpy.dtype('>f4')
+    assert received.points.tolist() == cloud.points.tolist()
+
+
+def test_ndarray_serialize_from_buffer_protocol():
+    cloud, _ = _clouds()
+    data = cloud.serialize()
+
+    cloud.points = pyarray.array('f', cloud.points.tolist())
+    cloud.pose = memoryview(pyarray.array('d', [1.0, 2.0, 3.0]))
+    cloud.mask = bytes([1, 2, 3, 4])
+    cloud.ids = [-1, 2**40]
+    assert cloud.serialize() == data
+
+    # Multidimensional arrays are written in C order
+    cloud.points = numpy.array([[0.5, -1.0], [2.25, 1e6]], dtype=numpy.float32)
+    assert cloud.serialize() == data
+
+
+def test_ndarray_size_checks():
+    cloud, _ = _clouds()
+
+    cloud.pose = numpy.zeros(4)
+    with pytest.raises(Exception):
+        cloud.serialize()
+
+    cloud.pose = numpy.zeros(3)
+    cloud.ids = numpy.zeros(9, dtype=numpy.int64)
+    with pytest.raises(Exception):
+        cloud.serialize()
+
+
+def test_ndarray_default_initialize():
+    Cloud.__idl__.populate()
+    default = Cloud.__idl__.v0_machine.default_initialize()
+
+    assert default.points.dtype == numpy.float32 and len(default.points) == 0
+    assert numpy.array_equal(default.pose, numpy.zeros(3))
+
+
+def test_ndarray_compiled():
+    cloud, _ = _clouds()
+    Compiled = make_idl_struct("Cloud", "NdArray.Cloud", Cloud.__annotations__,
+                               field_annotations=Cloud.__idl_field_annotations__)
+    Compiled.__idl__.use_compiled_machines()
+    compiled = Compiled(**cloud.__dict__)
+
+    data = cloud.serialize()
+    assert compiled.serialize() == data
+    _assert_equal(Compiled.deserialize(data), cloud)
+
+
+def test_ndarray_not_primitive():
+    Invalid = make_idl_struct("Invalid", "NdArray.Invalid", {"names": pt.sequence[str]},
+                              field_annotations={"names": {"ndarray": True}})
+
+    with pytest.raises(TypeError):
+        Invalid.__idl__.populate()
@@ -1,7 +1,14 @@
 import pytest
 
+from dataclasses import dataclass
+
 from cyclonedds.core import Entity, QueryCondition, SampleState, InstanceState, ViewState
+from cyclonedds.idl import IdlStruct
+from cyclonedds.pub import DataWriter
+from cyclonedds.sub import DataReader
+from cyclonedds.topic import Topic
 from cyclonedds.util import isgoodentity
+import cyclonedds.idl.types as pt
 
 from support_modules.testtopics import Message
 
@@ -58,3 +65,39 @@ def test_querycondition_read(common_setup):
     received = common_setup.dr.read(condition=qc)
 
     assert len(received) == 1 and received[0] == messages[5]
+
+
+@dataclass
+class Reading(IdlStruct, typename="QueryCondition.Reading"):
+    sensor: pt.int32
+    value: pt.float64
+    unit: str
+
+
+@pytest.mark.parametrize("where, expected", [
+    ("value > 20.0 and sensor in (1, 3)", [3]),
+    ("unit == 'C' and value > 20.0", [2, 3]),
+])
+def test_querycondition_where(common_setup, where, expected):
+    tp = Topic(common_setup.dp, "Reading", Reading)
+    dw = DataWriter(common_setup.dp, tp, qos=common_setup.qos)
+    dr = DataReader(common_setup.dp, tp, qos=common_setup.qos)
+    qc = QueryCondition(dr, SampleState.Any | ViewState.Any | InstanceState.Any, where=where)
+    assert qc.expression.expression == where
+
+    readings = [Reading(1, 10.0, "C"), Reading(2, 25.0, "C"), Reading(3, 30.0, "C"), Reading(4, 40.0, "F")]
+    for reading in readings:
+        dw.write(reading)
+
+    dr.read(N=4)
+    assert [r.sensor for r in dr.read(N=4, condition=qc)] == expected
+
+
+def test_querycondition_filter_or_where(common_setup):
+    mask = SampleState.Any | InstanceState.Any | ViewState.Any
+    with pytest.raises(TypeError):
+        QueryCondition(common_setup.dr, mask)
+    with pytest.raises(TypeError):
+        QueryCondition(common_setup.dr, mask, lambda x: False, where="message == 'hi'")
+    with pytest.raises(ValueError):
+        QueryCondition(common_setup.dr, mask, where="sender == 'hi'")
@@ -0,0 +1,156 @@
+import asyncio
+import threading
+
+import pytest
+
+from cyclonedds.core import Qos, Policy
+from cyclonedds.domain import DomainParticipant
+from cyclonedds.pub import DataWriter
+from cyclonedds.sub import DataReader
+from cyclonedds.topic import Topic
+from cyclonedds.reactor import Reactor
+from cyclonedds.util import duration
+
+from support_modules.testtopics import Message
+
+
+qos = Qos(Policy.Reliability.Reliable(duration(seconds=2)), Policy.History.KeepAll)
+
+
+def make_pairs(dp, n):
+    pairs = []
+    for i in range(n):
+        tp = Topic(dp, f"Reactor{i}", Message)
+        pairs.append((DataWriter(dp, tp, qos=qos), DataReader(dp, tp, qos=qos)))
+    return pairs
+
+
+def test_reactor_many_readers():
+    dp = DomainParticipant(0)
+    pairs = make_pairs(dp, 20)
+    received = {i: [] for i in range(len(pairs))}
+    done = threading.Event()
+    lock = threading.Lock()
+
+    def callback_for(i):
+        def callback(samples):
+            assert len(samples) <= 4
+            with lock:
+                received[i].extend(s.message for s in samples)
+                if sum(len(r) for r in received.values()) == 10 * len(pairs):
+                    done.set()
+        return callback
+
+    reactor = Reactor(dp, threads=3)
+    registrations = [reactor.register(dr, callback_for(i), batch_size=4) for i, (_, dr) in enumerate(pairs)]
+    with reactor:
+        for i, (dw, _) in enumerate(pairs):
+            for j in range(10):
+                dw.write(Message(message=f"{i}-{j}"))
+        assert done.wait(10)
+
+    assert all(received[i] == [f"{i}-{j}" for j in range(10)] for i in received)
+    assert all(r.samples == 10 and r.batches >= 3 for r in registrations)
+
+
+def test_reactor_run_forever_and_unregister():
+    dp = DomainParticipant(0)
+    (dw, dr), (dw2, dr2) = make_pairs(dp, 2)
+    reactor = Reactor(dp)
+    received = []
+
+    def callback(samples):
+        received.extend(samples)
+        reactor.stop()
+
+    reactor.register(dr, callback)
+    registration = reactor.register(dr2, received.extend)
+    with pytest.raises(ValueError):
+        reactor.register(dr, callback)
+    reactor.unregister(registration)
+    assert [r.reader for r in reactor.registrations()] == [dr]
+
+    dw2.write(Message(message="ignored"))
+    dw.write(Message(message="hi"))
+    reactor.run_forever()
+
+    assert received == [Message(message="hi")]
+
+
+def test_reactor_callback_errors():
+    dp = DomainParticipant(0)
+    ((dw, dr),) = make_pairs(dp, 1)
+    done = threading.Event()
+
+    def callback(samples):
+        done.set()
+        raise RuntimeError("callback failed")
+
+    reactor = Reactor(dp)
+    registration = reactor.register(dr, callback)
+    with reactor:
+        dw.write(Message(message="hi"))
+        assert done.wait(5)
+    assert registration.errors == 1
+
+
+def test_reactor_unregister_deletes_condition():
+    dp = DomainParticipant(0)
+    ((dw, dr),) = make_pairs(dp, 1)
+    reactor = Reactor(dp)
+    children = len(dr.children)
+    for _ in range(3):
+        reactor.unregister(reactor.register(dr, print))
+    assert len(dr.children) == children
+
+
+def test_reactor_reader_errors():
+    dp = DomainParticipant(0)
+    (dw, dr), (dw2, dr2) = make_pairs(dp, 2)
+    failed, done = threading.Event(), threading.Event()
+
+    def broken(**kwargs):
+        failed.set()
+        raise RuntimeError("reader failed")
+
+    dr.take = broken
+    reactor = Reactor(dp, threads=1)
+    failing = reactor.register(dr, print)
+    reactor.register(dr2, lambda samples: done.set())
+    with reactor:
+        dw.write(Message(message="lost"))
+        assert failed.wait(5)
+        dw2.write(Message(message="hi"))
+        # The thread survives the failing reader and keeps serving the other one
+        assert done.wait(5)
+    assert failing.errors == 1
+    assert [r.reader for r in reactor.registrations()] == [dr2]
+
+
+def test_reactor_asyncio():
+    dp = DomainParticipant(0)
+    pairs = make_pairs(dp, 3)
+    reactor = Reactor(dp, threads=2)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        received = asyncio.Queue()
+
+        async def callback(samples):
+            assert asyncio.get_running_loop() is loop
+            for sample in samples:
+                await received.put(sample.message)
+
+        for _, dr in pairs:
+            reactor.register(dr, callback)
+        task = asyncio.ensure_future(reactor.run_async())
+
+        for i, (dw, _) in enumerate(pairs):
+            dw.write(Message(message=str(i)))
+        messages = {await asyncio.wait_for(received.get(), 5) for _ in pairs}
+
+        reactor.stop()
+        await asyncio.wait_for(task, 5)
+        return messages
+
+    assert asyncio.run(main()) == {"0", "1", "2"}
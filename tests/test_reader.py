@@ -1,5 +1,8 @@
 import pytest
+import asyncio
+import threading
 
+from cyclonedds.core import Qos, Policy, ReadCondition, SampleState, ViewState, InstanceState
 from cyclonedds.domain import Domain, DomainParticipant
 from cyclonedds.topic import Topic
 from cyclonedds.sub import Subscriber, DataReader
@@ -132,6 +135,114 @@ def test_reader_takeiter():
         read = True
 
 
+def test_reader_takeiter_batches():
+    dp = DomainParticipant(0)
+    tp = Topic(dp, "Message", Message)
+    qos = Qos(Policy.History.KeepLast(10))
+    dr = DataReader(dp, tp, qos=qos)
+    dw = DataWriter(dp, tp, qos=qos)
+
+    for i in range(5):
+        dw.write(Message(f"Hi {i}"))
+
+    batches = [[m.message for m in batch]
+               for batch in dr.read_iter(timeout=duration(milliseconds=10), batch_size=2, batches=True)]
+    assert batches == [["Hi 0", "Hi 1"], ["Hi 2", "Hi 3"], ["Hi 4"]]
+
+    taken = [m.message for m in dr.take_iter(condition=ReadCondition(dr, SampleState.Any),
+                                             timeout=duration(milliseconds=10), batch_size=3)]
+    assert taken == [f"Hi {i}" for i in range(5)]
+
+
+def test_reader_iter_reuses_entities():
+    dp = DomainParticipant(0)
+    tp = Topic(dp, "Message", Message)
+    dr = DataReader(dp, tp)
+    dw = DataWriter(dp, tp)
+
+    dw.write(Message("Hello"))
+    assert dr.take_one(timeout=duration(milliseconds=10)) == Message("Hello")
+    children = len(dr.children)
+    dw.write(Message("World"))
+    assert dr.take_one(timeout=duration(milliseconds=10)) == Message("World")
+    assert len(dr.children) == children == 1
+
+    condition = ReadCondition(dr, SampleState.Any | ViewState.Any | InstanceState.Any)
+    waitsets = len(dp.children)
+    for text in ("Hello", "World"):
+        dw.write(Message(text))
+        assert dr.take_one(condition=condition, timeout=duration(milliseconds=10)) == Message(text)
+        assert len(dp.children) == waitsets + 1
+    assert dr._iter_waitsets[condition._ref][0].get_entities() == []
+
+    # The pooled WaitSet goes away with the condition
+    del condition
+    assert len(dr._iter_waitsets) == 1
+    assert len(dp.children) == waitsets
+
+
+def test_reader_takeaiter():
+    dp = DomainParticipant(0)
+    tp = Topic(dp, "Message", Message)
+    dr = DataReader(dp, tp)
+    dw = DataWriter(dp, tp)
+
+    async def collect():
+        received = []
+        async for msgr in dr.take_aiter(timeout=duration(milliseconds=100)):
+            received.append(msgr)
+        return received
+
+    async def run():
+        task = asyncio.ensure_future(collect())
+        await asyncio.sleep(0.02)
+        dw.write(Message("Hello"))
+        await asyncio.sleep(0.02)
+        dw.write(Message("World"))
+        return await task
+
+    assert [m.message for m in asyncio.run(run())] == ["Hello", "World"]
+
+
+def test_reader_take_batches():
+    dp = DomainParticipant(0)
+    tp = Topic(dp, "Message", Message)
+    dr = DataReader(dp, tp, qos=Qos(Policy.History.KeepLast(10)))
+    dw = DataWriter(dp, tp, qos=Qos(Policy.History.KeepLast(10)))
+
+    for i in range(5):
+        dw.write(Message(f"Hi {i}"))
+
+    async def run():
+        batches = []
+        async for batch in dr.take_batches(2, timeout=duration(milliseconds=10)):
+            batches.append([m.message for m in batch])
+        return batches
+
+    assert asyncio.run(run()) == [["Hi 0", "Hi 1"], ["Hi 2", "Hi 3"], ["Hi 4"]]
+
+
+def test_reader_aiter_shared_waiter():
+    dp = DomainParticipant(0)
+    tp = Topic(dp, "Message", Message)
+    readers = [DataReader(dp, tp) for _ in range(3)]
+    dw = DataWriter(dp, tp)
+
+    async def first(dr):
+        async for msgr in dr.take_aiter(timeout=duration(seconds=1)):
+            return msgr
+
+    async def run():
+        tasks = [asyncio.ensure_future(first(dr)) for dr in readers]
+        await asyncio.sleep(0.02)
+        dw.write(Message("Hello"))
+        return await asyncio.gather(*tasks)
+
+    threads = threading.active_count()
+    assert [m.message for m in asyncio.run(run())] == ["Hello"] * 3
+    assert threading.active_count() <= threads + 1
+
+
 def _make_reader_without_saving_deps():
     tp = Topic(DomainParticipant(0), "Message", Message)
     return DataReader(Subscriber(tp.participant), tp)
@@ -167,3 +278,78 @@ def test_reader_wrong_usage_errors():
 
     with pytest.raises(TypeError):
         DataReader(dp, tp, listener=False)
+
+
+def test_reader_lazy():
+    dp = DomainParticipant(0)
+    tp = Topic(dp, "Message", Message)
+    dw = DataWriter(dp, tp)
+    dr = DataReader(dp, tp)
+
+    msg = Message(message="lazy")
+    dw.write(msg)
+
+    samples = dr.read(lazy=True)
+    assert len(samples) == 1
+    assert samples[0].sample_info.valid_data
+    assert samples[0].message == "lazy"
+    assert samples[0] == msg
+
+    samples = dr.take(lazy=True)
+    assert samples[0].decode() == msg
+    assert samples[0].decode().sample_info == samples[0].sample_info
+
+
+def test_reader_batch():
+    dp = DomainParticipant(0)
+    tp = Topic(dp, "Message", Message)
+    dw = DataWriter(dp, tp)
+    dr = DataReader(dp, tp)
+
+    messages = [Message(message=f"batch {i}" * i) for i in range(5)]
+    for msg in messages:
+        dw.write(msg)
+
+    batch = dr.read_batch(N=10)
+    assert len(batch) == 5
+    assert bytes(batch[0]) == batch.data[:batch.offsets[1]]
+    assert [Message.deserialize(batch[i]) for i in range(len(batch))] == messages
+    assert all(batch.valid_data(i) for i in range(len(batch)))
+    assert list(batch.samples()) == messages
+    assert [s.message for s in batch.samples(lazy=True)] == [m.message for m in messages]
+
+    read = dr.read(N=10)
+    assert batch.sample_info(4) == read[4].sample_info
+
+    batch = dr.take_batch(N=10)
+    assert len(batch) == 5
+    assert len(dr.take_batch(N=10)) == 0
+
+
+def test_reader_loan():
+    dp = DomainParticipant(0)
+    tp = Topic(dp, "Message", Message)
+    dw = DataWriter(dp, tp)
+    dr = DataReader(dp, tp)
+
+    msg = Message(message="loaned")
+    dw.write(msg)
+
+    loans = dr.read_loan()
+    assert len(loans) == 1
+    assert loans[0].decode() == msg
+    assert loans[0].decode(lazy=False).sample_info == loans[0].sample_info
+
+    view = loans[0].data
+    assert Message.deserialize(bytes(view)) == msg
+    with pytest.raises(BufferError):
+        loans[0].release()
+    view.release()
+    loans[0].release()
+    assert loans[0].loan.released
+    with pytest.raises(ValueError):
+        loans[0].data
+
+    with dr.take_loan()[0] as loan:
+        assert loan.decode() == msg
+    assert len(dr.read()) == 0
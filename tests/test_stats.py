@@ -0,0 +1,67 @@
+import pytest
+
+from cyclonedds import stats
+from cyclonedds.domain import DomainParticipant
+from cyclonedds.topic import Topic
+from cyclonedds.sub import DataReader
+from cyclonedds.pub import DataWriter
+from cyclonedds.idl._main import IDL
+from cyclonedds.util import duration
+
+from support_modules.testtopics import Message
+
+
+@pytest.fixture
+def enabled_stats():
+    stats.reset()
+    stats.enable()
+    yield stats
+    stats.disable()
+    stats.reset()
+
+
+def test_stats_serialization(enabled_stats):
+    msg = Message("Hello")
+    data = msg.serialize()
+    assert Message.deserialize(data) == msg
+    Message.__idl__.key(msg)
+
+    ops = stats.snapshot()[Message.__idl_typename__]
+    assert ops["serialize"].count == 1
+    assert ops["serialize"].bytes == len(data)
+    assert ops["deserialize"].count == 1
+    assert ops["deserialize"].bytes == len(data)
+    assert ops["key"].count == 1
+    assert ops["deserialize"].max_ns <= ops["deserialize"].total_ns
+
+
+def test_stats_write_take(enabled_stats):
+    dp = DomainParticipant(0)
+    tp = Topic(dp, "Message", Message)
+    dr = DataReader(dp, tp)
+    dw = DataWriter(dp, tp)
+
+    dw.write(Message("Hello"))
+    assert dr.take_one(timeout=duration(milliseconds=10)) == Message("Hello")
+    dw.write(Message("World"))
+    assert dr.read_one(timeout=duration(milliseconds=10)) == Message("World")
+
+    ops = stats.snapshot()[Message.__idl_typename__]
+    assert ops["write"].count == 2
+    assert ops["take"].count >= 1
+    assert ops["read"].count >= 1
+    assert ops["write"].mean_ns > 0
+
+
+def test_stats_disable_restores():
+    original = IDL.__dict__["deserialize"]
+    stats.enable()
+    assert stats.enabled()
+    assert IDL.__dict__["deserialize"] is not original
+    stats.disable()
+    assert not stats.enabled()
+    assert IDL.__dict__["deserialize"] is original
+
+    stats.reset()
+    Message.deserialize(Message("Hello").serialize())
+    assert stats.snapshot() == {}
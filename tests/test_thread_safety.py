@@ -0,0 +1,82 @@
+import pytest
+import sys
+import threading
+
+from dataclasses import dataclass
+
+from cyclonedds.idl import IdlStruct, make_idl_struct
+from cyclonedds.idl.annotations import key
+import cyclonedds.idl.types as pt
+
+
+@dataclass
+class Reading(IdlStruct, typename="Threads.Reading"):
+    sensor: str
+    key("sensor")
+    seq: pt.uint32
+    value: pt.float64
+    history: pt.sequence[pt.int16]
+
+
+CompiledReading = make_idl_struct("CompiledReading", "Threads.CompiledReading", Reading.__annotations__,
+                                  field_annotations=Reading.__idl_field_annotations__)
+CompiledReading.__idl__.use_compiled_machines()
+
+
+@pytest.fixture
+def fast_switching():
+    # Switch threads as often as possible to provoke interleaved serialization
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+@pytest.mark.parametrize("_type", [Reading, CompiledReading])
+def test_concurrent_serialize(_type, fast_switching):
+    nthreads, iterations = 8, 300
+    errors = []
+    barrier = threading.Barrier(nthreads)
+
+    def worker(n):
+        barrier.wait()
+        try:
+            for i in range(iterations):
+                sample = _type(sensor=f"sensor-{n}" * (n + 1), seq=i, value=n + i / 8, history=[n] * (i % 7))
+                data = sample.serialize()
+                received = _type.deserialize(data)
+                if received != sample:
+                    errors.append((sample, received))
+                if _type.__idl__.key(sample) != _type.__idl__.key(received):
+                    errors.append((sample, "key"))
+        except Exception as e:
+            errors.append((n, e))
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(nthreads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+
+
+def test_concurrent_populate():
+    Fresh = make_idl_struct("Fresh", "Threads.Fresh", Reading.__annotations__,
+                            field_annotations=Reading.__idl_field_annotations__)
+    barrier = threading.Barrier(8)
+    results = []
+
+    def worker():
+        barrier.wait()
+        sample = Fresh(sensor="s", seq=1, value=2.0, history=[3])
+        results.append((Fresh.__idl__.keyhash(sample), Fresh.deserialize(sample.serialize())))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(results) == 8
+    assert all(r == results[0] for r in results)
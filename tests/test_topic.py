@@ -1,9 +1,15 @@
 import pytest
 
-from cyclonedds.core import Entity
+from dataclasses import dataclass
+
+from cyclonedds.core import Entity, Qos, Policy
 from cyclonedds.domain import DomainParticipant
-from cyclonedds.topic import Topic
-from cyclonedds.util import isgoodentity
+from cyclonedds.idl import IdlStruct
+from cyclonedds.pub import DataWriter
+from cyclonedds.sub import DataReader
+from cyclonedds.topic import Topic, ContentFilteredTopic
+from cyclonedds.util import isgoodentity, duration
+import cyclonedds.idl.types as pt
 
 from support_modules.testtopics import Message
 
@@ -26,3 +32,58 @@ def test_get_type_name():
     tp = Topic(dp, 'MessageTopic', Message)
 
     assert tp.typename == tp.get_type_name() == 'Message'
+
+
+@dataclass
+class Vehicle(IdlStruct, typename="Topic.Vehicle"):
+    id: pt.int32
+    speed: pt.float32
+    plate: str
+
+
+def test_content_filtered_topic():
+    dp = DomainParticipant(0)
+    tp = Topic(dp, "Vehicles", Vehicle)
+    cft = ContentFilteredTopic(tp, "speed > %0", [50.0])
+
+    assert isgoodentity(cft)
+    assert cft.name == "Vehicles" and cft.related_topic is tp
+    assert cft.filter_expression == "speed > %0"
+    assert cft.expression_parameters == (50.0,)
+
+    qos = Qos(Policy.Reliability.Reliable(duration(seconds=2)), Policy.History.KeepAll)
+    dr = DataReader(dp, cft, qos=qos)
+    dw = DataWriter(dp, tp, qos=qos)
+
+    dw.write(Vehicle(1, 30.0, "A"))
+    dw.write(Vehicle(2, 60.0, "B"))
+    assert [v.id for v in dr.take(N=10)] == [2]
+
+    cft.set_expression_parameters([20.0])
+    dw.write(Vehicle(3, 30.0, "C"))
+    dw.write(Vehicle(4, 10.0, "D"))
+    assert [v.id for v in dr.take(N=10)] == [3]
+
+
+def test_content_filtered_topic_python_fallback():
+    dp = DomainParticipant(0)
+    tp = Topic(dp, "Vehicles", Vehicle)
+    cft = ContentFilteredTopic(tp, "plate == %0", ["B"])
+    assert cft.expression.programs is None
+
+    qos = Qos(Policy.Reliability.Reliable(duration(seconds=2)), Policy.History.KeepAll)
+    dr = DataReader(dp, cft, qos=qos)
+    dw = DataWriter(dp, tp, qos=qos)
+
+    dw.write(Vehicle(1, 30.0, "A"))
+    dw.write(Vehicle(2, 60.0, "B"))
+    assert [v.id for v in dr.take(N=10)] == [2]
+
+
+def test_content_filtered_topic_invalid():
+    dp = DomainParticipant(0)
+    tp = Topic(dp, "Vehicles", Vehicle)
+    with pytest.raises(ValueError):
+        ContentFilteredTopic(tp, "speed > %1", [1.0])
+    with pytest.raises(ValueError):
+        ContentFilteredTopic(tp, "weight > 10")
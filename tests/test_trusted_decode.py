@@ -0,0 +1,109 @@
+import pytest
+
+from dataclasses import dataclass
+
+from cyclonedds.idl import IdlStruct, make_idl_struct
+from cyclonedds.idl.annotations import appendable, mutable
+import cyclonedds.idl.types as pt
+
+
+validated = []
+
+
+@dataclass
+class Point(IdlStruct, typename="Trusted.Point"):
+    x: pt.int32
+    y: pt.float64
+
+    def __post_init__(self):
+        validated.append(self)
+
+
+@dataclass(frozen=True)
+class Frozen(IdlStruct, typename="Trusted.Frozen"):
+    a: pt.int16
+    name: str
+
+
+@dataclass
+@appendable
+class Path(IdlStruct, typename="Trusted.Path"):
+    points: pt.sequence[Point]
+    label: str
+
+
+@dataclass
+@mutable
+class MutablePoint(IdlStruct, typename="Trusted.MutablePoint"):
+    x: pt.int32
+    y: pt.float64
+
+    def __post_init__(self):
+        validated.append(self)
+
+
+@pytest.fixture
+def trusted():
+    types = (Point, Frozen, Path, MutablePoint)
+    for _type in types:
+        _type.__idl__.use_trusted_decode()
+    yield
+    for _type in types:
+        _type.__idl__.use_trusted_decode(False)
+
+
+@pytest.mark.parametrize("use_version_2", [False, True])
+def test_trusted_decode_skips_init(trusted, use_version_2):
+    path = Path(points=[Point(1, 2.5), Point(-3, 4.0)], label="route")
+    data = path.serialize(use_version_2=use_version_2)
+
+    validated.clear()
+    decoded = Path.deserialize(data)
+    assert decoded == path
+    assert type(decoded.points[0]) is Point
+    assert validated == []
+
+    point = MutablePoint(x=5, y=0.5)
+    validated.clear()
+    assert MutablePoint.deserialize(point.serialize(use_version_2=use_version_2)) == point
+    assert validated == []
+
+
+def test_trusted_decode_frozen(trusted):
+    decoded = Frozen.deserialize(Frozen(a=3, name="ice").serialize())
+    assert decoded == Frozen(a=3, name="ice")
+    with pytest.raises(Exception):
+        decoded.a = 4
+
+
+def test_trusted_decode_opt_out():
+    point = Point(1, 2.0)
+    Point.__idl__.use_trusted_decode()
+    Point.__idl__.use_trusted_decode(False)
+
+    validated.clear()
+    assert Point.deserialize(point.serialize()) == point
+    assert len(validated) == 1
+
+
+@pytest.mark.parametrize("compiled", [False, True])
+def test_slots_struct(compiled):
+    Slotted = make_idl_struct("Slotted", "Trusted.Slotted", {
+        "a": pt.int32, "b": str, "c": pt.array[pt.float32, 2], "d": pt.sequence[pt.uint8]
+    }, slots=True)
+    if compiled:
+        Slotted.__idl__.use_compiled_machines()
+    Slotted.__idl__.use_trusted_decode()
+
+    sample = Slotted(a=1, b="two", c=[3.0, 4.0], d=[5, 6])
+    assert not hasattr(sample, "__dict__")
+
+    for use_version_2 in (False, True):
+        decoded = Slotted.deserialize(sample.serialize(use_version_2=use_version_2))
+        assert decoded == sample
+        assert not hasattr(decoded, "__dict__")
+
+    decoded.sample_info = "info"
+    assert decoded.sample_info == "info"
+    with pytest.raises(AttributeError):
+        decoded.other = 1
@@ -1,6 +1,10 @@
+import asyncio
 import pytest
+import threading
+import time
 
-from cyclonedds.core import Entity, DDSException, WaitSet, ReadCondition, ViewState, InstanceState, SampleState
+from cyclonedds.core import Entity, DDSException, WaitSet, ReadCondition, GuardCondition, ViewState, InstanceState, \
+    SampleState
 from cyclonedds.util import duration, isgoodentity
 
 from support_modules.testtopics import Message
@@ -18,9 +22,11 @@ def test_waitset_attachment(common_setup):
 
     ws.attach(rc)
     assert ws.is_attached(rc)
+    assert ws.attached == [(rc, None)]
 
     ws.detach(rc)
     assert not ws.is_attached(rc)
+    assert ws.attached == []
 
 
 def test_waitset_illigal_op(common_setup):
@@ -38,13 +44,77 @@ def test_waitset_wait(common_setup):
     rc1 = ReadCondition(common_setup.dr, ViewState.Any | InstanceState.Any | SampleState.Any)
     ws.attach(rc1)
 
-    assert ws.wait(duration(milliseconds=5)) == 0
+    assert ws.wait(duration(milliseconds=5)) == []
 
     common_setup.dw.write(Message(message="Hi!"))
 
-    assert ws.wait(duration(seconds=1)) == 1
+    assert ws.wait(duration(seconds=1)) == [rc1]
 
     rc2 = ReadCondition(common_setup.dr, ViewState.Any | InstanceState.Any | SampleState.NotRead)
     ws.attach(rc2)
 
-    assert ws.wait(duration(seconds=1)) == 2
\ No newline at end of file
+    assert set(ws.wait(duration(seconds=1))) == {rc1, rc2}
+
+
+def test_waitset_triggered_entities(common_setup):
+    ws = WaitSet(common_setup.dp)
+    conditions = [ReadCondition(common_setup.dr, ViewState.Any | InstanceState.Any | SampleState.Any)]
+    conditions += [GuardCondition(common_setup.dp) for _ in range(50)]
+    for condition in conditions:
+        ws.attach(condition)
+
+    conditions[7].set(True)
+    conditions[42].set(True)
+    assert set(ws.wait_until(time.time_ns() + duration(seconds=1))) == {conditions[7], conditions[42]}
+
+    ws.detach(conditions[7])
+    assert not ws.is_attached(conditions[7])
+    assert ws.wait(duration(seconds=1)) == [conditions[42]]
+    assert len(ws.get_entities()) == 50
+
+
+def test_waitset_dispatch(common_setup):
+    ws = WaitSet(common_setup.dp)
+    rc = ReadCondition(common_setup.dr, ViewState.Any | InstanceState.Any | SampleState.NotRead)
+    received = []
+
+    def on_data(condition):
+        received.extend(common_setup.dr.take(N=10, condition=condition))
+        if len(received) == 3:
+            ws.stop_dispatch()
+
+    ws.attach(rc, on_data)
+    assert ws.dispatch(timeout=duration(milliseconds=5)) == 0
+
+    writer = threading.Thread(
+        target=lambda: [common_setup.dw.write(Message(message=f"Hi {i}!")) for i in range(3)]
+    )
+    writer.start()
+    assert ws.dispatch(timeout=duration(seconds=5)) >= 1
+    writer.join()
+    assert len(received) == 3
+
+
+def test_waitset_stop_dispatch_from_thread(common_setup):
+    ws = WaitSet(common_setup.dp)
+    gc = GuardCondition(common_setup.dp)
+    ws.attach(gc, lambda c: c.take())
+
+    ws.dispatch(once=True, timeout=duration(milliseconds=5))
+    threading.Timer(0.1, ws.stop_dispatch).start()
+    assert ws.dispatch() == 0
+
+def test_waitset_wait_async(common_setup):
+    ws = WaitSet(common_setup.dp)
+    rc = ReadCondition(common_setup.dr, ViewState.Any | InstanceState.Any | SampleState.Any)
+    gc = GuardCondition(common_setup.dp)
+    ws.attach(rc)
+    ws.attach(gc)
+
+    async def main():
+        assert await ws.wait_async(duration(milliseconds=5)) == []
+        asyncio.get_running_loop().call_later(0.01, gc.set, True)
+        return await asyncio.gather(ws.wait_async(duration(seconds=1)), ws.wait_async(duration(seconds=1)))
+
+    assert asyncio.run(main()) == [[gc], [gc]]
+    assert ws.wait(duration(milliseconds=5)) == [gc]
@@ -1,9 +1,11 @@
 import pytest
+import threading
 
-from cyclonedds.core import DDSException
+from cyclonedds.core import DDSException, Qos, Policy, InstanceState
 from cyclonedds.domain import DomainParticipant
 from cyclonedds.topic import Topic
 from cyclonedds.pub import Publisher, DataWriter
+from cyclonedds.sub import DataReader
 from cyclonedds.util import duration, isgoodentity
 
 from support_modules.testtopics import Message, MessageKeyed
@@ -86,3 +88,132 @@ def test_writer_lookup():
     assert handle1 > 0 and handle2 > 0 and handle1 != handle2
     assert handle1 == dw.lookup_instance(keymsg1)
     assert handle2 == dw.lookup_instance(keymsg2)
+
+
+def test_writer_key_only():
+    dp = DomainParticipant(0)
+    tp = Topic(dp, "MessageKeyed", MessageKeyed)
+    dw = DataWriter(dp, tp)
+    dr = DataReader(dp, tp)
+
+    assert dw.lookup_key(user_id=7) is None
+    dw.write(MessageKeyed(user_id=7, message="Hello!"))
+    assert dw.lookup_key(user_id=7) == dw.lookup_instance(MessageKeyed(user_id=7, message="Other"))
+
+    dw.dispose_key(user_id=7)
+    dw.unregister_key(user_id=7)
+    samples = dr.take(N=3)
+    assert samples[0] == MessageKeyed(user_id=7, message="Hello!")
+    assert samples[1].sample_info.instance_state == InstanceState.NotAliveDisposed
+
+    with pytest.raises(TypeError):
+        dw.dispose_key(message="Hello!")
+
+
+def test_writer_instance_cache():
+    dp = DomainParticipant(0)
+    tp = Topic(dp, "MessageKeyed", MessageKeyed)
+    dw = DataWriter(dp, tp, qos=Qos(Policy.History.KeepLast(1)), instance_cache=2)
+    dr = DataReader(dp, tp, qos=Qos(Policy.History.KeepLast(1)))
+
+    handles = [dw.register_instance(MessageKeyed(user_id=i, message="")) for i in range(3)]
+    # The first instance was evicted, the others are cached
+    assert len(dw._instance_cache) == 2 and list(dw._instance_keys) == handles
+
+    for i, handle in enumerate(handles):
+        dw.write(MessageKeyed(user_id=i, message="by handle"), handle=handle)
+        dw.write(MessageKeyed(user_id=i, message="by key"))
+
+    received = sorted((s.user_id, s.message, s.sample_info.instance_handle) for s in dr.take(N=10))
+    assert received == [(i, "by key", handle) for i, handle in enumerate(handles)]
+
+    dw.unregister_instance_handle(handles[1])
+    dw.unregister_instance(MessageKeyed(user_id=2, message=""))
+    assert not dw._instance_cache and list(dw._instance_keys) == handles[:1]
+
+
+def test_writer_write_by_handle():
+    dp = DomainParticipant(0)
+    tp = Topic(dp, "MessageKeyed", MessageKeyed)
+    dw = DataWriter(dp, tp)
+    dr = DataReader(dp, tp)
+
+    handle = dw.register_instance(MessageKeyed(user_id=3, message=""))
+    dw.write(MessageKeyed(user_id=4, message=""))
+    other = dw.lookup_key(user_id=4)
+    # Nothing is remembered until a handle is written
+    assert not dw._instance_keys
+
+    dw.write(MessageKeyed(user_id=3, message="now"), handle=handle)
+    dw.write(MessageKeyed(user_id=4, message="then"), handle=other, timestamp=1000)
+    with pytest.raises(ValueError):
+        dw.write(MessageKeyed(user_id=5, message="unknown"), handle=handle + other)
+    assert dw._instance_keys.keys() == {handle, other}
+
+    received = {(s.user_id, s.message): s.sample_info for s in dr.take(N=10) if s.message}
+    assert received.keys() == {(3, "now"), (4, "then")}
+    assert received[3, "now"].instance_handle == handle
+    assert received[4, "then"].instance_handle == other
+    assert received[4, "then"].source_timestamp == 1000
+
+
+def test_writer_concurrent_write():
+    qos = Qos(Policy.Reliability.Reliable(duration(seconds=2)), Policy.History.KeepAll)
+    dp = DomainParticipant(0)
+    tp = Topic(dp, "MessageKeyed", MessageKeyed)
+    dw = DataWriter(dp, tp, qos=qos)
+    dr = DataReader(dp, tp, qos=qos)
+
+    nthreads, nsamples = 8, 50
+    expected = {
+        (t, f"thread {t} sample {i} " + "x" * (t * i % 13))
+        for t in range(nthreads) for i in range(nsamples)
+    }
+
+    def worker(t):
+        for user_id, message in expected:
+            if user_id == t:
+                dw.write(MessageKeyed(user_id=user_id, message=message))
+
+    threads = [threading.Thread(target=worker, args=(t,)) for t in range(nthreads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert dw.wait_for_acks(duration(seconds=1))
+    received = dr.take(N=nthreads * nsamples * 2)
+    assert len(received) == len(expected)
+    assert {(msg.user_id, msg.message) for msg in received} == expected
+
+
+def test_writer_write_many():
+    qos = Qos(Policy.Reliability.Reliable(duration(seconds=2)), Policy.History.KeepAll)
+    dp = DomainParticipant(0)
+    tp = Topic(dp, "MessageKeyed", MessageKeyed)
+    dw = DataWriter(dp, tp, qos=qos)
+    dr = DataReader(dp, tp, qos=qos)
+
+    samples = [MessageKeyed(user_id=i % 5, message="m" * i) for i in range(100)]
+    assert dw.write_many(samples) == [0] * 100
+    assert dw.write_many([]) == []
+
+    received = dr.take(N=200)
+    assert [(m.user_id, m.message) for m in received] == [(m.user_id, m.message) for m in samples]
+
+
+def test_writer_write_many_timestamps():
+    dp = DomainParticipant(0)
+    tp = Topic(dp, "MessageKeyed", MessageKeyed)
+    dw = DataWriter(dp, tp)
+    dr = DataReader(dp, tp)
+
+    samples = [MessageKeyed(user_id=i, message="hi") for i in range(3)]
+    timestamps = [duration(seconds=10 + i) for i in range(3)]
+    assert dw.write_many(samples, timestamps=timestamps) == [0, 0, 0]
+    assert sorted(m.sample_info.source_timestamp for m in dr.take(N=3)) == timestamps
+
+    with pytest.raises(ValueError):
+        dw.write_many(samples, timestamps=timestamps[:2])
+    with pytest.raises(TypeError):
+        dw.write_many([Message(message="wrong")])